@@ -1,10 +1,14 @@
 import os
 import sys
 import json
+import hashlib
 import threading
 import time
+import functools
+import math
 import numpy as np
-from scipy import signal
+from scipy import fft, signal
+from scipy.ndimage import minimum_filter1d, uniform_filter1d
 from scipy.io import wavfile
 from pydub import AudioSegment
 
@@ -57,87 +61,554 @@ ENV_DATA = {
     "音乐厅": (0.88, 6.0, 0.10),    # 豪华空灵包围
 }
 
+# 引擎输出发生变化（算法、系数、默认值）时加一，已渲染的缓存随之失效
+ENGINE_VERSION = 4
+# 限幅 为末级限幅器的上限（dBFS）
+DEFAULT_SETTINGS = {"低音": 50, "高音": 50, "环绕强度": 0, "环绕深度": 0, "环境": "无", "混响": "算法", "限幅": -1.0}
+# 环境混响的实现方式：算法 = AdvancedReverb（梳状 + 全通），卷积 = ConvolutionReverb（按环境参数生成的脉冲响应）
+REVERB_MODES = ("算法", "卷积")
+
+def settings_digest(settings):
+    """设置的规范化哈希：补齐默认值、数值统一为浮点、键排序，与引擎版本一起决定输出"""
+    merged = dict(DEFAULT_SETTINGS, **settings)
+    canonical = {k: float(v) if isinstance(v, (int, float)) else v for k, v in merged.items()}
+    text = json.dumps([ENGINE_VERSION, canonical], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def final_settings(preset, overlay, env, reverb_modes=None, ceiling_db=DEFAULT_SETTINGS["限幅"]):
+    """预设叠加微调后的引擎设置（微调值 50 表示不改变预设）；reverb_modes 为 {环境: 混响方式}，未列出的用“算法”"""
+    b, t, s, d = PRESET_DATA[preset]
+    return {
+        "低音": b + (overlay["低音"] - 50),
+        "高音": t + (overlay["高音"] - 50),
+        "环绕强度": s + (overlay["环绕强度"] - 50),
+        "环绕深度": d + (overlay["环绕深度"] - 50),
+        "环境": env,
+        "混响": (reverb_modes or {}).get(env, "算法"),
+        "限幅": ceiling_db,
+    }
+
+def saved_settings():
+    """音效界面保存在 CONFIG_FILE 中的最终设置；没有保存过或文件损坏时为“无”预设"""
+    try:
+        with open(CONFIG_FILE, 'r') as f:
+            config = json.load(f)
+        preset = config.get("preset", "无")
+        env = config.get("env", "无")
+        overlay = dict({"低音": 50, "高音": 50, "环绕强度": 50, "环绕深度": 50}, **config.get("overlay", {}))
+        return final_settings(preset if preset in PRESET_DATA else "无", overlay, env if env in ENV_DATA else "无",
+                              config.get("reverb_modes"), config.get("ceiling_db", DEFAULT_SETTINGS["限幅"]))
+    except:
+        return dict(DEFAULT_SETTINGS)
+
+def preset_settings(preset, env="无"):
+    """预设 + 环境对应的引擎设置（即音效界面叠加值全为 50 时的结果）"""
+    bass, treble, strength, depth = PRESET_DATA[preset]
+    return {"低音": bass, "高音": treble, "环绕强度": strength, "环绕深度": depth, "环境": env}
+
 class AdvancedReverb:
-    """增强版混响（8梳 + 4全通 + 精确decay + 低damping明亮优化）——防沉闷、空灵弹飞感"""
-    def __init__(self, sr=44100):
+    """增强版混响（8梳 + 4全通 + 精确decay + 低damping明亮优化）——防沉闷、空灵弹飞感
+
+    按块处理：梳状/全通滤波器都在左右声道交错的样本流上运行（与逐样本版本相同的拓扑），
+    8 个梳状滤波器以最短延迟为块长同步推进，块内用 lfilter 向量化，状态跨 chunk 保留。
+    与原逐样本实现的输出误差 < 1e-5（float32 量化级别）。
+    """
+    AP_GAIN = 0.65
+
+    def __init__(self, sr=44100, max_frames=4096):
         self.sr = sr
-        # 8梳滤波器（密度高，长尾）
+        # 8梳滤波器（密度高，长尾）；comb_w 每行前 max_delay 列保存该梳最近的写入值
         self.comb_delays = [int(sr * t) for t in [0.031, 0.039, 0.042, 0.048, 0.055, 0.062, 0.068, 0.075]]
-        self.comb_bufs = [np.zeros(d + 1, dtype=np.float32) for d in self.comb_delays]  # +1防越界
-        self.comb_pos = [0] * len(self.comb_delays)
+        self.max_delay = max(self.comb_delays)
+        self.comb_block = min(self.comb_delays) & ~1  # 偶数块长，保证每块都从左声道开始
         self.comb_lp = np.zeros((2, len(self.comb_delays)), dtype=np.float32)
+        self.comb_fb = None
+        self.comb_fb_key = None
         
-        # 4全通滤波器（扩散增强，明亮闪烁）
+        # 4全通滤波器（扩散增强，明亮闪烁）；缓冲区保存最近 delay 个输出
         self.ap_delays = [int(sr * t) for t in [0.0048, 0.0035, 0.0024, 0.0019]]
-        self.ap_bufs = [np.zeros(d + 1, dtype=np.float32) for d in self.ap_delays]
-        self.ap_pos = [0] * len(self.ap_delays)
+        self.ap_bufs = [np.zeros(d, dtype=np.float64) for d in self.ap_delays]
+
+        self.capacity = 0
+        self.comb_w = np.zeros((len(self.comb_delays), self.max_delay))
+        self.prepare(max_frames)
+
+    def prepare(self, max_frames):
+        """按最大帧数预分配工作缓冲区，之后同等大小的 chunk 不再分配大块内存"""
+        n = 2 * max_frames
+        if n <= self.capacity:
+            return
+        w = np.zeros((len(self.comb_delays), self.max_delay + n))
+        w[:, :self.max_delay] = self.comb_w[:, :self.max_delay]
+        self.comb_w = w
+        self.comb_delayed = np.zeros((len(self.comb_delays), self.comb_block))
+        self.x_buf = np.zeros(n)
+        self.rev_buf = np.zeros(n)
+        self.ap_out = np.zeros(n)
+        self.ap_pad = np.zeros(n + max(self.ap_delays))
+        self.capacity = n
+
+    def _comb_gains(self, decay_time):
+        # 精确反馈（decay_time秒级长尾，轻盈衰减），只在 decay_time 变化时重算
+        if self.comb_fb_key != decay_time:
+            delays = np.array(self.comb_delays, dtype=np.float64)
+            fb = 10 ** (-3.0 * delays / (decay_time * self.sr + 1e-8))
+            self.comb_fb = (fb * 0.92)[:, None]  # 轻衰减防爆
+            self.comb_fb_key = decay_time
+        return self.comb_fb
+
+    def _combs(self, x, damping, decay_time, out):
+        """8 个梳状滤波器之和：f[k] = damping*f[k-2] + (1-damping)*w[k-D]，w[k] = x[k] + g*f[k]"""
+        g = self._comb_gains(decay_time)
+        b = np.array([1.0 - damping])
+        a = np.array([1.0, 0.0, -damping])
+        M = self.max_delay
+        n = len(x)
+        # w 的线性展开：前 max_delay 列是历史，之后是本 chunk 写入的值
+        w = self.comb_w
+        delayed = self.comb_delayed
+        k = 0
+        while k < n:
+            L = min(self.comb_block, n - k)
+            # 读取 D 步之前写入的值（块长 <= 最短延迟，块内不会读到本块写入的值）
+            for c, delay in enumerate(self.comb_delays):
+                start = M - delay + k
+                delayed[c, :L] = w[c, start:start + L]
+            # 低通阻尼（低damping = 高频保留多，防闷）：交错流上隔 2 步递归 = 每声道一阶低通
+            zi = damping * self.comb_lp.T.astype(np.float64)
+            filtered, _ = signal.lfilter(b, a, delayed[:, :L], axis=1, zi=zi)
+            self.comb_lp[0] = filtered[:, -2]
+            self.comb_lp[1] = filtered[:, -1]
+            written = w[:, M + k:M + k + L]
+            np.multiply(filtered, g, out=written)
+            written += x[k:k + L]
+            filtered.sum(axis=0, out=out[k:k + L])
+            k += L
+        # 把最近 max_delay 个写入值移回开头；分段复制避免源和目标重叠
+        for j in range(0, M, max(n, 1)):
+            step = min(n, M - j)
+            w[:, j:j + step] = w[:, j + n:j + n + step]
+        return out
+
+    def _allpass(self, a_idx, x, out):
+        """单个全通滤波器：u[k] = x[k] + g*(u[k-D] - g*x[k])，输出 u[k-D] - g*x[k]"""
+        delay = self.ap_delays[a_idx]
+        hist = self.ap_bufs[a_idx]
+        g = self.AP_GAIN
+        n = len(x)
+        rows = -(-n // delay)
+        # 按延迟长度折叠成矩阵，沿行方向就是一阶递归 u = (1-g²)x + g*u_prev
+        padded = self.ap_pad[:rows * delay]
+        padded[:n] = x
+        padded[n:] = 0.0
+        u, _ = signal.lfilter([1.0 - g * g], [1.0, -g], padded.reshape(rows, delay),
+                              axis=0, zi=g * hist[None, :])
+        u = u.reshape(-1)
+        head = min(delay, n)
+        out[:head] = hist[:head]
+        out[head:n] = u[:n - head]
+        if n >= delay:
+            hist[:] = u[n - delay:n]
+        else:
+            hist[:delay - n] = hist[n:].copy()
+            hist[delay - n:] = u[:n]
+        # x 之后只作为下一级的输出缓冲区，可以直接覆盖
+        x *= g
+        out[:n] -= x
+        return out
+
+    def process_into(self, data, wet, decay_time, damping):
+        """原地处理 (n, 2) 的 float32 数据；不限幅，峰值由引擎末级的 PeakLimiter 处理"""
+        if wet <= 0.01 or len(data) == 0:
+            return data
+        n = data.size
+        if n > self.capacity:
+            self.prepare(len(data))
+        
+        # 左右声道交错成单条样本流（与逐样本版本共享梳/全通缓冲区的行为一致）
+        x = self.x_buf[:n]
+        x[:] = data.reshape(-1)
+
+        # 1. 8梳滤波器（长尾 + 低damping明亮）
+        reverb = self._combs(x, damping, decay_time, self.rev_buf[:n])
+        reverb /= len(self.comb_delays)
+
+        # 2. 4全通滤波器（增强扩散 + 瓷器弹飞闪烁）
+        other = self.ap_out[:n]
+        for a in range(len(self.ap_delays)):
+            reverb, other = self._allpass(a, reverb, other), reverb
+
+        # 干湿混合（更通透，保留人声清晰，防闷）
+        x *= 1.0 - wet * 0.42
+        reverb *= wet * 1.35
+        x += reverb
+        data[:] = x.reshape(data.shape)
+        return data
 
     def process(self, data, wet, decay_time, damping):
-        if wet <= 0.01:
-            return data.copy()
-        
-        out = data.copy()
+        return self.process_into(np.array(data, dtype=np.float32), wet, decay_time, damping)
+
+@functools.lru_cache(maxsize=16)
+def impulse_response(decay, damping, sr=44100, seed=7):
+    """按环境参数生成 (2, n) 的立体声脉冲响应，长度为 decay 秒（最长 MAX_IR_SEC）
+
+    左右声道用不相关的噪声；2 kHz 以下按 decay 衰减 60 dB，以上按 decay*(1-damping) 衰减（damping 越大越闷）。
+    噪声幅度取 1/sqrt(sr)，能量只取决于衰减时间，湿声电平与 AdvancedReverb 相差 2 dB 以内。
+    """
+    n = int(min(decay, ConvolutionReverb.MAX_IR_SEC) * sr)
+    noise = np.random.default_rng(seed).standard_normal((2, n))
+    a = np.exp(-2 * np.pi * 2000 / sr)
+    low = signal.lfilter([1 - a], [1, -a], noise, axis=1)
+    t = np.arange(n) / sr
+    ir = low * 10 ** (-3 * t / decay)
+    ir += (noise - low) * 10 ** (-3 * t / (decay * (1 - damping)))
+    ir /= np.sqrt(sr)
+    return ir.astype(np.float32)
+
+@functools.lru_cache(maxsize=16)
+def _ir_partitions(decay, damping, sr):
+    """脉冲响应按块长切分后的频谱 (段数, 2, 块长+1)，按段倒序排列；返回 (块长, 频谱)"""
+    ir = impulse_response(decay, damping, sr)
+    n = ir.shape[1]
+    # 段数不超过 MAX_PARTITIONS：尾音越长块越大，每个采样的乘加次数有上限
+    block = ConvolutionReverb.MIN_BLOCK
+    while block * ConvolutionReverb.MAX_PARTITIONS < n:
+        block *= 2
+    parts = -(-n // block)
+    padded = np.zeros((2, parts, 2 * block), dtype=np.float32)
+    flat = np.zeros((2, parts * block), dtype=np.float32)
+    flat[:, :n] = ir
+    padded[:, :, :block] = flat.reshape(2, parts, block)
+    spectra = fft.rfft(padded, axis=2).transpose(1, 0, 2)[::-1]
+    return block, np.ascontiguousarray(spectra, dtype=np.complex64)
+
+def convolution_tail_seconds(decay, damping, sr=44100):
+    """卷积混响的输入影响输出的最长时间：块长延迟 + 脉冲响应长度"""
+    block, spectra = _ir_partitions(decay, damping, sr)
+    return (block + len(spectra) * block) / sr
+
+class ConvolutionReverb:
+    """卷积混响：由 ENV_DATA 的 (decay, damping) 生成脉冲响应（见 impulse_response，按参数缓存），
+    用均匀分段的 overlap-add FFT 卷积逐块处理，频域延迟线和重叠尾部跨 chunk 保留。
+
+    输入凑满一块才做一次卷积，因此固定延迟一个块长（11.6~46 ms），正好作为混响的预延迟；
+    任意 chunk 大小的输出都与整段一次卷积相同。干湿混合与 AdvancedReverb 一致，可以直接替换。
+    """
+    MIN_BLOCK = 512
+    MAX_PARTITIONS = 192
+    MAX_IR_SEC = 8.0
+
+    def __init__(self, sr=44100, max_frames=4096):
+        self.sr = sr
+        self.key = None
+        self.max_frames = max_frames
+
+    def prepare(self, max_frames):
+        if max_frames > self.max_frames:
+            self.max_frames = max_frames
+            if self.key is not None:
+                pending = self.pending[:self.pending_len].copy()
+                self.pending = np.zeros((max_frames + self.block, 2), dtype=np.float32)
+                self.pending[:len(pending)] = pending
+                self.rev_buf = np.zeros((max_frames, 2), dtype=np.float32)
+
+    def _load(self, decay, damping):
+        """环境参数变化时换用对应的脉冲响应并清空卷积状态"""
+        key = (decay, damping)
+        if key == self.key:
+            return
+        self.block, self.spectra = _ir_partitions(decay, damping, self.sr)
+        B, parts = self.block, len(self.spectra)
+        self.fdl = np.zeros((2 * parts, 2, B + 1), dtype=np.complex64)  # 输入频谱存两份，窗口总是连续切片
+        self.head = 0
+        self.in_block = np.zeros((2, 2 * B), dtype=np.float32)         # 后半段保持为零
+        self.in_fill = 0
+        self.overlap = np.zeros((2, B), dtype=np.float32)
+        self.products = np.empty_like(self.spectra)
+        self.acc = np.empty((2, B + 1), dtype=np.complex64)
+        # 待输出的混响，始终比已收到的输入多 B 帧（开头的 B 帧零即预延迟）
+        self.pending = np.zeros((self.max_frames + B, 2), dtype=np.float32)
+        self.pending_len = B
+        self.rev_buf = np.zeros((self.max_frames, 2), dtype=np.float32)
+        self.key = key
+
+    def _convolve_block(self, out):
+        """对凑满的一块输入做卷积，结果写入 out (B, 2)"""
+        B, parts = self.block, len(self.spectra)
+        spectrum = fft.rfft(self.in_block, axis=1)
+        i = self.head
+        self.fdl[i] = spectrum
+        self.fdl[i + parts] = spectrum
+        # fdl[i+1 : i+1+parts] 依次是最早到最新的输入频谱，spectra 已按段倒序，逐元素相乘再求和即为各段卷积之和
+        np.multiply(self.fdl[i + 1:i + 1 + parts], self.spectra, out=self.products)
+        self.products.sum(axis=0, out=self.acc)
+        y = fft.irfft(self.acc, n=2 * B, axis=1)
+        y[:, :B] += self.overlap
+        out[:] = y[:, :B].T
+        self.overlap[:] = y[:, B:]
+        self.head = (i + 1) % parts
+
+    def process_into(self, data, wet, decay_time, damping):
+        """原地处理 (n, 2) 的 float32 数据；不限幅，峰值由引擎末级的 PeakLimiter 处理"""
+        if wet <= 0.01 or len(data) == 0:
+            return data
+        self._load(decay_time, damping)
         n = len(data)
-        
-        for i in range(n):
-            for ch in range(2):
-                inp = data[i, ch]
-                reverb = 0.0
-                
-                # 1. 8梳滤波器（长尾 + 低damping明亮）
-                for c in range(len(self.comb_delays)):
-                    delay = self.comb_delays[c]
-                    pos = self.comb_pos[c]
-                    delayed = self.comb_bufs[c][(pos - delay) % (delay + 1)]
-                    
-                    # 低通阻尼（低damping = 高频保留多，防闷）
-                    filtered = self.comb_lp[ch, c] * damping + delayed * (1.0 - damping)
-                    self.comb_lp[ch, c] = filtered
-                    
-                    # 精确反馈（decay_time秒级长尾，轻盈衰减）
-                    fb = 10 ** (-3.0 * delay / (decay_time * self.sr + 1e-8))
-                    self.comb_bufs[c][pos] = inp + filtered * fb * 0.92  # 轻衰减防爆
-                    
-                    reverb += filtered
-                    self.comb_pos[c] = (pos + 1) % (delay + 1)
-                
-                reverb /= len(self.comb_delays)
-                
-                # 2. 4全通滤波器（增强扩散 + 瓷器弹飞闪烁）
-                for a in range(len(self.ap_delays)):
-                    delay = self.ap_delays[a]
-                    pos = self.ap_pos[a]
-                    delayed = self.ap_bufs[a][(pos - delay) % (delay + 1)]
-                    
-                    ap_out = -0.65 * reverb + delayed  # 调整g=0.65，更明亮
-                    self.ap_bufs[a][pos] = reverb + ap_out * 0.65
-                    reverb = ap_out
-                    self.ap_pos[a] = (pos + 1) % (delay + 1)
-                
-                # 干湿混合（更通透，保留人声清晰，防闷）
-                out[i, ch] = data[i, ch] * (1.0 - wet * 0.42) + reverb * wet * 1.35
-                
-        return np.clip(out, -1.0, 1.0)
+        if n > self.max_frames:
+            self.prepare(n)
+        B = self.block
+        pos = 0
+        while pos < n:
+            take = min(B - self.in_fill, n - pos)
+            self.in_block[:, self.in_fill:self.in_fill + take] = data[pos:pos + take].T
+            self.in_fill += take
+            pos += take
+            if self.in_fill == B:
+                self._convolve_block(self.pending[self.pending_len:self.pending_len + B])
+                self.pending_len += B
+                self.in_fill = 0
+        reverb = self.rev_buf[:n]
+        reverb[:] = self.pending[:n]
+        self.pending[:self.pending_len - n] = self.pending[n:self.pending_len]
+        self.pending_len -= n
+
+        data *= 1.0 - wet * 0.42
+        reverb *= wet * 1.35
+        data += reverb
+        return data
+
+class DelayLine:
+    """预分配的环形延迟线：写入一段信号，同时读出 delay 个样本之前的值
+
+    支持小数延迟（相邻两点线性插值）；稳态下每个 chunk 不分配新内存。
+    """
+    def __init__(self, max_delay, block_size=8192, dtype=np.float32):
+        self.max_delay = int(np.ceil(max_delay))
+        self.block_size = block_size
+        # +1 给小数延迟插值留出一个样本
+        self.size = self.max_delay + 1 + block_size
+        self.buf = np.zeros(self.size, dtype=dtype)
+        self.pos = 0
+        self.out_buf = np.zeros(block_size, dtype=dtype)
+        self.frac_buf = np.zeros(block_size, dtype=dtype)
+
+    def reset(self):
+        self.buf[:] = 0
+        self.pos = 0
+
+    def reserve(self, n):
+        """确保内部输出缓冲区能容纳 n 个样本"""
+        if n > len(self.out_buf):
+            self.out_buf = np.zeros(n, dtype=self.buf.dtype)
+            self.frac_buf = np.zeros(n, dtype=self.buf.dtype)
+
+    def _write(self, x):
+        n = len(x)
+        first = min(n, self.size - self.pos)
+        self.buf[self.pos:self.pos + first] = x[:first]
+        self.buf[:n - first] = x[first:]
+        self.pos = (self.pos + n) % self.size
+
+    def _read(self, delay, n, out):
+        # 刚写入的 n 个样本中第 k 个对应的延迟样本
+        start = (self.pos - n - delay) % self.size
+        first = min(n, self.size - start)
+        out[:first] = self.buf[start:start + first]
+        out[first:n] = self.buf[:n - first]
+
+    def process(self, x, delay, out=None):
+        """返回 out[k] = x[k - delay]；out 为 None 时使用内部缓冲区（下次调用前有效）"""
+        n = len(x)
+        if out is None:
+            self.reserve(n)
+            out = self.out_buf[:n]
+        delay = min(max(delay, 0.0), self.max_delay)
+        d_int = int(delay)
+        frac = delay - d_int
+        for i in range(0, n, self.block_size):
+            piece = x[i:i + self.block_size]
+            m = len(piece)
+            self._write(piece)
+            self._read(d_int, m, out[i:i + m])
+            if frac > 0:
+                tmp = self.frac_buf[:m]
+                self._read(d_int + 1, m, tmp)
+                tmp -= out[i:i + m]
+                tmp *= frac
+                out[i:i + m] += tmp
+        return out
+
+class PeakLimiter:
+    """前瞻峰值限幅器：输出延迟 lookahead 个采样，增益在峰值到来之前平滑压下，之后按 release 时间常数恢复
+
+    每个 chunk 整块向量化计算，历史状态跨 chunk 保留：
+      1. 每帧所需增益 g = min(1, ceiling / 左右声道峰值)
+      2. 长度 D+1 的滑动最小值（保持）再做长度 D+1 的滑动平均：增益在 D 个采样内线性压下，
+         且任一时刻都不大于 D 个采样之后那一帧所需的增益（音频正好延迟 D）
+      3. 释放：gain[t] = min(G[t], gain[t-1] / alpha_rel)，在对数域里是累计最小值，
+         用 np.minimum.accumulate 一次算完，上一块末尾的 gain 作为初值
+    reduction_db / peak_reduction_db 记录最近一块和累计的最大增益衰减（dB，正数）。
+    """
+    def __init__(self, sr=44100, ceiling_db=-1.0, lookahead_ms=3.0, release_ms=100.0, max_frames=4096):
+        self.sr = sr
+        self.lookahead = max(1, int(sr * lookahead_ms / 1000))
+        self.alpha_rel = np.exp(-1.0 / (release_ms * sr / 1000.0))
+        self.gain = 1.0  # 上一块最后一帧的增益
+        self.ceiling_db = None
+        self.set_ceiling(ceiling_db)
+        self.reduction_db = 0.0
+        self.peak_reduction_db = 0.0
+        self.capacity = 0
+        self.prepare(max_frames)
+
+    def set_ceiling(self, ceiling_db):
+        if ceiling_db != self.ceiling_db:
+            self.ceiling_db = ceiling_db
+            self.ceiling = np.float32(10 ** (ceiling_db / 20))
+
+    def prepare(self, max_frames):
+        if max_frames <= self.capacity:
+            return
+        D = self.lookahead
+        n = D + max_frames
+        old = (self.need[:D].copy(), self.hold[:D].copy(), self.delay[:D].copy()) if self.capacity else None
+        # 前 D 个位置是上一块留下的历史
+        self.need = np.ones(n, dtype=np.float32)
+        self.hold = np.ones(n, dtype=np.float32)
+        self.delay = np.zeros((n, 2), dtype=np.float32)
+        if old:
+            self.need[:D], self.hold[:D], self.delay[:D] = old
+        self.scratch = np.empty(n, dtype=np.float32)
+        self.peak = np.empty(max_frames, dtype=np.float32)
+        # 对数域也用 float32：与输入同类型的 ufunc 不需要类型转换的临时缓冲区
+        self.log_gain = np.empty(max_frames, dtype=np.float32)
+        self.gain_buf = np.empty(max_frames, dtype=np.float32)
+        # 释放斜率：第 t 帧相对块首可恢复 (t+1)/(release 采样数) 的对数增益
+        self.ramp = (np.arange(1, max_frames + 1) * -np.log(self.alpha_rel)).astype(np.float32)
+        self.capacity = max_frames
+
+    def reset_meter(self):
+        self.peak_reduction_db = 0.0
+
+    def process_into(self, data):
+        """原地处理 (n, 2) 的 float32 数据，输出比输入晚 lookahead 个采样"""
+        n = len(data)
+        if n == 0:
+            return data
+        if n > self.capacity:
+            self.prepare(n)
+        D = self.lookahead
+        need, hold, delay, scratch = self.need[:D + n], self.hold[:D + n], self.delay[:D + n], self.scratch[:D + n]
+        # 长度 D+1 的居中窗口为 [i-a, i+b]，取 i = D+t-b 正好覆盖历史在内的 [t-D, t]
+        b = D - (D + 1) // 2
+
+        # 1. 所需增益
+        peak = self.peak[:n]
+        np.abs(data[:, 0], out=peak)
+        right = np.abs(data[:, 1], out=self.scratch[:n])
+        np.maximum(peak, right, out=peak)
+        if self.gain >= 1.0 and peak.max() <= self.ceiling and need[:D].min() >= 1.0 and hold[:D].min() >= 1.0:
+            # 本块和历史都不需要压缩：只做延迟
+            need[D:] = 1.0
+            hold[D:] = 1.0
+            self.reduction_db = 0.0
+            delay[D:] = data
+            data[:] = delay[:n]
+            need[:D] = need[n:]
+            hold[:D] = hold[n:]
+            delay[:D] = delay[n:]
+            return data
+        np.maximum(peak, self.ceiling, out=peak)
+        np.divide(self.ceiling, peak, out=need[D:])
+
+        # 2. 保持 + 平滑：增益在峰值前 D 个采样内线性压下
+        minimum_filter1d(need, D + 1, output=scratch)
+        hold[D:] = scratch[D - b:D - b + n]
+        uniform_filter1d(hold, D + 1, output=scratch)
+
+        # 3. 释放：对数域累计最小值
+        log_gain = self.log_gain[:n]
+        np.log(scratch[D - b:D - b + n], out=log_gain)
+        ramp = self.ramp[:n]
+        log_gain -= ramp
+        np.minimum.accumulate(log_gain, out=log_gain)
+        np.minimum(log_gain, math.log(self.gain), out=log_gain)
+        log_gain += ramp
+        gain = self.gain_buf[:n]
+        np.exp(log_gain, out=gain)
+        self.gain = float(gain[-1])
+        self.reduction_db = float(-20 * np.log10(gain.min()))
+        self.peak_reduction_db = max(self.peak_reduction_db, self.reduction_db)
+
+        # 延迟 D 个采样后乘以增益；上限处再夹一次只为消除舍入误差
+        delay[D:] = data
+        # 按声道相乘：(n, 1) 广播会让 ufunc 分配迭代缓冲区
+        np.multiply(delay[:n, 0], gain, out=data[:, 0])
+        np.multiply(delay[:n, 1], gain, out=data[:, 1])
+        np.minimum(data, self.ceiling, out=data)
+        np.maximum(data, -self.ceiling, out=data)
+        need[:D] = need[n:]
+        hold[:D] = hold[n:]
+        delay[:D] = delay[n:]
+        return data
+
+    def flush(self):
+        """推入 lookahead 帧静音，取出仍在延迟线里的最后 lookahead 帧（歌曲结束时调用）"""
+        return self.process_into(np.zeros((self.lookahead, 2), dtype=np.float32))
 
 class UltimateAudioEngine:
+    PHASE_PERIOD = 4096  # 环绕相位曲线的周期（帧），与默认 chunk 相同，按绝对位置计算，与实际 chunk 大小无关
+
     def __init__(self, sr=44100):
         self.sr = sr
-        self.settings = {"低音": 50, "高音": 50, "环绕强度": 0, "环绕深度": 0, "环境": "无"}
+        self.position = 0  # 已处理的帧数（从歌曲开头算），决定环绕相位曲线的起点
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.revision = 0  # 设置每次实际改变时加一，渲染缓存据此判断录下的输出是否前后一致
         self.lock = threading.Lock()
         
         self.bass_zi = None
         self.treble_zi = None
         self.current_bass_sos = None
         self.current_treble_sos = None
-        self.side_buffer = np.zeros((int(0.05 * sr),), dtype=np.float32)
-        self.limiter_gain = 1.0
-        self.alpha_rel = np.exp(-1.0 / (100 * self.sr / 1000.0))
+        self.coefs = None  # 由 (采样率, 设置) 推导出的滤波器系数与增益，update_settings 时失效
+        self.side_delay = DelayLine(int(0.05 * sr))
+        self.limiter = PeakLimiter(sr, DEFAULT_SETTINGS["限幅"])
 
         self.reverb = AdvancedReverb(sr)
+        self.conv_reverb = None  # 第一次用到卷积混响时再创建
+        self.prepare(4096)
 
     def update_settings(self, new_settings):
         with self.lock:
-            self.settings.update(new_settings)
+            merged = dict(self.settings, **new_settings)
+            if merged != self.settings:
+                self.settings = merged
+                self.revision += 1
+            self.coefs = None
+
+    def _get_coefs(self):
+        """返回当前设置对应的系数；只在缓存失效后重新设计滤波器"""
+        with self.lock:
+            if self.coefs is None:
+                self.coefs = self._design_coefs(self.settings.copy())
+            return self.coefs
+
+    def _design_coefs(self, settings):
+        sr = self.sr
+        if self.current_bass_sos is None:
+            self.current_bass_sos = signal.butter(2, 100 / (sr / 2), btype='low', output='sos')
+            self.current_treble_sos = signal.butter(2, 4000 / (sr / 2), btype='high', output='sos')
+        coefs = {"bass_gain": None, "treble_gain": None}
+        if settings["低音"] > 50:
+            coefs["bass_gain"] = (settings["低音"] - 50) / 50.0
+        if settings["高音"] > 60:
+            coefs["treble_gain"] = (settings["高音"] - 60) / 40.0
+        coefs["intensity"] = settings["环绕强度"] / 100.0
+        coefs["depth"] = settings["环绕深度"] / 100.0
+        coefs["env"] = ENV_DATA.get(settings.get("环境", "无"), (0.0, 0.5, 0.5))
+        coefs["reverb_mode"] = settings.get("混响", "算法")
+        coefs["ceiling_db"] = float(settings.get("限幅", DEFAULT_SETTINGS["限幅"]))
+        return coefs
 
     def _get_lowshelf_sos(self, fc, gain_db, Q=0.707):
         A = 10**(gain_db / 40)
@@ -165,61 +636,132 @@ class UltimateAudioEngine:
         a2 = (A + 1) - (A - 1) * cs - 2 * np.sqrt(A) * alpha
         return np.array([[b0/a0, b1/a0, b2/a0, 1.0, a1/a0, a2/a0]])
 
-    def process_chunk(self, chunk):
-        with self.lock:
-            settings = self.settings.copy()
-        
-        data = chunk.copy()
+    def prepare(self, max_frames):
+        """在打开音频流时按最大帧数预分配工作缓冲区"""
+        self.max_frames = max_frames
+        self.mid_buf = np.zeros(max_frames, dtype=np.float32)
+        self.side_buf = np.zeros(max_frames, dtype=np.float32)
+        self.tmp_buf = np.zeros(max_frames, dtype=np.float32)
+        self.side_delay.reserve(max_frames)
+        self.reverb.prepare(max_frames)
+        self.limiter.prepare(max_frames)
+        if self.conv_reverb is not None:
+            self.conv_reverb.prepare(max_frames)
+
+    def seek(self, frame):
+        """从歌曲第 frame 帧开始处理（跳转、分段渲染时调用），环绕相位曲线从对应位置接上"""
+        self.position = int(frame)
+
+    def _phase(self, coefs, n, out):
+        """把当前位置起 n 帧的环绕相位曲线写入 out；一个周期的曲线只取决于强度，缓存在系数里"""
+        table = coefs.get("phase")
+        if table is None:
+            table = coefs["phase"] = np.sin(np.linspace(0, np.pi * coefs["intensity"],
+                                                        self.PHASE_PERIOD)).astype(np.float32)
+        period = self.PHASE_PERIOD
+        offset, done = self.position % period, 0
+        while done < n:
+            k = min(n - done, period - offset)
+            out[done:done + k] = table[offset:offset + k]
+            done += k
+            offset = 0
+        return out
+
+    def process_into(self, in_buf, out_buf):
+        """把 (n, 2) 的 in_buf 处理后写入 out_buf（可与 in_buf 相同），使用预分配缓冲区
+
+        M/S、环绕、限幅等引擎自身的计算不分配内存；低音/高音（sosfilt）和混响（lfilter、FFT）
+        由 scipy 返回新数组，每块仍有与 chunk 成正比的临时分配（用完即释放）。
+        """
+        n = len(in_buf)
+        if n > self.max_frames:
+            self.prepare(n)
+        coefs = self._get_coefs()
         sr = self.sr
         
         # 1. 蝰蛇分轨 (M/S 矩阵) - 实现多音效并发的基础
-        left, right = data[:, 0], data[:, 1]
-        mid = (left + right) / 2.0   # 中置 (负责低音和人声)
-        side = (left - right) / 2.0  # 侧置 (负责空间和环境)
+        left, right = in_buf[:, 0], in_buf[:, 1]
+        mid, side, tmp = self.mid_buf[:n], self.side_buf[:n], self.tmp_buf[:n]
+        np.add(left, right, out=mid)
+        mid *= 0.5       # 中置 (负责低音和人声)
+        np.subtract(left, right, out=side)
+        side *= 0.5      # 侧置 (负责空间和环境)
 
         # 2. 蝰蛇超重低音 (Psychoacoustic Bass)
-        bass_intensity = settings["低音"]
-        if bass_intensity > 50:
-            gain = (bass_intensity - 50) / 50.0
-            b_low, a_low = signal.butter(2, 100 / (sr / 2), btype='low')
-            bass_core = signal.lfilter(b_low, a_low, mid)
+        gain = coefs["bass_gain"]
+        if gain is not None:
+            # 滤波状态跨 chunk 保留，避免块边界处的咔嗒声
+            if self.bass_zi is None:
+                self.bass_zi = np.zeros((self.current_bass_sos.shape[0], 2))
+            bass_core, self.bass_zi = signal.sosfilt(self.current_bass_sos, mid, zi=self.bass_zi)
             # 非线性谐波生成
-            harmonics = np.tanh(bass_core * (1.0 + gain * 2.0)) - bass_core
-            mid += harmonics * (gain * 0.5) 
+            np.multiply(bass_core, 1.0 + gain * 2.0, out=tmp)
+            np.tanh(tmp, out=tmp)
+            tmp -= bass_core
+            tmp *= gain * 0.5
+            mid += tmp
+        else:
+            self.bass_zi = None
 
         # 3. 蝰蛇 3D 环绕 (VHS+ Surround)
-        intensity = settings["环绕强度"] / 100.0
-        depth = settings["环绕深度"] / 100.0
+        intensity = coefs["intensity"]
+        depth = coefs["depth"]
         if intensity > 0:
             side *= (1.0 + intensity * 2.0)
             delay_samples = int(depth * 0.03 * sr) 
             if delay_samples > 0:
-                delayed_side = np.concatenate([self.side_buffer[-delay_samples:], side])[:len(side)]
-                self.side_buffer = np.roll(self.side_buffer, -len(side))
-                self.side_buffer[-len(side):] = side
-                side = side * 0.7 + delayed_side * 0.3
-            phase = np.sin(np.linspace(0, np.pi * intensity, len(side)))
-            side += phase * side * 0.15
+                delayed_side = self.side_delay.process(side, delay_samples)
+                delayed_side *= 0.3
+                side *= 0.7
+                side += delayed_side
+            self._phase(coefs, n, tmp)
+            tmp *= side
+            tmp *= 0.15
+            side += tmp
 
         # 4. 蝰蛇清晰度 (Exciter / Clarity)
-        if settings["高音"] > 60:
-            t_gain = (settings["高音"] - 60) / 40.0
-            b_hi, a_hi = signal.butter(2, 4000 / (sr / 2), btype='high')
-            highs = signal.lfilter(b_hi, a_hi, mid)
-            clarity = np.abs(highs) * highs * (t_gain * 0.1)
-            mid += clarity
+        t_gain = coefs["treble_gain"]
+        if t_gain is not None:
+            if self.treble_zi is None:
+                self.treble_zi = np.zeros((self.current_treble_sos.shape[0], 2))
+            highs, self.treble_zi = signal.sosfilt(self.current_treble_sos, mid, zi=self.treble_zi)
+            np.abs(highs, out=tmp)
+            tmp *= highs
+            tmp *= t_gain * 0.1
+            mid += tmp
+        else:
+            self.treble_zi = None
 
         # 5. 重组与环境混响 (Environment)
-        data[:, 0] = mid + side 
-        data[:, 1] = mid - side 
-        data *= 1.4 
-        
-        env = settings.get("环境", "无")
-        wet, d_time, damp = ENV_DATA.get(env, (0.0, 0.5, 0.5))
+        np.add(mid, side, out=out_buf[:, 0])
+        np.subtract(mid, side, out=out_buf[:, 1])
+        out_buf *= 1.4
+
+        wet, d_time, damp = coefs["env"]
         if wet > 0:
-            data = self.reverb.process(data, wet, d_time, damp)
-            
-        return np.clip(data, -1.0, 1.0)
+            if coefs["reverb_mode"] == "卷积":
+                if self.conv_reverb is None:
+                    self.conv_reverb = ConvolutionReverb(sr, self.max_frames)
+                self.conv_reverb.process_into(out_buf, wet, d_time, damp)
+            else:
+                self.reverb.process_into(out_buf, wet, d_time, damp)
+
+        # 6. 前瞻限幅（替代硬削波，混响之后统一处理一次）
+        self.position += n
+        self.limiter.set_ceiling(coefs["ceiling_db"])
+        return self.limiter.process_into(out_buf)
+
+    def process_chunk(self, chunk):
+        return self.process_into(chunk, np.empty(chunk.shape, dtype=np.float32))
+
+    @property
+    def latency(self):
+        """输出比输入晚的帧数（限幅器的前瞻）；seek 之后的前 latency 帧输出属于跳转之前，应丢弃"""
+        return self.limiter.lookahead
+
+    def flush(self):
+        """歌曲结束时取出限幅器延迟线里剩下的 latency 帧，接在最后一块之后输出"""
+        return self.limiter.flush()
 
 class UltimateTUI:
     def __init__(self, engine):
@@ -232,6 +774,9 @@ class UltimateTUI:
         self.overlay = self.config.get("overlay", {"低音": 50, "高音": 50, "环绕强度": 50, "环绕深度": 50})
         self.overlay_keys = list(self.overlay.keys())
         self.overlay_idx = 0
+        # 各环境选用的混响方式，只记录改成“卷积”的环境
+        self.reverb_modes = {e: m for e, m in self.config.get("reverb_modes", {}).items() if m in REVERB_MODES}
+        self.ceiling_db = self.config.get("ceiling_db", DEFAULT_SETTINGS["限幅"])  # 只能在配置文件中修改
         self.mode = "PRESET"
         self.msg = "Tab: 切换模式 | WASD/↑↓: 选择 | ←→: 微调 | Q: 退出"
         self.sync_to_engine()
@@ -248,19 +793,23 @@ class UltimateTUI:
             json.dump({
                 "preset": self.presets[self.preset_idx], 
                 "overlay": self.overlay,
-                "env": self.envs[self.env_idx]
+                "env": self.envs[self.env_idx],
+                "reverb_modes": self.reverb_modes,
+                "ceiling_db": self.ceiling_db
             }, f)
 
     def get_final_settings(self):
-        p_name = self.presets[self.preset_idx]
-        b, t, s, d = PRESET_DATA[p_name]
-        return {
-            "低音": b + (self.overlay["低音"] - 50),
-            "高音": t + (self.overlay["高音"] - 50),
-            "环绕强度": s + (self.overlay["环绕强度"] - 50),
-            "环绕深度": d + (self.overlay["环绕深度"] - 50),
-            "环境": self.envs[self.env_idx],
-        }
+        return final_settings(self.presets[self.preset_idx], self.overlay, self.envs[self.env_idx],
+                              self.reverb_modes, self.ceiling_db)
+
+    def toggle_reverb_mode(self):
+        env = self.envs[self.env_idx]
+        if env == "无":
+            return
+        if self.reverb_modes.get(env, "算法") == "算法":
+            self.reverb_modes[env] = "卷积"
+        else:
+            self.reverb_modes.pop(env, None)
 
     def sync_to_engine(self):
         self.engine.update_settings(self.get_final_settings())
@@ -280,7 +829,8 @@ class UltimateTUI:
             is_selected = (i == self.env_idx and self.mode == "ENVIRONMENT")
             style = "bold reverse green" if is_selected else ""
             mark = "✓ " if is_selected else "  "
-            e_table.add_row(f"{mark}{e}", style=style)
+            conv = " [卷积]" if self.reverb_modes.get(e) == "卷积" else ""
+            e_table.add_row(f"{mark}{e}{conv}", style=style)
 
         # 微调滑块
         o_panels = []
@@ -300,7 +850,7 @@ class UltimateTUI:
         # 底部操作提示
         footer_lines = (
             "[bold green]操作:[/bold green] Tab 切换模式 | WASD/↑↓ 选择\n"
-            "           ← → 微调 | Q 退出"
+            "           ← → 微调 / 切换环境混响(算法/卷积) | Q 退出"
         )
         footer_panel = Panel(footer_lines,
                              border_style="yellow" if self.mode == "OVERLAY" else "white",
@@ -357,22 +907,29 @@ class UltimateTUI:
                 elif self.mode == "ENVIRONMENT":
                     if key in (readchar.key.UP, 'w'): self.env_idx = (self.env_idx - 1) % len(self.envs)
                     elif key in (readchar.key.DOWN, 's'): self.env_idx = (self.env_idx + 1) % len(self.envs)
+                    elif key in (readchar.key.LEFT, readchar.key.RIGHT, 'a', 'd'): self.toggle_reverb_mode()
 
                 self.sync_to_engine()
                 self.save_config()
                 if key.lower() == 'q': break
 
-def audio_callback(in_data, frame_count, time_info, status, engine=None):
+def audio_callback(in_data, frame_count, time_info, status, engine=None, out_buf=None):
     audio_data = np.frombuffer(in_data, dtype=np.float32).reshape(-1, 2)
-    processed_data = engine.process_chunk(audio_data)
-    return (processed_data.tobytes(), pyaudio.paContinue)
+    processed_data = engine.process_into(audio_data, out_buf[:frame_count])
+    # 直接交出连续的 out_buf（PyAudio 按 "z#" 读取缓冲区并立即复制），不必每次 tobytes()；
+    # memoryview 不行，"z#" 只接受没有 releasebuffer 的对象
+    return (processed_data, pyaudio.paContinue)
 
 def main():
     RATE = 44100
+    FRAMES = 1024
     engine = UltimateAudioEngine(sr=RATE)
+    engine.prepare(FRAMES)
+    out_buf = np.zeros((FRAMES, 2), dtype=np.float32)
     p = pyaudio.PyAudio()
     stream = p.open(format=pyaudio.paFloat32, channels=2, rate=RATE, input=True, output=True, 
-                    frames_per_buffer=1024, stream_callback=lambda *args: audio_callback(*args, engine=engine))
+                    frames_per_buffer=FRAMES,
+                    stream_callback=lambda *args: audio_callback(*args, engine=engine, out_buf=out_buf))
     
     stream.start_stream()
     try:
@@ -384,5 +941,33 @@ def main():
         stream.close()
         p.terminate()
 
+# ---------- 基准测试：python effects.py --bench ----------
+def _bench(chunk=4096, seconds=5.0, sr=44100):
+    """单独测两种环境混响每个 chunk 的耗时（fxbench.py 测的是整条音效链）"""
+    rng = np.random.default_rng(3)
+    frames = int(seconds * sr) // chunk * chunk
+    data = (rng.standard_normal((frames, 2)) * 0.2).astype(np.float32)
+    budget_ms = chunk / sr * 1000
+    print(f"chunk {chunk} 帧（预算 {budget_ms:.1f} ms），每种组合处理 {frames / sr:.1f} 秒噪声")
+    for env, (wet, decay, damping) in ENV_DATA.items():
+        if wet <= 0.01:
+            continue
+        line = f"  {env:<6}"
+        for name, reverb in (("算法", AdvancedReverb(sr, chunk)), ("卷积", ConvolutionReverb(sr, chunk))):
+            reverb.process_into(data[:chunk].copy(), wet, decay, damping)  # 预热（卷积混响生成脉冲响应）
+            buf = np.empty((chunk, 2), dtype=np.float32)
+            times = []
+            for i in range(0, frames, chunk):
+                buf[:] = data[i:i + chunk]
+                t = time.perf_counter()
+                reverb.process_into(buf, wet, decay, damping)
+                times.append(time.perf_counter() - t)
+            ms = float(np.median(times)) * 1000
+            line += f"  {name} {ms:6.2f} ms/块 ({budget_ms / ms:6.0f}x 实时)"
+        print(line)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if '--bench' in sys.argv:
+        _bench()
+    else:
+        main()
@@ -0,0 +1,207 @@
+"""effects.py 音效引擎基准测试
+
+用合成立体声信号驱动 UltimateAudioEngine，遍历全部 预设 × 环境 × chunk 大小（可加上混响方式），
+记录实时倍率、每个 chunk 的 p50/p99 耗时和内存分配，结果输出为 JSON，便于比较不同提交和设备。
+
+    python fxbench.py                      # 全部组合，结果写入 fxbench.json
+    python fxbench.py --quick              # 少量组合快速检查
+    python fxbench.py -o new.json --compare old.json
+    python fxbench.py --quick --reverbs 算法,卷积   # 对比两种环境混响
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+
+import effects
+
+CHUNK_SIZES = (256, 1024, 4096, 8192)
+
+def make_signal(frames, sr=44100, seed=1):
+    """合成立体声测试信号：对数扫频 + 低音 + 噪声，左右声道略有不同，峰值约 0.8"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames) / sr
+    span = frames / sr
+    # 20 Hz -> 20 kHz 指数扫频
+    sweep = np.sin(2 * np.pi * 20 * span / np.log(1000) * (1000 ** (t / span) - 1))
+    bass = np.sin(2 * np.pi * 55 * t)
+    noise = rng.standard_normal((frames, 2)) * 0.05
+    out = np.empty((frames, 2), dtype=np.float32)
+    out[:, 0] = 0.4 * sweep + 0.3 * bass + noise[:, 0]
+    out[:, 1] = 0.4 * np.roll(sweep, 37) + 0.3 * bass + noise[:, 1]
+    return out
+
+def bench_case(preset, env, chunk, signal, sr=44100, warmup=4, alloc_chunks=16, reverb="算法"):
+    engine = effects.UltimateAudioEngine(sr=sr)
+    engine.prepare(chunk)
+    engine.update_settings(dict(effects.preset_settings(preset, env), 混响=reverb))
+    out = np.zeros((chunk, 2), dtype=np.float32)
+    count = len(signal) // chunk
+    blocks = [signal[i * chunk:(i + 1) * chunk] for i in range(count)]
+    for block in blocks[:warmup]:
+        engine.process_into(block, out)
+
+    times = np.empty(count, dtype=np.float64)
+    clock = time.perf_counter_ns
+    for i, block in enumerate(blocks):
+        t0 = clock()
+        engine.process_into(block, out)
+        times[i] = clock() - t0
+    times /= 1e6  # ms
+
+    # 分配量单独测：tracemalloc 会拖慢计时
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        peak = 0
+        for block in blocks[:alloc_chunks]:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            engine.process_into(block, out)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        retained = tracemalloc.get_traced_memory()[0] - base
+    finally:
+        tracemalloc.stop()
+
+    budget_ms = chunk / sr * 1000
+    total_ms = float(times.sum())
+    return {
+        "preset": preset,
+        "env": env,
+        "reverb": reverb,
+        "chunk": chunk,
+        "chunks": count,
+        "budget_ms": round(budget_ms, 4),
+        "realtime_factor": round(count * budget_ms / total_ms, 2) if total_ms else None,
+        "p50_ms": round(float(np.percentile(times, 50)), 4),
+        "p99_ms": round(float(np.percentile(times, 99)), 4),
+        "max_ms": round(float(times.max()), 4),
+        "alloc_peak_bytes_per_chunk": int(peak),
+        "alloc_retained_bytes": int(retained),
+        "max_gain_reduction_db": round(engine.limiter.peak_reduction_db, 2),
+        "realtime_ok": bool(np.percentile(times, 99) < budget_ms),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def environment_info(sr, seconds):
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "sample_rate": sr,
+        "seconds_per_case": seconds,
+    }
+
+def run(presets, envs, chunks, seconds, sr=44100, progress=True, reverbs=("算法",)):
+    signal = make_signal(int(seconds * sr), sr)
+    results = []
+    # 环境为“无”时不经过混响，只测一次
+    cases = [(p, e, r) for p in presets for e in envs for r in (reverbs if e != "无" else reverbs[:1])]
+    total = len(cases) * len(chunks)
+    for preset, env, reverb in cases:
+        for chunk in chunks:
+            results.append(bench_case(preset, env, chunk, signal, sr, reverb=reverb))
+            if progress:
+                sys.stderr.write(f"\r- 已完成 {len(results)}/{total}")
+                sys.stderr.flush()
+    if progress:
+        sys.stderr.write("\n")
+    return {"meta": environment_info(sr, seconds), "results": results}
+
+def summarize(report):
+    """按 chunk 大小汇总：最慢组合、最低实时倍率、未达实时的组合数"""
+    lines = []
+    for chunk in sorted({r["chunk"] for r in report["results"]}):
+        rows = [r for r in report["results"] if r["chunk"] == chunk]
+        worst = max(rows, key=lambda r: r["p99_ms"])
+        slow = sum(1 for r in rows if not r["realtime_ok"])
+        lines.append(f"chunk {chunk:5}: 预算 {worst['budget_ms']:7.2f} ms | 实时倍率 最低 "
+                     f"{min(r['realtime_factor'] for r in rows):7.1f}x | p99 最慢 {worst['p99_ms']:7.3f} ms "
+                     f"({worst['preset']}/{worst['env']}/{worst.get('reverb', '算法')}) | 峰值分配 "
+                     f"{max(r['alloc_peak_bytes_per_chunk'] for r in rows) / 1024:7.1f} KB | 未达实时 {slow}/{len(rows)}")
+    return "\n".join(lines)
+
+def compare(old, new, threshold=0.10):
+    """对比两次结果中相同组合的实时倍率，列出变化超过 threshold 的组合"""
+    key = lambda r: (r["preset"], r["env"], r.get("reverb", "算法"), r["chunk"])
+    old_rows = {key(r): r for r in old["results"]}
+    lines, ratios = [], []
+    for r in new["results"]:
+        o = old_rows.get(key(r))
+        if not o or not o["realtime_factor"] or not r["realtime_factor"]:
+            continue
+        ratio = r["realtime_factor"] / o["realtime_factor"]
+        ratios.append(ratio)
+        if abs(ratio - 1) > threshold:
+            lines.append(f"  {r['preset']}/{r['env']}/{r.get('reverb', '算法')}/{r['chunk']}: "
+                         f"{o['realtime_factor']}x -> {r['realtime_factor']}x ({(ratio - 1) * 100:+.0f}%)")
+    if not ratios:
+        return "两次结果没有相同的组合"
+    head = (f"对比 {old['meta'].get('commit')} -> {new['meta'].get('commit')}: {len(ratios)} 个组合, "
+            f"实时倍率几何平均变化 {(np.exp(np.mean(np.log(ratios))) - 1) * 100:+.1f}%")
+    return "\n".join([head] + lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="effects.py 音效引擎基准测试")
+    parser.add_argument("-o", "--output", default="fxbench.json", help="结果 JSON 路径，- 表示输出到标准输出")
+    parser.add_argument("--seconds", type=float, help="每个组合处理的音频秒数（默认 3，--quick 时默认 1）")
+    parser.add_argument("--chunks", default=",".join(map(str, CHUNK_SIZES)), help="逗号分隔的 chunk 大小")
+    parser.add_argument("--presets", help="逗号分隔的预设名，默认全部")
+    parser.add_argument("--envs", help="逗号分隔的环境名，默认全部")
+    parser.add_argument("--reverbs", default="算法", help="逗号分隔的混响方式（算法,卷积）")
+    parser.add_argument("--quick", action="store_true", help="默认只测 3 个预设 × 3 个环境，每组合 1 秒")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.presets = args.presets or "无,电音,环绕"
+        args.envs = args.envs or "无,大厅,房间"
+    if args.seconds is None:
+        args.seconds = 1.0 if args.quick else 3.0
+    presets = args.presets.split(",") if args.presets else list(effects.PRESET_DATA)
+    envs = args.envs.split(",") if args.envs else list(effects.ENV_DATA)
+    for name in presets:
+        if name not in effects.PRESET_DATA:
+            parser.error(f"未知预设: {name}")
+    for name in envs:
+        if name not in effects.ENV_DATA:
+            parser.error(f"未知环境: {name}")
+    reverbs = args.reverbs.split(",")
+    for name in reverbs:
+        if name not in effects.REVERB_MODES:
+            parser.error(f"未知混响方式: {name}")
+    chunks = [int(c) for c in args.chunks.split(",")]
+
+    report = run(presets, envs, chunks, args.seconds, reverbs=reverbs)
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"- 结果已写入 {args.output}", file=sys.stderr)
+    print(summarize(report), file=sys.stderr)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(json.load(f), report), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import re
+import sys
+import time
+from array import array
+from bisect import bisect_right
+
+# 行首第一个时间标签 + 其余时间标签 + 歌词；秒数 ss / ss.x~ss.xxx 直接交给 float，mm:ss:xx 单独取出
+LINE_TAGS = re.compile(r'^\[(\d+):(\d{1,2}(?:\.\d{1,3})?)(?::(\d{1,3}))?\]'
+                       r'((?:\[\d+:\d{1,2}(?:[.:]\d{1,3})?\])*)(.*)$', re.MULTILINE)
+TIME_TAG = re.compile(r'\[(\d+):(\d{1,2}(?:\.\d{1,3})?)(?::(\d{1,3}))?\]')
+OFFSET_TAG = re.compile(r'\[offset:\s*([+-]?\d+)\s*\]', re.IGNORECASE)
+TRANS_TOLERANCE = 0.1  # 翻译与原文时间差在此范围内视为同一行（秒）
+
+def _stamp(mins, secs, frac):
+    t = int(mins) * 60 + float(secs)
+    return t + float("0." + frac) if frac else t
+
+def lrc_offset(text):
+    """LRC 文本中 [offset:±ms] 的值（秒），没有时为 None"""
+    m = OFFSET_TAG.search(text) if text else None
+    return int(m.group(1)) / 1000 if m else None
+
+def parse_lrc(text, default_offset=0.0):
+    """把 LRC 文本解析为按时间排序的 (times, texts)
+
+    支持一行多个时间标签、[offset:±ms] 以及 mm:ss:xx / 毫秒等写法；空白歌词行会被丢弃。
+    文本没有 offset 标签时使用 default_offset（秒）。
+    """
+    if not text:
+        return array('d'), []
+    times, texts = [], []
+    extra = False
+    for mins, secs, frac, more, txt in LINE_TAGS.findall(text):
+        txt = txt.strip()
+        if not txt:
+            continue
+        times.append(_stamp(mins, secs, frac))
+        texts.append(txt)
+        if more:
+            extra = True
+            for tag in TIME_TAG.findall(more):
+                times.append(_stamp(*tag))
+                texts.append(txt)
+    offset = lrc_offset(text)
+    if offset is None:
+        offset = default_offset
+    if offset:
+        # offset 为正表示歌词整体提前
+        times = [t - offset if t > offset else 0.0 for t in times]
+    if extra or any(a > b for a, b in zip(times, times[1:])):
+        # 稳定排序，同一时间保持原文顺序；只有多时间标签或行序错乱时才需要
+        order = sorted(range(len(times)), key=times.__getitem__)
+        times, texts = [times[i] for i in order], [texts[i] for i in order]
+    return array('d', times), texts
+
+class LyricTrack:
+    """一首歌的歌词：times 为紧凑的时间数组，texts/trans 为对应的原文与翻译"""
+    def __init__(self, times, texts, trans=None):
+        self.times = times
+        self.texts = texts
+        self.trans = trans or [''] * len(texts)
+        self._rendered = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def index_at(self, sec):
+        """播放到 sec 时已经出现的行数（时间 <= sec 的行）"""
+        return bisect_right(self.times, sec)
+
+    def next_time(self, index):
+        return self.times[index] if index < len(self.times) else None
+
+    def rendered(self):
+        """每行预先拼好的终端文本（含换行），只在第一次使用时生成"""
+        if self._rendered is None:
+            self._rendered = [
+                f"    {text}\r\n    {trans}\r\n\r\n" if trans else f"    {text}\r\n\r\n"
+                for text, trans in zip(self.texts, self.trans)
+            ]
+        return self._rendered
+
+def align_translations(times, sub_times, sub_texts, tolerance=TRANS_TOLERANCE):
+    """为每一行原文找时间最接近的翻译（误差不超过 tolerance），找不到时为空；两边都已排序，双指针线性合并"""
+    trans = []
+    n, j = len(sub_times), 0
+    for t in times:
+        while j < n and sub_times[j] < t:
+            j += 1
+        best, best_dt = '', tolerance
+        if j > 0 and t - sub_times[j - 1] <= best_dt:
+            best, best_dt = sub_texts[j - 1], t - sub_times[j - 1]
+        if j < n and sub_times[j] - t <= best_dt:
+            best = sub_texts[j]
+        trans.append(best)
+    return trans
+
+def parse_lyrics(main_lrc, sub_lrc=""):
+    """解析原文和翻译歌词；原文没有时间标签时按纯文本逐行显示在 0 秒
+
+    翻译没有自己的 offset 标签时沿用原文的，保证两边按同样的时间轴对齐。
+    """
+    times, texts = parse_lrc(main_lrc)
+    if not texts and main_lrc:
+        lines = [line for line in main_lrc.split('\n') if line.strip()]
+        return LyricTrack(array('d', [0.0] * len(lines)), lines)
+    sub_times, sub_texts = parse_lrc(sub_lrc, lrc_offset(main_lrc) or 0.0)
+    return LyricTrack(times, texts, align_translations(times, sub_times, sub_texts))
+
+class LyricRenderer:
+    """按播放位置增量输出歌词：平时只追加新出现的行，跳转只移动位置，重绘时只输出屏幕放得下的最后几行"""
+    def __init__(self, track):
+        self.track = track
+        self.shown = 0  # 已输出（属于"历史"）的行数
+
+    def seek(self, sec):
+        self.shown = self.track.index_at(sec)
+
+    def advance(self, sec):
+        """返回到 sec 为止新出现的行的文本（没有时为空字符串）"""
+        n = self.track.index_at(sec)
+        if n <= self.shown:
+            return ""
+        start, self.shown = self.shown, n
+        return "".join(self.track.rendered()[start:n])
+
+    def history(self, max_rows=None):
+        """已出现的行；给出 max_rows 时只取末尾能放进这么多行终端的部分"""
+        lines = self.track.rendered()[:self.shown]
+        if max_rows is None:
+            return "".join(lines)
+        rows, start = 0, len(lines)
+        while start > 0:
+            rows += lines[start - 1].count("\n")
+            if rows > max_rows:
+                break
+            start -= 1
+        return "".join(lines[start:])
+
+    def next_time(self):
+        return self.track.next_time(self.shown)
+
+# ---------- 基准测试：python lrc.py --bench ----------
+def _legacy_parse(main_lrc, sub_lrc):
+    # 旧实现：逐行 re.match，一行只认一个时间标签，翻译按浮点数完全相等匹配
+    def lrc_to_dict(lrc):
+        d = {}
+        if not lrc: return d
+        for line in lrc.split('\n'):
+            match = re.match(r'\[(\d+):(\d+\.\d+)\](.*)', line)
+            if match:
+                t = int(match.group(1)) * 60 + float(match.group(2))
+                txt = match.group(3).strip()
+                if txt: d[t] = txt
+        return d
+    m_dict = lrc_to_dict(main_lrc)
+    s_dict = lrc_to_dict(sub_lrc)
+    return [{'time': t, 'text': m_dict[t], 'trans': s_dict.get(t, "")} for t in sorted(m_dict)]
+
+def _make_sample(lines):
+    import random
+    rnd = random.Random(7)
+    words = ["夜空中最亮的星", "Shine bright like a diamond", "사랑해요 오늘도", "君の名前を呼んだ",
+             "Ты моё солнце", "أحبك كثيرا", "Tình yêu không lời"]
+    main, sub = ["[ti:bench]", "[ar:various]", "[offset:+120]"], ["[by:bench]", "[offset:+120]"]
+    t = 0.0
+    for i in range(lines):
+        t += rnd.uniform(0.8, 4.0)
+        stamp = f"[{int(t // 60):02d}:{t % 60:05.2f}]"
+        if i % 10 == 0:
+            # 副歌：一行带两个时间标签
+            t2 = t + 200
+            stamp += f"[{int(t2 // 60):02d}:{t2 % 60:05.2f}]"
+        main.append(stamp + rnd.choice(words) + f" {i}")
+        jitter = t + rnd.choice((0.0, 0.01, -0.01))  # 翻译时间戳常有 10ms 误差
+        sub.append(f"[{int(jitter // 60):02d}:{jitter % 60:05.2f}]译文 {i}")
+    return "\n".join(main), "\n".join(sub)
+
+def _bench(lines=20000, repeat=5):
+    main, sub = _make_sample(lines)
+
+    def best(fn):
+        result, elapsed = None, float('inf')
+        for _ in range(repeat):
+            t = time.perf_counter()
+            result = fn()
+            elapsed = min(elapsed, time.perf_counter() - t)
+        return result, elapsed * 1000
+
+    legacy, legacy_ms = best(lambda: _legacy_parse(main, sub))
+    track, new_ms = best(lambda: parse_lyrics(main, sub))
+    print(f"LRC: {lines} 行原文 + {lines} 行翻译, {len(main) + len(sub)} 字符")
+    print(f"解析   旧: {legacy_ms:8.2f} ms  {len(legacy)} 行, 匹配到翻译 {sum(1 for x in legacy if x['trans'])}")
+    print(f"解析   新: {new_ms:8.2f} ms  {len(track)} 行, 匹配到翻译 {sum(1 for x in track.trans if x)}")
+
+    targets = [track.times[-1] * k / 200 for k in range(200)]
+
+    def legacy_seek():
+        for target in targets:
+            history = []
+            idx = 0
+            while idx < len(legacy) and legacy[idx]['time'] < target:
+                history.append(legacy[idx])
+                idx += 1
+
+    renderer = LyricRenderer(track)
+
+    def new_seek():
+        for target in targets:
+            renderer.seek(target)
+
+    _, legacy_seek_ms = best(legacy_seek)
+    _, new_seek_ms = best(new_seek)
+    print(f"跳转 200 次 旧: {legacy_seek_ms:8.2f} ms   新: {new_seek_ms:8.3f} ms")
+
+    renderer.seek(track.times[-1])
+    legacy_lines = [f"    {x['text']}" + (f"\n    {x['trans']}" if x['trans'] else "") for x in legacy]
+    _, legacy_redraw_ms = best(lambda: "".join(s.replace('\n', '\r\n') + "\r\n\r\n" for s in legacy_lines))
+    _, new_redraw_ms = best(lambda: renderer.history(max_rows=60))
+    print(f"整屏重绘 旧: {legacy_redraw_ms:8.2f} ms ({sum(len(s) for s in legacy_lines)} 字符)"
+          f"   新: {new_redraw_ms:8.3f} ms ({len(renderer.history(max_rows=60))} 字符)")
+
+if __name__ == '__main__':
+    if '--bench' in sys.argv:
+        _bench()
+    else:
+        print("用法: python lrc.py --bench")
@@ -0,0 +1,393 @@
+import re
+import sys
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 各接口的超时 (连接, 读取) 秒数
+ENDPOINT_TIMEOUTS = {
+    "metadata": (3.05, 10),
+    "audio": (3.05, 30),
+    "cover": (3.05, 10),
+    "comment": (3.05, 5),
+    "playlist": (3.05, 10),
+    "search": (3.05, 10),
+    "default": (3.05, 10),
+}
+
+class HttpClient:
+    """共享的 HTTP 客户端：每个域名一个长连接 Session，带有限次数的退避重试和耗时统计"""
+    def __init__(self, retries=2, backoff=0.3, pool_size=8):
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def session_for(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                retry = Retry(total=self.retries, backoff_factor=self.backoff,
+                              status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=frozenset(["GET"]))
+                adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=self.pool_size)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[host] = session
+            return session
+
+    def _record(self, endpoint, ms, ok):
+        with self.lock:
+            st = self.stats.setdefault(endpoint, {"count": 0, "errors": 0, "total_ms": 0.0, "last_ms": 0.0})
+            st["count"] += 1
+            st["total_ms"] += ms
+            st["last_ms"] = ms
+            if not ok:
+                st["errors"] += 1
+
+    def get(self, url, endpoint="default", **kwargs):
+        kwargs.setdefault("timeout", ENDPOINT_TIMEOUTS.get(endpoint, ENDPOINT_TIMEOUTS["default"]))
+        start = time.perf_counter()
+        ok = False
+        try:
+            resp = self.session_for(url).get(url, **kwargs)
+            ok = True
+            return resp
+        finally:
+            self._record(endpoint, (time.perf_counter() - start) * 1000, ok)
+
+    def timings(self):
+        """返回 {接口: {count, errors, avg_ms, last_ms}} 的快照"""
+        with self.lock:
+            return {
+                name: {"count": st["count"], "errors": st["errors"],
+                       "avg_ms": st["total_ms"] / st["count"], "last_ms": st["last_ms"]}
+                for name, st in self.stats.items()
+            }
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+CLIENT = HttpClient()
+
+def get(url, endpoint="default", **kwargs):
+    return CLIENT.get(url, endpoint, **kwargs)
+
+class StreamBuffer:
+    """边下边播缓冲区：后台线程把响应数据追加到内存，读取方在下载完成前即可按位置读取
+
+    下载量领先最远读取位置超过 max_ahead 字节时暂停（背压）；连接中断时用 Range 续传。
+    """
+    def __init__(self, url=None, endpoint="audio", data=None, chunk_size=64 * 1024,
+                 max_ahead=8 * 1024 * 1024, on_complete=None, retries=3):
+        self.url = url
+        self.endpoint = endpoint
+        self.buf = bytearray(data or b"")
+        self.total = len(self.buf) if data is not None else None
+        self.done = data is not None
+        self.error = None
+        self.cancelled = False
+        self.read_pos = 0
+        self.chunk_size = chunk_size
+        self.max_ahead = max_ahead
+        self.on_complete = on_complete
+        self.retries = retries
+        self.cond = threading.Condition()
+        if not self.done:
+            threading.Thread(target=self._run, daemon=True).start()
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(data=data)
+
+    def _download_once(self):
+        offset = len(self.buf)
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        resp = get(self.url, self.endpoint, stream=True, headers=headers)
+        try:
+            resp.raise_for_status()
+            skip = offset if (offset and resp.status_code != 206) else 0  # 服务器不支持续传时跳过已有部分
+            length = resp.headers.get("Content-Length")
+            if self.total is None and length:
+                with self.cond:
+                    self.total = int(length) + (offset if resp.status_code == 206 else 0)
+                    self.cond.notify_all()
+            for chunk in resp.iter_content(self.chunk_size):
+                if skip:
+                    cut = min(skip, len(chunk))
+                    chunk, skip = chunk[cut:], skip - cut
+                    if not chunk:
+                        continue
+                with self.cond:
+                    while (not self.cancelled and self.max_ahead
+                           and len(self.buf) - self.read_pos > self.max_ahead):
+                        self.cond.wait(0.5)
+                    if self.cancelled:
+                        return
+                    self.buf.extend(chunk)
+                    self.cond.notify_all()
+        finally:
+            resp.close()
+
+    def _run(self):
+        attempt = 0
+        while True:
+            received = len(self.buf)
+            try:
+                self._download_once()
+                break
+            except Exception as e:
+                # 上次失败之后收到过数据说明续传有效，只对连续失败计数
+                attempt = 1 if len(self.buf) > received else attempt + 1
+                if self.cancelled or attempt > self.retries:
+                    with self.cond:
+                        self.error = e
+                        self.done = True
+                        self.cond.notify_all()
+                    return
+                time.sleep(0.3 * attempt)
+        with self.cond:
+            self.done = True
+            if not self.cancelled:
+                self.total = len(self.buf)
+            self.cond.notify_all()
+        if self.on_complete and not self.cancelled:
+            self.on_complete(bytes(self.buf))
+
+    @property
+    def size(self):
+        return len(self.buf)
+
+    def wait_for(self, n, timeout=None):
+        """等待至少 n 字节到达（或下载结束），返回是否满足"""
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.buf) >= n or self.done, timeout)
+            return len(self.buf) >= n or self.done
+
+    def read(self, pos, n):
+        """读取 [pos, pos+n)，数据未到时阻塞；到达文件末尾返回 b''"""
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.buf) > pos or self.done)
+            data = bytes(self.buf[pos:pos + n])
+            if pos + len(data) > self.read_pos:
+                self.read_pos = pos + len(data)
+                self.cond.notify_all()
+            return data
+
+    def iter_from(self, pos=0, n=64 * 1024):
+        while True:
+            data = self.read(pos, n)
+            if not data:
+                return
+            pos += len(data)
+            yield data
+
+    def head(self, n):
+        with self.cond:
+            return bytes(self.buf[:n])
+
+    def getvalue(self):
+        """等待下载完成并返回完整数据"""
+        with self.cond:
+            self.read_pos = float("inf")  # 解除背压
+            self.cond.notify_all()
+            self.cond.wait_for(lambda: self.done)
+            if self.error and not self.buf:
+                raise self.error
+            return bytes(self.buf)
+
+    def cancel(self):
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+
+    # 作为 LocalStreamServer 的音频源
+    content_type = "audio/mpeg"
+
+    def length(self):
+        return self.total
+
+    def open(self, start):
+        return self.iter_from(start)
+
+class LocalStreamServer:
+    """本地 HTTP 桥：把内存中的音频源以支持 Range 的 URL 提供给常驻 mpv，跳转由 mpv 自己发起
+
+    音频源需要提供 content_type、length()（未知时返回 None）和 open(start)（从字节 start 起逐块产出数据）。
+    """
+    def __init__(self, host="127.0.0.1"):
+        self.host = host
+        self.sources = {}
+        self.server = None
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self.server is None:
+            self.server = ThreadingHTTPServer((self.host, 0), _StreamHandler)
+            self.server.daemon_threads = True
+            self.server.sources = self.sources
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def register(self, source, suffix=""):
+        with self.lock:
+            self._ensure_started()
+            self.counter += 1
+            token = f"{self.counter}{suffix}"
+            self.sources[token] = source
+            return f"http://{self.host}:{self.server.server_port}/{token}"
+
+    def unregister(self, url):
+        with self.lock:
+            self.sources.pop(url.rsplit("/", 1)[-1], None)
+
+    def close(self):
+        with self.lock:
+            if self.server:
+                self.server.shutdown()
+                self.server.server_close()
+                self.server = None
+            self.sources.clear()
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)", re.ASCII)
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _parse_range(self, length):
+        """解析单个 Range，返回 (start, end, ranged)，end 含在内；格式错误或无法满足时返回 None
+
+        长度未知、空文件或多段 Range 时忽略该头，整个返回（200）。
+        """
+        value = self.headers.get("Range")
+        if value is None or not length:
+            return 0, (length or 0) - 1, False
+        if "," in value:
+            return 0, length - 1, False
+        match = _RANGE.fullmatch(value.strip())
+        if match is None or not any(match.groups()):
+            return None
+        first, last = match.groups()
+        if not first:
+            # 后缀形式 bytes=-N：最后 N 字节
+            n = int(last)
+            if n == 0:
+                return None
+            return max(0, length - n), length - 1, True
+        start = int(first)
+        end = min(int(last), length - 1) if last else length - 1
+        if start >= length or end < start:
+            return None
+        return start, end, True
+
+    def _headers(self):
+        source = self.server.sources.get(self.path.lstrip("/"))
+        if source is None:
+            self.send_error(404)
+            return None, None, None
+        length = source.length()
+        parsed = self._parse_range(length)
+        if parsed is None:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{length}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None, None, None
+        start, end, ranged = parsed
+        self.send_response(206 if ranged else 200)
+        self.send_header("Content-Type", source.content_type)
+        self.send_header("Accept-Ranges", "bytes")
+        if length is not None:
+            self.send_header("Content-Length", str(end + 1 - start))
+            if ranged:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{length}")
+        else:
+            # 长度未知时以关闭连接表示结束
+            self.close_connection = True
+            end = None
+        self.end_headers()
+        return source, start, end
+
+    def do_HEAD(self):
+        self._headers()
+
+    def do_GET(self):
+        source, start, end = self._headers()
+        if source is None:
+            return
+        chunks = source.open(start)
+        remaining = None if end is None else end + 1 - start
+        try:
+            for chunk in chunks:
+                if remaining is not None:
+                    chunk = chunk[:remaining]
+                    remaining -= len(chunk)
+                self.wfile.write(chunk)
+                if remaining == 0:
+                    break
+        except (BrokenPipeError, ConnectionError, OSError):
+            self.close_connection = True  # mpv 跳转或切歌时会主动断开
+        finally:
+            chunks.close()
+
+LOCAL_SERVER = LocalStreamServer()
+
+class _ThrottledSource:
+    """基准测试用音频源：按固定速率逐块发出数据，模拟较慢的网络"""
+    content_type = "audio/mpeg"
+
+    def __init__(self, data, rate, chunk=16 * 1024):
+        self.data = data
+        self.delay = chunk / rate
+        self.chunk = chunk
+
+    def length(self):
+        return len(self.data)
+
+    def open(self, start):
+        for pos in range(start, len(self.data), self.chunk):
+            time.sleep(self.delay)
+            yield self.data[pos:pos + self.chunk]
+
+def _bench(size=4 * 1024 * 1024, rate=2 * 1024 * 1024, prebuffer=256 * 1024):
+    """对比起播等待：整首下载完 vs 边下边播（先缓冲 prebuffer 字节）"""
+    data = bytes(range(256)) * (size // 256)
+    server = LocalStreamServer()
+    url = server.register(_ThrottledSource(data, rate))
+    print(f"本地限速服务器: {size // 1024} KB，约 {rate // 1024} KB/s，起播缓冲 {prebuffer // 1024} KB")
+    try:
+        t = time.perf_counter()
+        full = get(url, "audio").content
+        full_s = time.perf_counter() - t
+        assert full == data
+
+        t = time.perf_counter()
+        buf = StreamBuffer(url)
+        buf.wait_for(prebuffer)
+        first_s = time.perf_counter() - t
+        received = buf.size
+        assert buf.getvalue() == data
+        done_s = time.perf_counter() - t
+    finally:
+        server.close()
+    print(f"整首下载后起播:   {full_s * 1000:8.1f} ms")
+    print(f"边下边播起播:     {first_s * 1000:8.1f} ms（已收到 {received // 1024} KB），下载完成 {done_s * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    if '--bench' in sys.argv:
+        _bench()
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+
+class MpvError(Exception):
+    pass
+
+class MpvIpcPlayer:
+    """整个会话只启动一个 mpv（--idle），通过 --input-ipc-server 的 JSON IPC 控制
+
+    切歌用 loadfile，跳转/暂停用 seek 和 pause 属性。播放进度来自 mpv 的 time-pos：不用 observe_property
+    （mpv 每解码一块音频就推送一次），而是在读取进度时按 SYNC_INTERVAL 查询一次，中间按时间插值。
+    传入 socket_path 且 spawn=False 时只连接已有的服务端（例如测试用的 tests/fake_mpv.py）。
+    """
+    MPV_ARGS = ['--idle=yes', '--no-video', '--really-quiet', '--no-terminal',
+                '--cache=no', '--demuxer-readahead-secs=1']
+    SYNC_INTERVAL = 0.25
+
+    def __init__(self, socket_path=None, spawn=True):
+        self.socket_path = socket_path or os.path.join(tempfile.gettempdir(), f"music-fx-mpv-{os.getpid()}.sock")
+        self.spawn = spawn
+        self.process = None
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.cond = threading.Condition()
+        self.request_id = 0
+        self.replies = {}
+        self.time_pos = None
+        self.pos_at = 0.0        # 查询到 time-pos 的时刻，用于两次查询之间插值
+        self.paused = False
+        self.entry = None        # 当前曲目的 playlist_entry_id
+        self.track_ended = False
+        self.seek_at = None
+        self.last_seek_ms = None
+        self.on_track_end = None  # 曲目播放结束或连接断开时回调（在读取线程中调用）
+        self.closed = False
+
+    def start(self, timeout=3):
+        if self.spawn:
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self.process = subprocess.Popen(
+                ['mpv'] + self.MPV_ARGS + [f'--input-ipc-server={self.socket_path}'],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True  # 脱离终端会话，防止熄屏暂停
+            )
+        deadline = time.time() + timeout
+        while True:
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.socket_path)
+                break
+            except OSError:
+                sock.close()
+                if time.time() > deadline or (self.process and self.process.poll() is not None):
+                    self.close()
+                    raise MpvError("无法连接 mpv IPC")
+                time.sleep(0.05)
+        self.sock = sock
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        return self
+
+    def alive(self):
+        if self.closed or self.sock is None:
+            return False
+        return self.process is None or self.process.poll() is None
+
+    # ---------- 收发 ----------
+    def _read_loop(self):
+        pending = b''
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                pending += data
+                *lines, pending = pending.split(b'\n')
+                for line in lines:
+                    if line.strip():
+                        if self._dispatch(json.loads(line)) and self.on_track_end:
+                            self.on_track_end()
+        except (OSError, ValueError):
+            pass
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.on_track_end:
+            self.on_track_end()
+
+    def _dispatch(self, msg):
+        """处理一条消息，当前曲目播放结束时返回 True"""
+        ended = False
+        with self.cond:
+            if 'request_id' in msg and 'event' not in msg:
+                self.replies[msg['request_id']] = msg
+            else:
+                event = msg.get('event')
+                if event == 'start-file':
+                    self.entry = msg.get('playlist_entry_id')
+                elif event == 'end-file':
+                    # 被 loadfile/stop 替换掉的曲目（reason=stop）不算播放结束
+                    same = self.entry is None or msg.get('playlist_entry_id') in (None, self.entry)
+                    if same and msg.get('reason') in ('eof', 'error'):
+                        self.track_ended = ended = True
+                elif event == 'playback-restart' and self.seek_at is not None:
+                    self.last_seek_ms = (time.time() - self.seek_at) * 1000
+                    self.seek_at = None
+            self.cond.notify_all()
+        return ended
+
+    def command(self, *args, timeout=2):
+        with self.cond:
+            self.request_id += 1
+            rid = self.request_id
+        payload = json.dumps({'command': list(args), 'request_id': rid}).encode('utf-8') + b'\n'
+        try:
+            with self.send_lock:
+                self.sock.sendall(payload)
+        except (OSError, AttributeError) as e:
+            raise MpvError(f"mpv IPC 已断开: {e}")
+        with self.cond:
+            if not self.cond.wait_for(lambda: rid in self.replies or self.closed, timeout):
+                raise MpvError(f"mpv 无响应: {args[0]}")
+            reply = self.replies.pop(rid, None)
+        if reply is None:
+            raise MpvError("mpv IPC 已断开")
+        if reply.get('error') != 'success':
+            raise MpvError(f"{args[0]}: {reply.get('error')}")
+        return reply.get('data')
+
+    # ---------- 播放控制 ----------
+    def loadfile(self, url, start=0):
+        with self.cond:
+            self.track_ended = False
+            self.time_pos, self.pos_at = start, time.monotonic()
+            self.paused = False
+            self.entry = None
+        self.command('set_property', 'start', f'{start:.3f}')
+        self.command('set_property', 'pause', False)
+        self.command('loadfile', url, 'replace')
+
+    def seek(self, sec):
+        with self.cond:
+            self.seek_at = time.time()
+            self.time_pos, self.pos_at = sec, time.monotonic()
+        self.command('seek', sec, 'absolute+exact')
+
+    def set_pause(self, paused):
+        self.command('set_property', 'pause', bool(paused))
+        with self.cond:
+            if self.time_pos is not None and not self.paused:
+                self.time_pos += time.monotonic() - self.pos_at
+            self.pos_at = time.monotonic()
+            self.paused = bool(paused)
+
+    def stop(self):
+        self.command('stop')
+
+    def _sync_position(self):
+        try:
+            pos = self.command('get_property', 'time-pos', timeout=0.5)
+        except MpvError:
+            pos = None  # 尚未开始播放或已结束
+        with self.cond:
+            if pos is not None:
+                self.time_pos = pos
+            self.pos_at = time.monotonic()
+
+    def position(self):
+        """最近一次查询到的 time-pos 加上之后经过的时间（最多外推 0.5 秒，避免缓冲卡顿时跑到声音前面）"""
+        with self.cond:
+            stale = (not self.paused and not self.track_ended and not self.closed
+                     and time.monotonic() - self.pos_at >= self.SYNC_INTERVAL)
+        if stale:
+            self._sync_position()
+        with self.cond:
+            if self.time_pos is None:
+                return 0.0
+            if self.paused or self.track_ended:
+                return self.time_pos
+            return self.time_pos + min(time.monotonic() - self.pos_at, 0.5)
+
+    def ended(self):
+        with self.cond:
+            return self.track_ended or self.closed
+
+    def close(self):
+        if self.sock and not self.closed:
+            try:
+                self.command('quit', timeout=0.5)
+            except MpvError:
+                pass
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.closed = True
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.spawn and os.path.exists(self.socket_path):
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
@@ -0,0 +1,245 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+class PlaylistDiff:
+    """两个版本歌单之间的差异：新增、移除、顺序变化的歌曲 ID，以及实际写入的行数"""
+    def __init__(self, added=(), removed=(), moved=(), rows_written=0):
+        self.added = list(added)
+        self.removed = list(removed)
+        self.moved = list(moved)
+        self.rows_written = rows_written
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.moved)
+
+    def summary(self):
+        if not self:
+            return "没有变化"
+        parts = []
+        if self.added:
+            parts.append(f"新增 {len(self.added)} 首")
+        if self.removed:
+            parts.append(f"移除 {len(self.removed)} 首")
+        if self.moved:
+            parts.append(f"调整顺序 {len(self.moved)} 首")
+        return "，".join(parts)
+
+def diff_songs(old_ids, new_ids):
+    """比较新旧两份歌曲 ID 列表
+
+    两边都有的歌曲中，按旧顺序位置求新列表里的最长递增子序列，不在其中的就是被挪动过的，
+    这样挪动一首歌只算一首，而不是把它之后的所有歌都算作变化。
+    """
+    old_pos = {sid: i for i, sid in enumerate(old_ids)}
+    new_set = set(new_ids)
+    added = [sid for sid in new_ids if sid not in old_pos]
+    removed = [sid for sid in old_ids if sid not in new_set]
+    common = [sid for sid in new_ids if sid in old_pos]
+    # 最长递增子序列（耐心排序），tails[k] 为长度 k+1 的子序列末尾在 common 中的下标
+    tails, tail_keys, prev = [], [], [-1] * len(common)
+    for i, sid in enumerate(common):
+        key = old_pos[sid]
+        k = bisect_left(tail_keys, key)
+        if k:
+            prev[i] = tails[k - 1]
+        if k == len(tails):
+            tails.append(i)
+            tail_keys.append(key)
+        else:
+            tails[k], tail_keys[k] = i, key
+    keep = set()
+    i = tails[-1] if tails else -1
+    while i >= 0:
+        keep.add(i)
+        i = prev[i]
+    moved = [sid for i, sid in enumerate(common) if i not in keep]
+    return PlaylistDiff(added, removed, moved)
+
+class PlaylistStore:
+    """歌单缓存：SQLite 中歌单和歌曲分表存放，列出歌单不读取歌曲，每次修改都在一个事务内完成
+
+    第一次打开时如果存在旧版 playlists_cache.json，会整体导入并把旧文件改名为 .migrated。
+    另有 history 表记录播放过的歌曲；revision 在每次写入后加一，供本地搜索判断索引是否过期。
+    """
+    SCHEMA_VERSION = 1
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS playlists (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL DEFAULT '',
+            song_count INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS songs (
+            playlist_id TEXT NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+            pos INTEGER NOT NULL,
+            song_id,
+            name TEXT NOT NULL DEFAULT '',
+            artist TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (playlist_id, pos)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS history (
+            song_id PRIMARY KEY,
+            name TEXT NOT NULL DEFAULT '',
+            artist TEXT NOT NULL DEFAULT '',
+            plays INTEGER NOT NULL DEFAULT 0,
+            last_played REAL NOT NULL DEFAULT 0
+        );
+    """
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self.conn = None
+        self.lock = threading.RLock()
+        self.revision = 0
+
+    def _db(self):
+        if self.conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript(self.SCHEMA)
+            migrated = False
+            if conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+                with conn:
+                    migrated = self._migrate_legacy(conn)
+                    conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            if migrated:
+                # 数据已经在库里，旧文件改名保留一份以便回退
+                os.replace(self.legacy_json, self.legacy_json + ".migrated")
+            self.conn = conn
+        return self.conn
+
+    def _migrate_legacy(self, conn):
+        if not self.legacy_json or not os.path.exists(self.legacy_json):
+            return False
+        try:
+            with open(self.legacy_json, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return False
+        for pid, entry in cache.items():
+            if isinstance(entry, dict):
+                self._write(conn, pid, entry.get("songs", []), entry.get("name", ""))
+        return True
+
+    @staticmethod
+    def _write(conn, playlist_id, songs, name):
+        playlist_id = str(playlist_id)
+        conn.execute(
+            "INSERT INTO playlists (id, name, song_count, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET name = excluded.name, song_count = excluded.song_count, "
+            "updated_at = excluded.updated_at",
+            (playlist_id, name or "", len(songs), time.time()))
+        conn.execute("DELETE FROM songs WHERE playlist_id = ?", (playlist_id,))
+        conn.executemany(
+            "INSERT INTO songs (playlist_id, pos, song_id, name, artist) VALUES (?, ?, ?, ?, ?)",
+            ((playlist_id, pos, s.get('id'), s.get('name', ''), s.get('artist', ''))
+             for pos, s in enumerate(songs)))
+
+    def list_playlists(self):
+        """返回 [(歌单ID, 名称, 歌曲数)]，按加入顺序；只读歌单表"""
+        with self.lock:
+            return self._db().execute(
+                "SELECT id, name, song_count FROM playlists ORDER BY rowid").fetchall()
+
+    def ids(self):
+        return [pid for pid, _, _ in self.list_playlists()]
+
+    def count(self):
+        with self.lock:
+            return self._db().execute("SELECT COUNT(*) FROM playlists").fetchone()[0]
+
+    def get_songs(self, playlist_id):
+        """返回歌单的歌曲列表（与 fetch_playlist_songs 格式相同），未缓存时返回 None"""
+        with self.lock:
+            db = self._db()
+            if db.execute("SELECT 1 FROM playlists WHERE id = ?", (str(playlist_id),)).fetchone() is None:
+                return None
+            rows = db.execute("SELECT song_id, name, artist FROM songs WHERE playlist_id = ? ORDER BY pos",
+                              (str(playlist_id),))
+            return [{'id': sid, 'name': name, 'artist': artist} for sid, name, artist in rows]
+
+    def save(self, playlist_id, songs, name=""):
+        with self.lock:
+            db = self._db()
+            with db:
+                self._write(db, playlist_id, songs, name)
+            self.revision += 1
+
+    def sync(self, playlist_id, songs, name=None):
+        """用最新的歌曲列表更新缓存，只改写内容变化的行，返回 PlaylistDiff；name 为 None 时保留原名称"""
+        playlist_id = str(playlist_id)
+        with self.lock:
+            db = self._db()
+            with db:
+                row = db.execute("SELECT name FROM playlists WHERE id = ?", (playlist_id,)).fetchone()
+                if row is None:
+                    self._write(db, playlist_id, songs, name)
+                    self.revision += 1
+                    return PlaylistDiff(added=[s.get('id') for s in songs], rows_written=len(songs))
+                old = db.execute("SELECT song_id, name, artist FROM songs WHERE playlist_id = ? ORDER BY pos",
+                                 (playlist_id,)).fetchall()
+                new = [(s.get('id'), s.get('name', ''), s.get('artist', '')) for s in songs]
+                diff = diff_songs([r[0] for r in old], [r[0] for r in new])
+                changed = [(playlist_id, pos) + r for pos, r in enumerate(new) if pos >= len(old) or old[pos] != r]
+                db.executemany(
+                    "INSERT INTO songs (playlist_id, pos, song_id, name, artist) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(playlist_id, pos) DO UPDATE SET song_id = excluded.song_id, "
+                    "name = excluded.name, artist = excluded.artist", changed)
+                db.execute("DELETE FROM songs WHERE playlist_id = ? AND pos >= ?", (playlist_id, len(new)))
+                db.execute("UPDATE playlists SET name = ?, song_count = ?, updated_at = ? WHERE id = ?",
+                           (row[0] if name is None else name, len(new), time.time(), playlist_id))
+                diff.rows_written = len(changed) + max(0, len(old) - len(new))
+            self.revision += 1
+            return diff
+
+    def delete(self, playlist_id):
+        with self.lock:
+            db = self._db()
+            with db:
+                deleted = db.execute("DELETE FROM playlists WHERE id = ?", (str(playlist_id),)).rowcount > 0
+            self.revision += 1
+            return deleted
+
+    def clear(self):
+        with self.lock:
+            db = self._db()
+            with db:
+                db.execute("DELETE FROM playlists")
+            self.revision += 1
+
+    def record_play(self, song_id, name, artist):
+        with self.lock:
+            db = self._db()
+            with db:
+                db.execute(
+                    "INSERT INTO history (song_id, name, artist, plays, last_played) VALUES (?, ?, ?, 1, ?) "
+                    "ON CONFLICT(song_id) DO UPDATE SET name = excluded.name, artist = excluded.artist, "
+                    "plays = plays + 1, last_played = excluded.last_played",
+                    (song_id, name or "", artist or "", time.time()))
+            self.revision += 1
+
+    def all_songs(self):
+        """缓存歌单和播放历史中的全部歌曲（按 ID 去重），带播放次数 plays"""
+        with self.lock:
+            db = self._db()
+            songs = {}
+            for sid, name, artist, plays in db.execute(
+                    "SELECT song_id, name, artist, plays FROM history ORDER BY last_played DESC"):
+                songs[sid] = {'id': sid, 'name': name, 'artist': artist, 'plays': plays}
+            for sid, name, artist in db.execute("SELECT song_id, name, artist FROM songs"):
+                if sid not in songs:
+                    songs[sid] = {'id': sid, 'name': name, 'artist': artist, 'plays': 0}
+            return list(songs.values())
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
@@ -0,0 +1,372 @@
+"""整首歌离线渲染音效：把解码后的 PCM 切段交给多个进程并行处理，再交叉淡化拼接
+
+每段在正式内容之前多处理一段预热（pre-roll），让低音/高音滤波器、环绕延迟线和混响尾音进入稳态，
+拼接处再做短交叉淡化，结果与单进程从头到尾处理的差异在 -120 dB 左右。
+
+    python render.py 输入.mp3 输出.wav --preset 电音 --env 大厅
+    python render.py --bench                 # 与单进程渲染对比速度和误差
+
+RenderCache 保存播放时实时处理出的整首结果，同一首歌在相同设置下重播时直接读取，不再经过音效引擎。
+"""
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import effects
+
+SAMPLE_RATE = 44100
+CHUNK = 4096             # 处理块长，分段边界对齐到块
+PREROLL_FLOOR_DB = 120   # 预热到上一段残留状态衰减到此以下
+LONGEST_COMB_SEC = 0.075 # effects.AdvancedReverb 最长的梳状延迟，决定尾音衰减最慢的那一路
+CROSSFADE_SEC = 0.02
+LIMITER_SETTLE_SEC = 0.5 # 限幅器按 100 ms 时间常数恢复，0.5 秒后 40 dB 以内的增益衰减都已恢复
+MIN_SEGMENT_SEC = 8.0    # 段太短时预热开销占比过高
+
+def preroll_seconds(settings, sr=SAMPLE_RATE, floor_db=PREROLL_FLOOR_DB):
+    """按环境混响的衰减速度估算预热长度
+
+    梳状滤波器在左右交错的样本流上运行，最长一路每秒循环 2/LONGEST_COMB_SEC 次，
+    每圈衰减 0.92 倍再乘 decay 决定的反馈，合起来约 -(19 + 120/decay) dB/秒。
+    卷积混响的脉冲响应有限长，预热满“块长 + 脉冲响应长度”后与从头处理完全一致。
+    没有混响时只需让滤波器、环绕延迟线和末级限幅器稳定下来。
+    """
+    wet, decay, damping = effects.ENV_DATA.get(settings.get("环境", "无"), (0.0, 0.5, 0.5))
+    if wet <= 0.01:
+        return LIMITER_SETTLE_SEC
+    if settings.get("混响") == "卷积":
+        return max(LIMITER_SETTLE_SEC, effects.convolution_tail_seconds(decay, damping, sr) + 0.1)
+    loops = 2 / LONGEST_COMB_SEC
+    db_per_sec = -loops * 20 * np.log10(0.92) + 120 / decay
+    return max(LIMITER_SETTLE_SEC, floor_db / db_per_sec)
+
+def decode(raw, sr=SAMPLE_RATE):
+    """用 ffmpeg 把压缩音频一次性解码为 (n, 2) float32"""
+    result = subprocess.run(['ffmpeg', '-v', 'error', '-i', 'pipe:0', '-f', 'f32le', '-ac', '2',
+                             '-ar', str(sr), 'pipe:1'], input=raw, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, check=True)
+    return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, 2)
+
+def _process(pcm, settings, sr, chunk, drop=0, start=0):
+    """用新引擎处理 pcm（从整首第 start 帧开始），丢掉前 drop 帧（预热部分）后返回
+
+    引擎输出晚 latency 帧：丢掉最前面的 latency 帧，末尾再接上 flush() 取出的部分，输出与输入逐帧对齐。
+    """
+    engine = effects.UltimateAudioEngine(sr=sr)
+    engine.prepare(chunk)
+    engine.update_settings(settings)
+    engine.seek(start)
+    skip = drop + engine.latency  # 输出流中第 skip 帧对应 pcm[drop]
+    out = np.empty((len(pcm) - drop, 2), dtype=np.float32)
+    buf = np.empty((chunk, 2), dtype=np.float32)
+
+    def put(pos, processed):
+        lo, hi = max(pos, skip), pos + len(processed)
+        if hi > lo:
+            out[lo - skip:hi - skip] = processed[lo - pos:]
+
+    for start in range(0, len(pcm), chunk):
+        block = pcm[start:start + chunk]
+        put(start, engine.process_into(block, buf[:len(block)]))
+    put(len(pcm), engine.flush())
+    return out
+
+def render_serial(pcm, settings, sr=SAMPLE_RATE, chunk=CHUNK):
+    return _process(pcm, settings, sr, chunk)
+
+def _render_segment(task):
+    pcm, settings, sr, chunk, drop, start = task
+    return _process(pcm, settings, sr, chunk, drop, start)
+
+def plan_segments(frames, sr=SAMPLE_RATE, workers=1, chunk=CHUNK, segment_sec=None,
+                  preroll_sec=2.0, crossfade_sec=CROSSFADE_SEC):
+    """返回 [(预热起点, 输出起点, 结束)]；输出起点之前 crossfade 帧与上一段重叠，所有起点对齐到 chunk"""
+    if segment_sec is None:
+        # 每个进程两段、段长相等（不足 MIN_SEGMENT_SEC 时减少段数），便于负载均衡
+        count = max(1, min(2 * workers, int(frames / sr / MIN_SEGMENT_SEC)))
+    else:
+        count = max(1, -(-frames // int(segment_sec * sr)))
+    seg = max(chunk, -(-frames // count) // chunk * chunk + chunk)
+    fade = min(int(crossfade_sec * sr), chunk)
+    pre = -(-int(preroll_sec * sr) // chunk) * chunk
+    plan = []
+    for start in range(0, frames, seg):
+        end = min(frames, start + seg)
+        if start == 0:
+            plan.append((0, 0, end))
+        else:
+            # 输出从 start - fade 开始，预热起点向下对齐到 chunk
+            out_start = start - fade
+            plan.append((max(0, (out_start - pre) // chunk * chunk), out_start, end))
+    return plan, fade
+
+def render_parallel(pcm, settings, sr=SAMPLE_RATE, workers=None, chunk=CHUNK, segment_sec=None,
+                    preroll_sec=None, crossfade_sec=CROSSFADE_SEC, executor=None):
+    """多进程渲染整首歌，返回与 pcm 等长的 (n, 2) float32；preroll_sec 默认按环境估算"""
+    workers = workers or os.cpu_count() or 1
+    if preroll_sec is None:
+        preroll_sec = preroll_seconds(settings, sr)
+    plan, fade = plan_segments(len(pcm), sr, workers, chunk, segment_sec, preroll_sec, crossfade_sec)
+    if workers <= 1 or len(plan) == 1:
+        return render_serial(pcm, settings, sr, chunk)
+    tasks = [(pcm[pre:end], settings, sr, chunk, out_start - pre, pre) for pre, out_start, end in plan]
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pieces = list(pool.map(_render_segment, tasks))
+    else:
+        pieces = list(executor.map(_render_segment, tasks))
+
+    out = np.empty_like(pcm, dtype=np.float32)
+    ramp = np.linspace(0.0, 1.0, fade + 2, dtype=np.float32)[1:-1, None] if fade else None
+    for (pre, out_start, end), piece in zip(plan, pieces):
+        if out_start == 0:
+            out[:end] = piece
+            continue
+        # 重叠部分线性交叉淡化：两段在此处都已稳定，输出高度相关
+        overlap = out[out_start:out_start + fade]
+        overlap *= 1.0 - ramp
+        overlap += piece[:fade] * ramp
+        out[out_start + fade:end] = piece[fade:]
+    return out
+
+def render_track(raw, settings, workers=None, sr=SAMPLE_RATE):
+    """解码并渲染整首歌，返回 (n, 2) float32"""
+    return render_parallel(decode(raw, sr), settings, sr, workers)
+
+def to_s16le(pcm):
+    return np.clip(pcm * 32768, -32768, 32767).astype(np.int16)
+
+class RenderRecorder:
+    """把一次从头到尾的处理结果写入临时文件，commit() 后才进入缓存，abort() 丢弃"""
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        self.tmp = os.path.join(cache.root, f"{key}.pcm.tmp{threading.get_ident()}")
+        self.file = None
+        self.size = 0
+        self.failed = False
+
+    def write(self, data):
+        if self.failed:
+            return
+        try:
+            if self.file is None:
+                os.makedirs(self.cache.root, exist_ok=True)
+                self.file = open(self.tmp, 'wb')
+            self.file.write(data)
+            self.size += len(data)
+            if self.size > self.cache.limit():
+                self.abort()  # 超过缓存上限的不再继续写
+        except OSError:
+            self.abort()
+
+    def _close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def commit(self):
+        if self.failed or not self.size:
+            self.abort()
+            return False
+        self._close()
+        return self.cache._commit(self)
+
+    def abort(self):
+        self.failed = True
+        self._close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+class RenderCache:
+    """渲染缓存：整首歌经音效处理后的 s16le 立体声 PCM，按 (歌曲ID, 引擎版本, 设置哈希) 存放，超出上限时按最近使用淘汰
+
+    设置哈希由 effects.settings_digest 计算（已包含 ENGINE_VERSION），任何一项设置变化都得到新的键，
+    旧结果不会再命中；引擎版本变化后，旧版本的条目在下次加载索引时直接删除。
+    limit 为返回字节上限的函数，便于跟随设置实时变化。
+    """
+    def __init__(self, root, limit=lambda: 1024 * 1024 * 1024, sr=SAMPLE_RATE):
+        self.root = root
+        self.limit = limit
+        self.sr = sr
+        self.index_path = os.path.join(root, "index.json")
+        self.lock = threading.Lock()
+        self.index = None
+
+    def key(self, song_id, settings):
+        return f"{song_id}-{effects.settings_digest(dict(settings, 采样率=self.sr))[:20]}"
+
+    def _load(self):
+        if self.index is not None:
+            return self.index
+        self.index = {"entries": {}, "stats": {"hits": 0, "misses": 0}}
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+            self.index["entries"] = data.get("entries", {})
+            self.index["stats"].update(data.get("stats", {}))
+        except (OSError, ValueError):
+            pass
+        stale = [k for k, e in self.index["entries"].items() if e.get("engine") != effects.ENGINE_VERSION]
+        for key in stale:
+            self._remove(key)
+        if stale:
+            self._save()
+        return self.index
+
+    def _save(self):
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = f"{self.index_path}.tmp{threading.get_ident()}"
+            with open(tmp, 'w') as f:
+                json.dump(self.index, f, ensure_ascii=False)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass
+
+    def _remove(self, key):
+        entry = self.index["entries"].pop(key, None)
+        if entry:
+            try:
+                os.remove(os.path.join(self.root, entry["file"]))
+            except OSError:
+                pass
+
+    def get(self, song_id, settings):
+        """命中时返回缓存文件路径（内容为 s16le PCM），否则返回 None"""
+        if self.limit() <= 0:
+            return None
+        key = self.key(song_id, settings)
+        with self.lock:
+            index = self._load()
+            entry = index["entries"].get(key)
+            path = os.path.join(self.root, entry["file"]) if entry else None
+            if entry and (not os.path.exists(path) or os.path.getsize(path) != entry["size"]):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                index["stats"]["misses"] += 1
+                self._save()
+                return None
+            entry["atime"] = time.time()
+            index["stats"]["hits"] += 1
+            self._save()
+            return path
+
+    def recorder(self, song_id, settings):
+        """开始录制一首歌的处理结果；缓存关闭时返回 None"""
+        if self.limit() <= 0:
+            return None
+        return RenderRecorder(self, self.key(song_id, settings), {"song_id": song_id, "settings": dict(settings)})
+
+    def _commit(self, recorder):
+        name = f"{recorder.key}.pcm"
+        with self.lock:
+            index = self._load()
+            try:
+                os.replace(recorder.tmp, os.path.join(self.root, name))
+            except OSError:
+                recorder.abort()
+                return False
+            index["entries"][recorder.key] = {
+                "file": name, "size": recorder.size, "engine": effects.ENGINE_VERSION,
+                "atime": time.time(), **recorder.meta,
+            }
+            self._evict(self.limit())
+            self._save()
+            return recorder.key in index["entries"]
+
+    def _evict(self, limit):
+        entries = self.index["entries"]
+        total = sum(e["size"] for e in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["atime"]):
+            if total <= limit:
+                break
+            total -= entries[key]["size"]
+            self._remove(key)
+
+    def stats(self):
+        with self.lock:
+            index = self._load()
+            size = sum(e["size"] for e in index["entries"].values())
+            return {"count": len(index["entries"]), "size": size, **index["stats"]}
+
+    def clear(self):
+        with self.lock:
+            index = self._load()
+            for key in list(index["entries"]):
+                self._remove(key)
+            index["stats"] = {"hits": 0, "misses": 0}
+            self._save()
+
+# ---------- 基准测试：python render.py --bench ----------
+def _bench(seconds=120.0, workers_list=None, preset="电音", env="地下通道", reverb="算法"):
+    from fxbench import make_signal
+    settings = dict(effects.preset_settings(preset, env), 混响=reverb)
+    pcm = make_signal(int(seconds * SAMPLE_RATE))
+    cores = os.cpu_count() or 1
+    workers_list = workers_list or sorted({2, 4, cores} - {1})
+    print(f"{seconds:.0f} 秒立体声, 预设 {preset} / 环境 {env} ({reverb}混响), 预热 {preroll_seconds(settings):.1f} 秒, CPU {cores} 核")
+    t = time.perf_counter()
+    reference = render_serial(pcm, settings)
+    serial_s = time.perf_counter() - t
+    print(f"  单进程顺序渲染: {serial_s:6.2f} s  ({seconds / serial_s:5.1f}x 实时)")
+    for workers in workers_list:
+        plan, _ = plan_segments(len(pcm), SAMPLE_RATE, workers, preroll_sec=preroll_seconds(settings))
+        # 各段单独计时，按“最长处理时间优先”分给 workers 个进程，估算核数足够时的耗时
+        costs = []
+        for pre, out_start, end in plan:
+            t = time.perf_counter()
+            _render_segment((pcm[pre:end], settings, SAMPLE_RATE, CHUNK, out_start - pre, pre))
+            costs.append(time.perf_counter() - t)
+        loads = [0.0] * workers
+        for cost in sorted(costs, reverse=True):
+            loads[loads.index(min(loads))] += cost
+        projected = max(loads)
+        # 实测：进程池先启动好，只计渲染本身（核数少于进程数时不会更快）
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(abs, range(workers)))
+            t = time.perf_counter()
+            out = render_parallel(pcm, settings, workers=workers, executor=pool)
+            elapsed = time.perf_counter() - t
+        err = float(np.abs(out - reference).max())
+        print(f"  {workers} 进程 {len(plan)} 段: 实测 {elapsed:6.2f} s (加速 {serial_s / elapsed:4.2f}x), "
+              f"{workers} 核估算 {projected:5.2f} s (加速 {serial_s / projected:4.2f}x), "
+              f"最大误差 {err:.1e} ({20 * np.log10(err + 1e-12):.0f} dBFS)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="整首歌离线渲染音效（多进程）")
+    parser.add_argument("input", nargs="?", help="输入音频文件")
+    parser.add_argument("output", nargs="?", help="输出 WAV 文件")
+    parser.add_argument("--preset", default="无", choices=list(effects.PRESET_DATA))
+    parser.add_argument("--env", default="无", choices=list(effects.ENV_DATA))
+    parser.add_argument("--reverb", default="算法", choices=list(effects.REVERB_MODES), help="环境混响方式")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认等于 CPU 核数")
+    parser.add_argument("--bench", action="store_true", help="与单进程渲染对比速度和误差")
+    parser.add_argument("--seconds", type=float, default=120.0, help="--bench 使用的信号长度")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        _bench(args.seconds, [args.workers] if args.workers else None, args.preset if args.preset != "无" else "电音",
+               args.env if args.env != "无" else "地下通道", args.reverb)
+        return
+    if not args.input or not args.output:
+        parser.error("需要输入和输出文件")
+    from scipy.io import wavfile
+    with open(args.input, 'rb') as f:
+        raw = f.read()
+    t = time.perf_counter()
+    pcm = render_track(raw, dict(effects.preset_settings(args.preset, args.env), 混响=args.reverb), args.workers)
+    wavfile.write(args.output, SAMPLE_RATE, to_s16le(pcm))
+    print(f"- 已渲染 {len(pcm) / SAMPLE_RATE:.1f} 秒音频，用时 {time.perf_counter() - t:.1f} 秒 -> {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import re
+import sys
+import time
+import heapq
+import functools
+import unicodedata
+from bisect import bisect_left
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+CJK = '぀-ヿ㐀-䶿一-鿿가-힯豈-﫿'
+
+def _mark_class():
+    """基本多文种平面内的组合附加符号（Mn/Mc/Me），泰文、天城文等的元音符号不算 \\w，也要留在词里
+
+    只用来重新生成下面的 MARKS（Unicode 版本升级时）：python -c "import search; print(search._mark_class())"
+    """
+    ranges, start, prev = [], None, None
+    for cp in range(0x10000):
+        if unicodedata.category(chr(cp)).startswith('M'):
+            if start is None or cp != prev + 1:
+                if start is not None:
+                    ranges.append((start, prev))
+                start = cp
+            prev = cp
+    ranges.append((start, prev))
+    return ''.join(f'\\u{a:04x}' if a == b else f'\\u{a:04x}-\\u{b:04x}' for a, b in ranges)
+
+# 由 _mark_class() 按 Unicode 14.0.0 生成后写死，省掉导入时扫描整个基本平面（约 30 ms）
+MARKS = (
+    '\u0300-\u036f\u0483-\u0489\u0591-\u05bd\u05bf\u05c1-\u05c2\u05c4-\u05c5\u05c7'
+    '\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06dc\u06df-\u06e4\u06e7-\u06e8\u06ea-\u06ed'
+    '\u0711\u0730-\u074a\u07a6-\u07b0\u07eb-\u07f3\u07fd\u0816-\u0819\u081b-\u0823'
+    '\u0825-\u0827\u0829-\u082d\u0859-\u085b\u0898-\u089f\u08ca-\u08e1\u08e3-\u0903'
+    '\u093a-\u093c\u093e-\u094f\u0951-\u0957\u0962-\u0963\u0981-\u0983\u09bc\u09be-\u09c4'
+    '\u09c7-\u09c8\u09cb-\u09cd\u09d7\u09e2-\u09e3\u09fe\u0a01-\u0a03\u0a3c\u0a3e-\u0a42'
+    '\u0a47-\u0a48\u0a4b-\u0a4d\u0a51\u0a70-\u0a71\u0a75\u0a81-\u0a83\u0abc\u0abe-\u0ac5'
+    '\u0ac7-\u0ac9\u0acb-\u0acd\u0ae2-\u0ae3\u0afa-\u0aff\u0b01-\u0b03\u0b3c\u0b3e-\u0b44'
+    '\u0b47-\u0b48\u0b4b-\u0b4d\u0b55-\u0b57\u0b62-\u0b63\u0b82\u0bbe-\u0bc2\u0bc6-\u0bc8'
+    '\u0bca-\u0bcd\u0bd7\u0c00-\u0c04\u0c3c\u0c3e-\u0c44\u0c46-\u0c48\u0c4a-\u0c4d'
+    '\u0c55-\u0c56\u0c62-\u0c63\u0c81-\u0c83\u0cbc\u0cbe-\u0cc4\u0cc6-\u0cc8\u0cca-\u0ccd'
+    '\u0cd5-\u0cd6\u0ce2-\u0ce3\u0d00-\u0d03\u0d3b-\u0d3c\u0d3e-\u0d44\u0d46-\u0d48'
+    '\u0d4a-\u0d4d\u0d57\u0d62-\u0d63\u0d81-\u0d83\u0dca\u0dcf-\u0dd4\u0dd6\u0dd8-\u0ddf'
+    '\u0df2-\u0df3\u0e31\u0e34-\u0e3a\u0e47-\u0e4e\u0eb1\u0eb4-\u0ebc\u0ec8-\u0ecd'
+    '\u0f18-\u0f19\u0f35\u0f37\u0f39\u0f3e-\u0f3f\u0f71-\u0f84\u0f86-\u0f87\u0f8d-\u0f97'
+    '\u0f99-\u0fbc\u0fc6\u102b-\u103e\u1056-\u1059\u105e-\u1060\u1062-\u1064\u1067-\u106d'
+    '\u1071-\u1074\u1082-\u108d\u108f\u109a-\u109d\u135d-\u135f\u1712-\u1715\u1732-\u1734'
+    '\u1752-\u1753\u1772-\u1773\u17b4-\u17d3\u17dd\u180b-\u180d\u180f\u1885-\u1886\u18a9'
+    '\u1920-\u192b\u1930-\u193b\u1a17-\u1a1b\u1a55-\u1a5e\u1a60-\u1a7c\u1a7f\u1ab0-\u1ace'
+    '\u1b00-\u1b04\u1b34-\u1b44\u1b6b-\u1b73\u1b80-\u1b82\u1ba1-\u1bad\u1be6-\u1bf3'
+    '\u1c24-\u1c37\u1cd0-\u1cd2\u1cd4-\u1ce8\u1ced\u1cf4\u1cf7-\u1cf9\u1dc0-\u1dff'
+    '\u20d0-\u20f0\u2cef-\u2cf1\u2d7f\u2de0-\u2dff\u302a-\u302f\u3099-\u309a\ua66f-\ua672'
+    '\ua674-\ua67d\ua69e-\ua69f\ua6f0-\ua6f1\ua802\ua806\ua80b\ua823-\ua827\ua82c'
+    '\ua880-\ua881\ua8b4-\ua8c5\ua8e0-\ua8f1\ua8ff\ua926-\ua92d\ua947-\ua953\ua980-\ua983'
+    '\ua9b3-\ua9c0\ua9e5\uaa29-\uaa36\uaa43\uaa4c-\uaa4d\uaa7b-\uaa7d\uaab0\uaab2-\uaab4'
+    '\uaab7-\uaab8\uaabe-\uaabf\uaac1\uaaeb-\uaaef\uaaf5-\uaaf6\uabe3-\uabea\uabec-\uabed'
+    '\ufb1e\ufe00-\ufe0f\ufe20-\ufe2f'
+)
+
+# 中日韩文字连续的一段单独取出（再拆成单字和相邻两字）；其他文字（拉丁、西里尔、希腊等）的字母数字连成一个词
+TOKEN = rf'[{CJK}]+|(?:(?![{CJK}])[^\W_]|[{MARKS}])+'
+CJK_CHAR = rf'[{CJK}]'
+CJK_RUN = r'[㐀-䶿一-鿿豈-﫿]+'
+
+# 这几个正则的字符类很大，编译共约 15 ms；第一次用到时才编译，不拖慢导入
+_compile = functools.lru_cache(maxsize=None)(re.compile)
+
+def normalize(text):
+    """全角转半角、统一大小写"""
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+def is_cjk(term):
+    return _compile(CJK_CHAR).match(term) is not None
+
+def index_terms(text):
+    """建索引用的词：字母/数字整词，中日韩文字的单字和相邻两字"""
+    terms = []
+    for tok in _compile(TOKEN).findall(normalize(text)):
+        if not is_cjk(tok):
+            terms.append(tok)
+        else:
+            terms.extend(tok)
+            terms.extend(tok[i:i + 2] for i in range(len(tok) - 1))
+    return terms
+
+def query_terms(text):
+    """查询用的词：中日韩文字只用相邻两字（单字查询才用单字），命中集合小得多"""
+    terms = []
+    for tok in _compile(TOKEN).findall(normalize(text)):
+        if not is_cjk(tok) or len(tok) == 1:
+            terms.append(tok)
+        else:
+            terms.extend(tok[i:i + 2] for i in range(len(tok) - 1))
+    return terms
+
+def pinyin_terms(text):
+    """汉字的全拼音节和首字母串（安装了 pypinyin 时才有），如 晴天 -> qing, tian, qt"""
+    if lazy_pinyin is None:
+        return []
+    terms = []
+    for run in _compile(CJK_RUN).findall(text):
+        syllables = lazy_pinyin(run)
+        terms.extend(syllables)
+        terms.append("".join(syllables))
+        terms.append("".join(s[0] for s in syllables if s))
+    return terms
+
+class SearchIndex:
+    """歌曲名/歌手的本地倒排索引：字母数字词（英文、法文、俄文等）按前缀匹配，中日韩文字按字匹配，可选拼音匹配
+
+    songs 为 {'id', 'name', 'artist'} 字典的列表，可带 'plays'（播放次数）用于排序。
+    """
+    def __init__(self, songs=()):
+        self.songs = []
+        self.titles = []
+        self.plays = []
+        self.postings = {}   # 词 -> 歌曲序号集合
+        seen = set()
+        for song in songs:
+            if song.get('id') in seen:
+                continue
+            seen.add(song.get('id'))
+            self._add(song)
+        self.terms = sorted(t for t in self.postings if not is_cjk(t))  # 前缀查找只用于字母数字词和拼音
+
+    def __len__(self):
+        return len(self.songs)
+
+    def _add(self, song):
+        i = len(self.songs)
+        self.songs.append(song)
+        name, artist = song.get('name') or '', song.get('artist') or ''
+        self.titles.append(normalize(name))
+        self.plays.append(song.get('plays', 0))
+        postings = self.postings
+        for term in set(index_terms(name) + index_terms(artist) + pinyin_terms(name) + pinyin_terms(artist)):
+            bucket = postings.get(term)
+            if bucket is None:
+                postings[term] = {i}
+            else:
+                bucket.add(i)
+
+    def _match(self, token):
+        """命中 token 的歌曲序号集合；字母数字词按前缀匹配"""
+        if is_cjk(token):
+            return self.postings.get(token, set())
+        start = bisect_left(self.terms, token)
+        end = bisect_left(self.terms, token + '\uffff', start)
+        if end - start == 1:
+            return self.postings[self.terms[start]]
+        hits = set()
+        for term in self.terms[start:end]:
+            hits |= self.postings[term]
+        return hits
+
+    def search(self, query, limit=50):
+        """按相关度返回匹配的歌曲（每个查询词都必须命中歌名或歌手）"""
+        tokens = list(dict.fromkeys(query_terms(query)))
+        if not tokens:
+            return []
+        # 先取命中最少的词，交集很快缩小
+        matches = sorted((self._match(t) for t in tokens), key=len)
+        candidates = matches[0]
+        for hits in matches[1:]:
+            candidates = candidates & hits
+            if not candidates:
+                return []
+        # 只给最终候选打分：词出现在歌名里比只在歌手里更相关，整句命中歌名再加分；
+        # 同分时播放次数多的、歌名短的在前
+        phrase = normalize(query).strip()
+        titles, plays = self.titles, self.plays
+        ranked = []
+        for i in candidates:
+            title = titles[i]
+            score = len(tokens)
+            for t in tokens:
+                if t in title:
+                    score += 1
+            if title == phrase:
+                score += 6
+            elif phrase in title:
+                score += 3
+            ranked.append((-score, -plays[i], len(title), i))
+        return [self.songs[r[3]] for r in heapq.nsmallest(limit, ranked)]
+
+# ---------- 基准测试：python search.py --bench ----------
+def _make_songs(n):
+    import random
+    rnd = random.Random(11)
+    zh = "夜空中最亮的星晴天稻香七里香告白气球青花瓷后来十年红豆光年之外演员平凡之路起风了孤勇者"
+    en = ["love", "night", "star", "dream", "light", "heart", "rain", "summer", "blue", "forever",
+          "shine", "alive", "home", "river", "fire", "dance", "moon", "ocean", "wild", "young"]
+    singers = ["周杰伦", "林俊杰", "陈奕迅", "Taylor Swift", "Coldplay", "邓紫棋", "毛不易", "YOASOBI",
+               "Adele", "五月天", "Ed Sheeran", "王菲", "李荣浩", "Billie Eilish", "朴树"]
+    songs = []
+    for i in range(n):
+        if rnd.random() < 0.5:
+            name = "".join(rnd.choice(zh) for _ in range(rnd.randint(2, 6)))
+        else:
+            name = " ".join(rnd.choice(en) for _ in range(rnd.randint(1, 4))).title()
+        songs.append({'id': i, 'name': f"{name} {i % 97}" if i % 5 == 0 else name,
+                      'artist': rnd.choice(singers)})
+    return songs
+
+def _linear_search(songs, query):
+    # 对照：逐首做子串匹配（不分词、不排序）
+    q = query.lower()
+    return [s for s in songs if q in s['name'].lower() or q in s['artist'].lower()]
+
+def _bench(n=100000):
+    songs = _make_songs(n)
+    t = time.perf_counter()
+    index = SearchIndex(songs)
+    build_ms = (time.perf_counter() - t) * 1000
+    print(f"{n} 首歌曲, 建索引 {build_ms:.0f} ms, {len(index.terms)} 个词"
+          f"{'（含拼音）' if lazy_pinyin else '（未安装 pypinyin，不含拼音）'}")
+    for query in ["晴天", "周杰伦 稻香", "lov", "night star", "taylor", "孤勇者 陈奕迅", "zzz"]:
+        rounds = 20
+        t = time.perf_counter()
+        for _ in range(rounds):
+            result = index.search(query)
+        ms = (time.perf_counter() - t) * 1000 / rounds
+        t = time.perf_counter()
+        linear = _linear_search(songs, query)
+        linear_ms = (time.perf_counter() - t) * 1000
+        top = result[0]['name'] + " - " + result[0]['artist'] if result else "-"
+        print(f"  {query!r:18} 索引 {ms:7.2f} ms ({len(result):2} 条, 首条 {top})"
+              f"   逐首扫描 {linear_ms:6.1f} ms ({len(linear)} 条)")
+
+if __name__ == '__main__':
+    if '--bench' in sys.argv:
+        _bench()
+    else:
+        print("用法: python search.py --bench")
@@ -0,0 +1,168 @@
+"""测试用的 mpv JSON IPC 服务端"""
+import json
+import os
+import socket
+import threading
+import time
+import urllib.request
+
+from player import MpvError
+
+class FakeMpvServer:
+    """模拟 mpv JSON IPC 的服务端，不需要音频设备即可调试播放流程
+
+    loadfile 时会真正读取 URL（验证本地 HTTP 桥），WAV 按 Content-Length 推算时长，
+    其他格式使用 duration；播放时钟按真实时间推进，被 observe_property 时每个 tick 推送一次 time-pos。
+    """
+    def __init__(self, socket_path, duration=30.0, tick=0.05):
+        self.socket_path = socket_path
+        self.duration = duration
+        self.tick = tick
+        self.lock = threading.Lock()
+        self.conn = None
+        self.entry_id = 0
+        self.playing = None      # {'entry', 'pos', 'since', 'length', 'url'}
+        self.paused = False
+        self.start_opt = 0.0
+        self.bytes_read = {}
+        self.observed = set()
+        self.running = True
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(socket_path)
+        self.listener.listen(1)
+        threading.Thread(target=self._serve, daemon=True).start()
+        threading.Thread(target=self._clock, daemon=True).start()
+
+    def _send(self, msg):
+        conn = self.conn
+        if conn:
+            try:
+                conn.sendall(json.dumps(msg).encode('utf-8') + b'\n')
+            except OSError:
+                pass
+
+    def _now(self):
+        p = self.playing
+        if not p:
+            return None
+        if self.paused:
+            return p['pos']
+        return p['pos'] + time.time() - p['since']
+
+    def _clock(self):
+        while self.running:
+            time.sleep(self.tick)
+            with self.lock:
+                pos = self._now()
+                if pos is None:
+                    continue
+                if pos >= self.playing['length']:
+                    entry = self.playing['entry']
+                    self.playing = None
+                    self._send({'event': 'end-file', 'reason': 'eof', 'playlist_entry_id': entry})
+                    self._send({'event': 'idle'})
+                elif 'time-pos' in self.observed:
+                    self._send({'event': 'property-change', 'id': 1, 'name': 'time-pos', 'data': pos})
+
+    def _fetch(self, url, entry):
+        # 像 mpv 一样读取数据，并记录读了多少字节
+        try:
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                length = resp.headers.get('Content-Length')
+                if resp.headers.get('Content-Type') == 'audio/wav' and length:
+                    with self.lock:
+                        if self.playing and self.playing['entry'] == entry:
+                            self.playing['length'] = (int(length) - 44) / (4 * 44100)
+                total = 0
+                while self.running:
+                    data = resp.read(65536)
+                    if not data:
+                        break
+                    total += len(data)
+                    self.bytes_read[entry] = total
+        except OSError:
+            pass
+
+    def _handle(self, cmd):
+        name, args = cmd[0], cmd[1:]
+        if name == 'observe_property':
+            self.observed.add(args[1])
+            return None
+        if name == 'quit':
+            return None
+        if name == 'set_property':
+            if args[0] == 'pause':
+                pos = self._now()
+                if self.playing and pos is not None:
+                    self.playing['pos'], self.playing['since'] = pos, time.time()
+                self.paused = bool(args[1])
+            elif args[0] == 'start':
+                self.start_opt = float(args[1])
+            return None
+        if name == 'get_property' and args[0] == 'time-pos':
+            pos = self._now()
+            if pos is None:
+                raise MpvError('property unavailable')
+            return pos
+        if name == 'loadfile':
+            if self.playing:
+                self._send({'event': 'end-file', 'reason': 'stop', 'playlist_entry_id': self.playing['entry']})
+            self.entry_id += 1
+            self.playing = {'entry': self.entry_id, 'pos': self.start_opt, 'since': time.time(),
+                            'length': self.duration, 'url': args[0]}
+            self._send({'event': 'start-file', 'playlist_entry_id': self.entry_id})
+            self._send({'event': 'file-loaded'})
+            threading.Thread(target=self._fetch, args=(args[0], self.entry_id), daemon=True).start()
+            return {'playlist_entry_id': self.entry_id}
+        if name == 'seek':
+            if not self.playing:
+                raise MpvError('property unavailable')
+            self.playing['pos'], self.playing['since'] = float(args[0]), time.time()
+            self._send({'event': 'seek'})
+            self._send({'event': 'playback-restart'})
+            return None
+        if name == 'stop':
+            if self.playing:
+                self._send({'event': 'end-file', 'reason': 'stop', 'playlist_entry_id': self.playing['entry']})
+                self.playing = None
+            return None
+        raise MpvError('invalid parameter')
+
+    def _serve(self):
+        while self.running:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            self.conn = conn
+            pending = b''
+            while self.running:
+                try:
+                    data = conn.recv(65536)
+                except OSError:
+                    break
+                if not data:
+                    break
+                pending += data
+                *lines, pending = pending.split(b'\n')
+                for line in lines:
+                    msg = json.loads(line)
+                    with self.lock:
+                        try:
+                            reply = {'error': 'success', 'data': self._handle(msg['command'])}
+                        except MpvError as e:
+                            reply = {'error': str(e)}
+                        reply['request_id'] = msg.get('request_id', 0)
+                        self._send(reply)
+            self.conn = None
+
+    def close(self):
+        self.running = False
+        try:
+            self.listener.close()
+        except OSError:
+            pass
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
@@ -0,0 +1,165 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import effects
+import fxbench
+
+SR = 44100
+SIGNAL = fxbench.make_signal(SR // 2, SR)
+
+def process(settings, sizes):
+    """按 sizes 循环切块处理 SIGNAL，返回拼接后的输出"""
+    engine = effects.UltimateAudioEngine(sr=SR)
+    engine.update_settings(settings)
+    out, start, i = [], 0, 0
+    while start < len(SIGNAL):
+        n = sizes[i % len(sizes)]
+        out.append(engine.process_chunk(SIGNAL[start:start + n].copy()))
+        start, i = start + n, i + 1
+    return np.concatenate(out)
+
+CASES = [(p, e, r) for p in effects.PRESET_DATA for e in ("无", "房间", "大厅")
+         for r in (effects.REVERB_MODES if e != "无" else ("算法",))]
+
+@pytest.mark.parametrize("preset,env,reverb", CASES)
+def test_chunked_output_matches_one_shot(preset, env, reverb):
+    settings = dict(effects.preset_settings(preset, env), 混响=reverb)
+    whole = process(settings, [len(SIGNAL)])
+    for sizes in ([256], [1000], [300, 4096, 17]):
+        np.testing.assert_allclose(process(settings, sizes), whole, atol=1e-5)
+
+def test_surround_phase_follows_position():
+    engine = effects.UltimateAudioEngine(sr=SR)
+    engine.update_settings(dict(effects.DEFAULT_SETTINGS, 环绕强度=80))
+    coefs = engine._get_coefs()
+    period = engine.PHASE_PERIOD
+    full = engine._phase(coefs, 3 * period, np.empty(3 * period, dtype=np.float32)).copy()
+    # 每个周期与原来按 4096 帧一块生成的曲线相同
+    np.testing.assert_allclose(full[period:2 * period], np.sin(np.linspace(0, np.pi * 0.8, period)), atol=1e-6)
+    engine.seek(5000)
+    part = engine._phase(coefs, 3000, np.empty(3000, dtype=np.float32))
+    np.testing.assert_array_equal(part, full[5000:8000])
+
+def alloc_peak(settings, frames=1024, blocks=16):
+    """预热后每块 process_into 的最大 tracemalloc 峰值（字节）"""
+    engine = effects.UltimateAudioEngine(sr=SR)
+    engine.prepare(frames)
+    engine.update_settings(settings)
+    out = np.zeros((frames, 2), dtype=np.float32)
+    chunks = [SIGNAL[i:i + frames] for i in range(0, len(SIGNAL) - frames, frames)]
+    for block in chunks[:4]:
+        engine.process_into(block, out)
+    tracemalloc.start()
+    try:
+        peak = 0
+        for block in chunks[4:4 + blocks]:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            engine.process_into(block, out)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return peak
+
+# 不经过 scipy 滤波器（低音/高音/混响）的路径：M/S、环绕延迟与相位、限幅（含压缩中和空闲两种情况）
+ENGINE_ONLY = [dict(effects.DEFAULT_SETTINGS, 环绕强度=i, 环绕深度=d, 限幅=c)
+               for i in (0, 60, 100) for d in (0, 80) for c in (-1.0, -12.0)]
+
+@pytest.mark.parametrize("settings", ENGINE_ONLY)
+def test_engine_path_does_not_allocate(settings):
+    # 一个 1024 帧的立体声块本身是 8 KB，只允许 numpy 归约产生的零星小对象
+    assert alloc_peak(settings) < 4096
+
+@pytest.mark.parametrize("chunk", [4096, 10000])
+@pytest.mark.parametrize("delay", [1234.5, 2204.7])
+def test_delay_line_does_not_allocate(chunk, delay):
+    # chunk 比 50 ms 的延迟缓冲长，10000 还会被拆成多段写入；小数延迟走插值路径
+    line = effects.DelayLine(int(0.05 * SR))
+    x = np.random.default_rng(5).standard_normal(chunk * 6).astype(np.float32)
+    outs = [line.process(x[:chunk], delay).copy()]  # 第一块按 chunk 预留内部缓冲区
+    tracemalloc.start()
+    try:
+        peak = 0
+        for i in range(chunk, len(x), chunk):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            out = line.process(x[i:i + chunk], delay)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+            outs.append(out.copy())
+    finally:
+        tracemalloc.stop()
+    # 只有切片视图等几十字节的小对象，与 chunk 长度无关（一个 4096 帧的块本身是 16 KB）
+    assert peak < 2048
+    d = int(delay)
+    frac = delay - d
+    padded = np.concatenate([np.zeros(d + 1, dtype=np.float32), x])
+    expected = (1 - frac) * padded[1:len(x) + 1] + frac * padded[:len(x)]
+    np.testing.assert_allclose(np.concatenate(outs), expected, atol=1e-5)
+
+def reference_reverb(data, wet, decay_time, damping, sr=SR):
+    """原逐样本实现（去掉末尾削波），作为块处理版本的对照"""
+    comb_delays = [int(sr * t) for t in [0.031, 0.039, 0.042, 0.048, 0.055, 0.062, 0.068, 0.075]]
+    comb_bufs = [np.zeros(d + 1, dtype=np.float32) for d in comb_delays]
+    comb_pos = [0] * len(comb_delays)
+    comb_lp = np.zeros((2, len(comb_delays)), dtype=np.float32)
+    ap_delays = [int(sr * t) for t in [0.0048, 0.0035, 0.0024, 0.0019]]
+    ap_bufs = [np.zeros(d + 1, dtype=np.float32) for d in ap_delays]
+    ap_pos = [0] * len(ap_delays)
+    out = data.copy()
+    for i in range(len(data)):
+        for ch in range(2):
+            inp = data[i, ch]
+            reverb = 0.0
+            for c, delay in enumerate(comb_delays):
+                pos = comb_pos[c]
+                delayed = comb_bufs[c][(pos - delay) % (delay + 1)]
+                filtered = comb_lp[ch, c] * damping + delayed * (1.0 - damping)
+                comb_lp[ch, c] = filtered
+                fb = 10 ** (-3.0 * delay / (decay_time * sr + 1e-8))
+                comb_bufs[c][pos] = inp + filtered * fb * 0.92
+                reverb += filtered
+                comb_pos[c] = (pos + 1) % (delay + 1)
+            reverb /= len(comb_delays)
+            for a, delay in enumerate(ap_delays):
+                pos = ap_pos[a]
+                delayed = ap_bufs[a][(pos - delay) % (delay + 1)]
+                ap_out = -0.65 * reverb + delayed
+                ap_bufs[a][pos] = reverb + ap_out * 0.65
+                reverb = ap_out
+                ap_pos[a] = (pos + 1) % (delay + 1)
+            out[i, ch] = data[i, ch] * (1.0 - wet * 0.42) + reverb * wet * 1.35
+    return out
+
+@pytest.mark.parametrize("env", ["大厅", "弹簧", "地下通道"])
+def test_block_reverb_matches_per_sample_reference(env):
+    # 3000 帧（6000 个交错样本）超过最长梳状延迟，反馈路径也被覆盖
+    data = SIGNAL[:3000] * 0.5
+    wet, decay, damping = effects.ENV_DATA[env]
+    expected = reference_reverb(data, wet, decay, damping)
+    reverb = effects.AdvancedReverb(SR, max_frames=1024)
+    out = np.concatenate([reverb.process_into(data[i:i + 700].copy(), wet, decay, damping)
+                          for i in range(0, len(data), 700)])
+    np.testing.assert_allclose(out, expected, atol=1e-5)
+
+def test_limiter_holds_ceiling_on_hot_input():
+    settings = dict(effects.preset_settings("超重低音"), 限幅=-3.0)
+    engine = effects.UltimateAudioEngine(sr=SR)
+    engine.update_settings(settings)
+    hot = SIGNAL * 3.0
+    out = [engine.process_chunk(hot[i:i + 1024].copy()) for i in range(0, len(hot), 1024)]
+    out = np.concatenate(out + [engine.flush()])
+    assert len(out) == len(hot) + engine.latency
+    assert np.abs(out).max() <= np.float32(10 ** (settings["限幅"] / 20))
+    assert engine.limiter.peak_reduction_db > 0
+
+def test_limiter_quiet_path_is_a_pure_delay():
+    limiter = effects.PeakLimiter(SR)
+    quiet = SIGNAL * 0.5
+    out = [limiter.process_into(quiet[i:i + 1000].copy()) for i in range(0, len(quiet), 1000)]
+    out = np.concatenate(out + [limiter.flush()])
+    D = limiter.lookahead
+    np.testing.assert_array_equal(out[:D], 0)
+    np.testing.assert_array_equal(out[D:], quiet)
+    assert limiter.peak_reduction_db == 0
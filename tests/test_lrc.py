@@ -0,0 +1,24 @@
+import pytest
+
+import lrc
+
+MAIN = "[offset:+500]\n[00:10.00]hello\n[00:20.00]world"
+SUB = "[00:10.00]你好\n[00:20.00]世界"
+
+def test_main_offset_also_shifts_translation():
+    # offset 远大于 TRANS_TOLERANCE，翻译若不跟着平移就会全部错过
+    assert 0.5 > lrc.TRANS_TOLERANCE
+    track = lrc.parse_lyrics(MAIN, SUB)
+    assert list(track.times) == pytest.approx([9.5, 19.5])
+    assert track.trans == ["你好", "世界"]
+
+def test_translation_keeps_its_own_offset():
+    track = lrc.parse_lyrics(MAIN, "[offset:0]\n[00:09.50]你好\n[00:19.50]世界")
+    assert track.trans == ["你好", "世界"]
+    track = lrc.parse_lyrics(MAIN, "[offset:+500]\n[00:10.00]你好\n[00:20.00]世界")
+    assert track.trans == ["你好", "世界"]
+
+def test_multiple_time_tags_are_sorted():
+    times, texts = lrc.parse_lrc("[00:30.00][00:05.00]副歌\n[00:10.00]主歌")
+    assert list(times) == [5.0, 10.0, 30.0]
+    assert texts == ["副歌", "主歌", "副歌"]
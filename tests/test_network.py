@@ -0,0 +1,187 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import network
+
+DATA = bytes(range(256)) * 4096  # 1 MB
+
+class StubHandler(BaseHTTPRequestHandler):
+    """按路径模拟各种服务器行为，收到的请求记录在 server.requests"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.client_address[1], self.headers.get("Range")))
+            count = sum(1 for r in server.requests if r[0] == self.path)
+        if self.path == "/ok":
+            self._send(200, b"ok")
+        elif self.path == "/flaky":
+            # 前两次 503，第三次成功
+            self._send(503 if count <= 2 else 200, b"busy" if count <= 2 else b"ok")
+        elif self.path == "/slow":
+            time.sleep(1.0)
+            self._send(200, b"late")
+        elif self.path == "/throttled":
+            self._stream(DATA, 0, pause=0.01)
+        elif self.path == "/drop-often":
+            # 每次连接只发 128 KB 就断开，总共断开次数远多于重试次数
+            value = self.headers.get("Range")
+            start = int(value[6:].split("-")[0]) if value else 0
+            self._stream(DATA, start, stop=min(len(DATA), start + 128 * 1024))
+        elif self.path in ("/drop", "/drop-norange"):
+            start = 0
+            value = self.headers.get("Range")
+            if value and self.path == "/drop":
+                start = int(value[6:].split("-")[0])
+            # 第一次只发一半就断开连接
+            self._stream(DATA, start, stop=len(DATA) // 2 if count == 1 else None)
+        else:
+            self._send(404, b"")
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, data, start, stop=None, pause=0.0):
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Length", str(len(data) - start))
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.end_headers()
+        end = len(data) if stop is None else stop
+        stop = None if end == len(data) else stop
+        try:
+            for pos in range(start, end, 16 * 1024):
+                self.wfile.write(data[pos:min(pos + 16 * 1024, end)])
+                if pause:
+                    time.sleep(pause)
+        except OSError:
+            return
+        if stop is not None:
+            self.close_connection = True
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_port}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_requests_share_one_connection(server):
+    client = network.HttpClient()
+    for _ in range(5):
+        assert client.get(server.url + "/ok", "metadata").content == b"ok"
+    assert len({port for _, port, _ in server.requests}) == 1
+    assert client.timings()["metadata"]["count"] == 5
+
+def test_retries_server_errors(server):
+    client = network.HttpClient(retries=2, backoff=0.01)
+    resp = client.get(server.url + "/flaky")
+    assert resp.status_code == 200 and resp.content == b"ok"
+    assert len(server.requests) == 3
+
+def test_read_timeout_raises(server):
+    client = network.HttpClient(retries=0)
+    with pytest.raises(requests.RequestException):
+        client.get(server.url + "/slow", timeout=(1, 0.2))
+    assert client.timings()["default"]["errors"] == 1
+
+def test_stream_buffer_is_readable_before_download_finishes(server):
+    buf = network.StreamBuffer(server.url + "/throttled")
+    assert buf.wait_for(64 * 1024, timeout=5)
+    assert not buf.done
+    assert buf.read(0, 1000) == DATA[:1000]
+    assert buf.getvalue() == DATA
+
+def test_prebuffer_is_ready_well_before_download_finishes(server):
+    # /throttled 发完 1 MB 约需 0.64 秒，起播只需等到前 256 KB
+    start = time.perf_counter()
+    buf = network.StreamBuffer(server.url + "/throttled")
+    assert buf.wait_for(256 * 1024, timeout=5)
+    first = time.perf_counter() - start
+    buf.getvalue()
+    total = time.perf_counter() - start
+    assert first < total / 2
+
+@pytest.mark.parametrize("path", ["/drop", "/drop-norange"])
+def test_stream_buffer_resumes_after_dropped_connection(server, path):
+    completed = []
+    buf = network.StreamBuffer(server.url + path, on_complete=completed.append)
+    assert buf.getvalue() == DATA
+    assert completed == [DATA]
+    # 第二次请求从已收到的位置续传；服务器不支持 Range 时跳过已有部分
+    assert server.requests[1][2] == f"bytes={len(DATA) // 2}-"
+
+def test_stream_buffer_applies_backpressure(server):
+    buf = network.StreamBuffer(server.url + "/throttled", chunk_size=16 * 1024, max_ahead=128 * 1024)
+    buf.wait_for(128 * 1024, timeout=5)
+    time.sleep(0.3)
+    assert buf.size <= 128 * 1024 + 16 * 1024
+    assert b"".join(buf.iter_from(0)) == DATA
+
+def test_stream_buffer_retry_budget_resets_after_progress(server):
+    # 8 次断开，但每次重连都有进展，不应耗尽 retries=3
+    buf = network.StreamBuffer(server.url + "/drop-often", retries=3)
+    assert buf.getvalue() == DATA
+    assert buf.error is None
+    assert len(server.requests) == len(DATA) // (128 * 1024)
+
+class BytesSource:
+    content_type = "audio/mpeg"
+
+    def __init__(self, data):
+        self.data = data
+
+    def length(self):
+        return len(self.data)
+
+    def open(self, start):
+        for pos in range(start, len(self.data), 64 * 1024):
+            yield self.data[pos:pos + 64 * 1024]
+
+@pytest.fixture
+def bridge():
+    local = network.LocalStreamServer()
+    yield local.register(BytesSource(DATA))
+    local.close()
+
+@pytest.mark.parametrize("value, start, end", [
+    ("bytes=100-", 100, len(DATA) - 1),
+    ("bytes=100-199", 100, 199),
+    ("bytes=-500", len(DATA) - 500, len(DATA) - 1),
+    ("bytes=-99999999", 0, len(DATA) - 1),
+    ("bytes=1000-99999999", 1000, len(DATA) - 1),
+])
+def test_local_server_serves_requested_range(bridge, value, start, end):
+    resp = requests.get(bridge, headers={"Range": value})
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == f"bytes {start}-{end}/{len(DATA)}"
+    assert int(resp.headers["Content-Length"]) == end + 1 - start
+    assert resp.content == DATA[start:end + 1]
+
+@pytest.mark.parametrize("value", ["bytes=abc-", "bytes=-", "bytes=-0", "bytes=5-2",
+                                   f"bytes={len(DATA)}-", "bytes=1-x"])
+def test_local_server_rejects_bad_range(bridge, value):
+    resp = requests.get(bridge, headers={"Range": value})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == f"bytes */{len(DATA)}"
+
+def test_local_server_ignores_multiple_ranges(bridge):
+    resp = requests.get(bridge, headers={"Range": "bytes=0-1,5-6"})
+    assert resp.status_code == 200
+    assert resp.content == DATA
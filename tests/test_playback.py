@@ -0,0 +1,92 @@
+import io
+import threading
+import time
+
+import numpy as np
+
+import effects
+import network
+import v
+
+class FakeDecoder:
+    """代替 ffmpeg 进程：stdout 直接给出 float32 PCM，stdin 丢弃写入"""
+    def __init__(self, frames, pcm=None):
+        pcm = np.zeros((frames, 2), dtype=np.float32) if pcm is None else pcm
+        self.stdout = io.BytesIO(pcm.tobytes())
+        self.stdin = io.BytesIO()
+
+    def kill(self):
+        pass
+
+    def poll(self):
+        return 0
+
+    def wait(self):
+        return 0
+
+class ProbeEngine:
+    """记录同时有几个线程在处理音频，以及每块来自哪个位置"""
+    revision = 0
+    latency = 0
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+
+    def seek(self, frame):
+        self.calls.append(('seek', frame))
+
+    def process_chunk(self, chunk):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.002)
+        with self.lock:
+            self.active -= 1
+        self.calls.append(('chunk', threading.current_thread().name))
+        return chunk
+
+    def flush(self):
+        return np.zeros((0, 2), dtype=np.float32)
+
+def test_seek_request_takes_over_the_shared_engine(monkeypatch):
+    monkeypatch.setattr(v.RealtimeAudioProcessor, "spawn_decoder", classmethod(lambda cls, ss=0: FakeDecoder(44100)))
+    engine = ProbeEngine()
+    source = v.WavPcmSource(network.StreamBuffer.from_bytes(b"mp3"), engine, duration=1.0)
+    old = source.open(0)
+    next(old)                       # WAV 头
+    next(old)                       # 旧请求已在处理音频
+    start = source.HEADER_SIZE + 22050 * source.FRAME_BYTES
+    new = source.open(start)        # mpv 跳转：先发新请求，旧连接稍后才断开
+    results = {}
+
+    def drain(name, gen):
+        results[name] = sum(len(chunk) for chunk in gen)
+
+    threads = [threading.Thread(target=drain, args=(name, gen), name=name)
+               for name, gen in (("old", old), ("new", new))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+    assert engine.max_active == 1
+    # 新请求开始后旧请求不再处理任何一块
+    first_new = engine.calls.index(('seek', 22050))
+    assert ('chunk', 'old') not in engine.calls[first_new:]
+    assert results["new"] == source.length() - start
+
+def test_streamed_output_is_aligned_and_keeps_the_tail(monkeypatch):
+    # 限幅器输出晚 latency 帧：开头丢掉的部分由结束时 flush 补上，输出逐帧对齐且总长度与 WAV 头一致
+    t = np.arange(44100, dtype=np.float32) / 44100
+    pcm = np.repeat((0.3 * np.sin(2 * np.pi * 440 * t))[:, None], 2, axis=1)
+    monkeypatch.setattr(v.RealtimeAudioProcessor, "spawn_decoder",
+                        classmethod(lambda cls, ss=0: FakeDecoder(len(pcm), pcm)))
+    source = v.WavPcmSource(network.StreamBuffer.from_bytes(b"mp3"), effects.UltimateAudioEngine(), duration=1.0)
+    data = b"".join(source.open(0))
+    assert len(data) == source.length()
+    out = np.frombuffer(data[source.HEADER_SIZE:], dtype=np.int16).reshape(-1, 2) / 32768
+    # 默认设置下引擎输出为 1.4 倍输入，限幅器不动作
+    np.testing.assert_allclose(out, pcm * 1.4, atol=2 / 32768)
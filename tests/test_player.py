@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+import network
+import player
+from fake_mpv import FakeMpvServer
+
+class Source:
+    """LocalStreamServer 的最小音频源"""
+    content_type = "audio/mpeg"
+
+    def __init__(self, data):
+        self.data = data
+
+    def length(self):
+        return len(self.data)
+
+    def open(self, start):
+        yield self.data[start:]
+
+@pytest.fixture
+def mpv(tmp_path):
+    server = FakeMpvServer(str(tmp_path / "mpv.sock"), duration=0.6, tick=0.02)
+    client = player.MpvIpcPlayer(str(tmp_path / "mpv.sock"), spawn=False).start()
+    bridge = network.LocalStreamServer()
+    yield server, client, bridge
+    client.close()
+    server.close()
+    bridge.close()
+
+def test_loadfile_reads_through_local_bridge_and_reports_end(mpv):
+    server, client, bridge = mpv
+    ended = threading.Event()
+    client.on_track_end = ended.set
+    data = b"x" * 300000
+    client.loadfile(bridge.register(Source(data)))
+    assert ended.wait(3)
+    assert client.ended()
+    assert server.bytes_read[1] == len(data)
+
+def test_pause_holds_position_and_seek_moves_it(mpv):
+    server, client, bridge = mpv
+    server.duration = 30.0
+    client.loadfile(bridge.register(Source(b"x" * 1000)))
+    time.sleep(0.1)
+    client.set_pause(True)
+    held = client.position()
+    time.sleep(0.3)
+    assert client.position() == pytest.approx(held, abs=0.05)
+    client.set_pause(False)
+    client.seek(12.0)
+    time.sleep(0.3)
+    assert 12.0 <= client.position() < 13.0
+    assert client.last_seek_ms is not None
+
+def test_replaced_track_does_not_count_as_ended(mpv):
+    server, client, bridge = mpv
+    server.duration = 30.0
+    client.loadfile(bridge.register(Source(b"a")))
+    client.loadfile(bridge.register(Source(b"b")))
+    time.sleep(0.1)
+    assert not client.ended()
@@ -0,0 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import effects
+import fxbench
+import render
+
+SR = 44100
+# 默认设置下引擎只做 M/S 往返和 1.4 倍增益；信号足够小时限幅器不动作，输出应逐帧等于 1.4 倍输入
+QUIET = fxbench.make_signal(3 * SR, SR) * 0.5
+
+def test_serial_render_is_aligned_and_keeps_the_tail():
+    out = render.render_serial(QUIET, effects.DEFAULT_SETTINGS)
+    assert out.shape == QUIET.shape
+    np.testing.assert_allclose(out, QUIET * 1.4, atol=1e-6)
+
+@pytest.mark.parametrize("chunk", [1024, 4096])
+def test_parallel_render_matches_serial(chunk):
+    with ThreadPoolExecutor(2) as pool:
+        out = render.render_parallel(QUIET, effects.DEFAULT_SETTINGS, workers=2, chunk=chunk,
+                                     segment_sec=1.0, preroll_sec=0.1, executor=pool)
+    np.testing.assert_allclose(out, QUIET * 1.4, atol=1e-6)
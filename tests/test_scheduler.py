@@ -0,0 +1,61 @@
+import sys
+import tracemalloc
+
+import pytest
+
+import v
+
+TRACKS = 5000
+
+@pytest.mark.parametrize("mode", v.CONFIG["modes"])
+def test_scheduler_soak_keeps_stack_and_memory_flat(monkeypatch, mode):
+    """连续播放 5000 首：调用深度不变，每首的 1 MB 资源在返回后释放"""
+    monkeypatch.setitem(v.CONFIG, "play_mode", mode)
+    depths, played = set(), []
+
+    def fake_play_song(song_id, track_end_at=None):
+        audio = bytearray(1024 * 1024)  # 模拟一首歌的音频数据
+        frame, depth = sys._getframe(), 0
+        while frame:
+            frame, depth = frame.f_back, depth + 1
+        depths.add(depth)
+        played.append(song_id)
+        if len(played) == 100:
+            tracemalloc.start()
+        elif len(played) == TRACKS:
+            return 'back'
+        return 'ended' if audio else 'back'  # 引用 audio，保证它活到返回
+
+    monkeypatch.setattr(v, "play_song", fake_play_song)
+    scheduler = v.PlaybackScheduler()
+    playlist = [{'id': i} for i in range(30)]
+    try:
+        scheduler.play(playlist, 0)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(played) == TRACKS
+    assert len(depths) == 1
+    # 同一时刻最多只有一首的数据；历史记录有上限
+    assert peak < 2.5 * 1024 * 1024
+    assert current < 64 * 1024
+    assert len(scheduler.history) == scheduler.HISTORY_LIMIT
+    if mode == "单曲循环":
+        assert set(played) == {0}
+
+def test_mode_switch_reschedules_prefetch(monkeypatch):
+    """切换播放模式后按新模式重新预加载；离开随机播放时丢掉旧的随机队列"""
+    monkeypatch.setitem(v.CONFIG, "play_mode", "随机播放")
+    monkeypatch.setitem(v.CONFIG, "enable_preload", True)
+    monkeypatch.setitem(v.CONFIG, "preload_depth", 2)
+    scheduled = []
+    monkeypatch.setattr(v.PREFETCHER, "schedule", scheduled.append)
+    scheduler = v.PlaybackScheduler()
+    scheduler.playlist = [{'id': i} for i in range(10)]
+    scheduler.index = 3
+    scheduler.random_queue = [7, 1]
+    scheduler.set_mode("列表顺序播放")
+    assert scheduler.random_queue == []
+    assert scheduled[-1] == [4, 5]
+    scheduler.set_mode("单曲循环")
+    assert scheduled[-1] == []
@@ -0,0 +1,45 @@
+import pytest
+
+import search
+
+SONGS = [
+    {'id': 1, 'name': 'Café del Mar', 'artist': 'Энигма'},
+    {'id': 2, 'name': 'Кино', 'artist': 'Виктор Цой'},
+    {'id': 3, 'name': 'Ελληνικά', 'artist': 'Über Band'},
+    {'id': 4, 'name': '晴天', 'artist': '周杰伦'},
+    {'id': 5, 'name': 'สวัสดี', 'artist': 'Thai'},
+    {'id': 6, 'name': 'Love Story', 'artist': 'Taylor Swift'},
+]
+
+@pytest.mark.parametrize("query,expected", [
+    ("café", 1), ("CAFE", None), ("caf", 1), ("энигм", 1), ("кино", 2), ("цой", 2),
+    ("ελληνικά", 3), ("über", 3), ("晴天", 4), ("周杰伦 晴天", 4), ("สวัสดี", 5), ("lov", 6),
+])
+def test_search_finds_non_ascii_titles(query, expected):
+    ids = [s['id'] for s in search.SearchIndex(SONGS).search(query)]
+    assert ids == ([expected] if expected else [])
+
+def test_cjk_runs_split_into_chars_and_bigrams():
+    assert search.index_terms("abc晴天 Café") == ['abc', '晴', '天', '晴天', 'café']
+
+def test_hardcoded_marks_match_unicode_data():
+    import re
+    import unicodedata
+    if unicodedata.unidata_version != "14.0.0":
+        pytest.skip("MARKS 按 Unicode 14.0.0 生成")
+    marks = re.compile(f"[{search.MARKS}]")
+    expected = {cp for cp in range(0x10000) if unicodedata.category(chr(cp)).startswith('M')}
+    assert {cp for cp in range(0x10000) if marks.match(chr(cp))} == expected
+
+PINYIN = {'晴': 'qing', '天': 'tian', '周': 'zhou', '杰': 'jie', '伦': 'lun'}
+
+def test_pinyin_terms_with_stubbed_lazy_pinyin(monkeypatch):
+    monkeypatch.setattr(search, "lazy_pinyin", lambda run: [PINYIN.get(ch, ch) for ch in run])
+    assert search.pinyin_terms("晴天 Live") == ['qing', 'tian', 'qingtian', 'qt']
+    index = search.SearchIndex(SONGS)
+    for query in ("qt", "qingtian", "zjl", "zhou jie"):
+        assert [s['id'] for s in index.search(query)] == [4]
+
+def test_pinyin_terms_without_pypinyin(monkeypatch):
+    monkeypatch.setattr(search, "lazy_pinyin", None)
+    assert search.pinyin_terms("晴天") == []
@@ -4,20 +4,32 @@ import json
 import re
 import os
 import sys
-import requests
 import platform
 import atexit
 import traceback
-import io
 import threading
+import asyncio
+import selectors
+import signal
 import random
+import shutil
+import struct
+import hashlib
 import urllib3
-from concurrent.futures import ThreadPoolExecutor
+import network
+import player
+import lrc
+import playlists
+import search
+from collections import deque
+from contextlib import contextmanager
 
 try:
     import effects
+    import render
 except ImportError:
     effects = None
+    render = None
 
 SYSTEM = platform.system()
 
@@ -26,10 +38,9 @@ if SYSTEM == "Windows":
 else:
     import tty
     import termios
-    import select
 
 current_player = None
-should_play_next = True
+mpv_session = None
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 def cleanup():
@@ -39,13 +50,19 @@ def cleanup():
             current_player.terminate()
         except:
             pass
+    if mpv_session:
+        mpv_session.close()
+    PLAYLISTS.close()
     if SYSTEM != "Windows":
         os.system('stty sane 2>/dev/null')
 
 atexit.register(cleanup)
 
 CONFIG_FILE = "app_settings.json"
-CACHE_FILE = "playlists_cache.json"
+CACHE_FILE = "playlists_cache.json"  # 旧版歌单缓存，首次启动时迁移到 PLAYLIST_DB
+PLAYLIST_DB = "playlists.db"
+AUDIO_CACHE_DIR = "audio_cache"
+RENDER_CACHE_DIR = "render_cache"
 
 CONFIG = {
     "play_mode": "列表顺序播放",
@@ -54,11 +71,13 @@ CONFIG = {
     "debug_mode": False,
     "enable_preload": False,
     "remember_playlists": False,
+    "audio_cache_mb": 512,
+    "render_cache_mb": 1024,
+    "preload_depth": 1,
+    "prebuffer_kb": 256,
+    "progress_hz": 4,
 }
 
-current_playlist = []
-current_song_idx = 0
-
 def load_config():
     try:
         if os.path.exists(CONFIG_FILE):
@@ -69,6 +88,11 @@ def load_config():
                 CONFIG["play_mode"] = data.get("play_mode", "列表顺序播放")
                 CONFIG["enable_preload"] = data.get("enable_preload", False)
                 CONFIG["remember_playlists"] = data.get("remember_playlists", False)
+                CONFIG["audio_cache_mb"] = data.get("audio_cache_mb", 512)
+                CONFIG["render_cache_mb"] = data.get("render_cache_mb", 1024)
+                CONFIG["preload_depth"] = data.get("preload_depth", 1)
+                CONFIG["prebuffer_kb"] = data.get("prebuffer_kb", 256)
+                CONFIG["progress_hz"] = data.get("progress_hz", 4)
     except:
         pass
 
@@ -85,44 +109,187 @@ def save_config():
     data["play_mode"] = CONFIG["play_mode"]
     data["enable_preload"] = CONFIG["enable_preload"]
     data["remember_playlists"] = CONFIG["remember_playlists"]
+    data["audio_cache_mb"] = CONFIG["audio_cache_mb"]
+    data["render_cache_mb"] = CONFIG["render_cache_mb"]
+    data["preload_depth"] = CONFIG["preload_depth"]
+    data["prebuffer_kb"] = CONFIG["prebuffer_kb"]
+    data["progress_hz"] = CONFIG["progress_hz"]
     try:
         with open(CONFIG_FILE, 'w') as f:
             json.dump(data, f)
     except:
         pass
 
-def load_playlist_cache():
-    try:
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, 'r') as f:
-                return json.load(f)
-    except:
-        pass
-    return {}
+PLAYLISTS = playlists.PlaylistStore(PLAYLIST_DB, legacy_json=CACHE_FILE)
 
-def save_playlist_cache(cache):
+def _playlist_store_call(action, *args, default=None):
     try:
-        with open(CACHE_FILE, 'w') as f:
-            json.dump(cache, f, ensure_ascii=False)
+        return action(*args)
     except Exception as e:
         if CONFIG.get("debug_mode"):
-            print(f"保存缓存失败: {e}")
+            print(f"歌单缓存操作失败: {e}")
+        return default
+
+def get_cached_playlist(playlist_id):
+    """返回缓存的歌曲列表，未缓存时返回 None"""
+    return _playlist_store_call(PLAYLISTS.get_songs, playlist_id)
 
 def update_playlist_in_cache(playlist_id, songs, name=""):
-    cache = load_playlist_cache()
-    cache[playlist_id] = {"songs": songs, "name": name}
-    save_playlist_cache(cache)
+    _playlist_store_call(PLAYLISTS.save, playlist_id, songs, name)
 
 def delete_playlist_from_cache(playlist_id):
-    cache = load_playlist_cache()
-    if playlist_id in cache:
-        del cache[playlist_id]
-        save_playlist_cache(cache)
-        return True
-    return False
+    return _playlist_store_call(PLAYLISTS.delete, playlist_id, default=False)
+
+def clear_playlist_cache():
+    _playlist_store_call(PLAYLISTS.clear)
+
+def list_cached_playlists():
+    """返回 [(歌单ID, 名称, 歌曲数)]"""
+    return _playlist_store_call(PLAYLISTS.list_playlists, default=[])
 
 def get_cached_playlist_ids():
-    return list(load_playlist_cache().keys())
+    return [pid for pid, _, _ in list_cached_playlists()]
+
+class AudioCache:
+    """本地音频缓存：文件按内容 sha256 命名，索引按歌曲 ID 记录，超出上限时按最近使用淘汰"""
+    def __init__(self, root=AUDIO_CACHE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self.lock = threading.Lock()
+        self.index = None
+
+    def _load(self):
+        if self.index is not None:
+            return self.index
+        self.index = {"entries": {}, "stats": {"hits": 0, "misses": 0}}
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r') as f:
+                    data = json.load(f)
+                self.index["entries"] = data.get("entries", {})
+                self.index["stats"].update(data.get("stats", {}))
+        except:
+            pass
+        return self.index
+
+    def _atomic_write(self, path, data, mode='wb'):
+        tmp = f"{path}.tmp{threading.get_ident()}"
+        with open(tmp, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _save(self):
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            self._atomic_write(self.index_path, json.dumps(self.index, ensure_ascii=False), mode='w')
+        except Exception as e:
+            if CONFIG.get("debug_mode"):
+                print(f"保存音频缓存索引失败: {e}")
+
+    @staticmethod
+    def variant_of(link):
+        # 同一首歌不同音质/版本的链接文件名不同，去掉查询参数后作为版本标识
+        return link.split('?')[0].rsplit('/', 1)[-1] if link else ""
+
+    def _remove(self, key):
+        entry = self.index["entries"].pop(key, None)
+        # 内容相同的歌曲共用一个文件，仍被引用时不删除
+        if entry and all(e["file"] != entry["file"] for e in self.index["entries"].values()):
+            try:
+                os.remove(os.path.join(self.root, entry["file"]))
+            except OSError:
+                pass
+
+    def get(self, song_id, link=None):
+        """命中返回 (音频字节, 元数据)，未命中返回 (None, None)；link 为空时接受任意版本"""
+        if CONFIG["audio_cache_mb"] <= 0:
+            return None, None
+        key = str(song_id)
+        with self.lock:
+            index = self._load()
+            entry = index["entries"].get(key)
+            data = None
+            if entry and (link is None or entry.get("variant") == self.variant_of(link)):
+                try:
+                    with open(os.path.join(self.root, entry["file"]), 'rb') as f:
+                        data = f.read()
+                    # 完整性校验：内容哈希必须与文件名一致
+                    if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                        data = None
+                        self._remove(key)
+                except OSError:
+                    data = None
+                    self._remove(key)
+            if data is None:
+                index["stats"]["misses"] += 1
+                self._save()
+                return None, None
+            entry["atime"] = time.time()
+            index["stats"]["hits"] += 1
+            self._save()
+            return data, entry.get("meta")
+
+    def get_meta(self, song_id):
+        with self.lock:
+            entry = self._load()["entries"].get(str(song_id))
+            return entry.get("meta") if entry else None
+
+    def put(self, song_id, link, data, meta=None):
+        limit = CONFIG["audio_cache_mb"] * 1024 * 1024
+        if limit <= 0 or not data or len(data) > limit:
+            return
+        key = str(song_id)
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{digest}.mp3"
+        with self.lock:
+            index = self._load()
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                path = os.path.join(self.root, name)
+                if not os.path.exists(path):
+                    self._atomic_write(path, data)
+            except Exception as e:
+                if CONFIG.get("debug_mode"):
+                    print(f"写入音频缓存失败: {e}")
+                return
+            old = index["entries"].get(key)
+            if old and old["file"] != name:
+                self._remove(key)
+            index["entries"][key] = {
+                "file": name, "sha256": digest, "size": len(data),
+                "variant": self.variant_of(link), "atime": time.time(), "meta": meta,
+            }
+            self._evict(limit)
+            self._save()
+
+    def _evict(self, limit):
+        entries = self.index["entries"]
+        total = sum(e["size"] for e in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["atime"]):
+            if total <= limit:
+                break
+            total -= entries[key]["size"]
+            self._remove(key)
+
+    def stats(self):
+        with self.lock:
+            index = self._load()
+            size = sum(e["size"] for e in index["entries"].values())
+            return {"count": len(index["entries"]), "size": size, **index["stats"]}
+
+    def clear(self):
+        with self.lock:
+            index = self._load()
+            for key in list(index["entries"]):
+                self._remove(key)
+            index["stats"] = {"hits": 0, "misses": 0}
+            self._save()
+
+AUDIO_CACHE = AudioCache()
+# 音效处理后的整首 PCM，重播和单曲循环时跳过解码与处理
+RENDER_CACHE = render.RenderCache(RENDER_CACHE_DIR, lambda: CONFIG["render_cache_mb"] * 1024 * 1024) if render else None
 
 def handle_error(e, context=""):
     if SYSTEM != "Windows": os.system('stty sane 2>/dev/null')
@@ -147,103 +314,189 @@ def clear_screen():
     print(f"[4] 音效设置 [{fx_status}]")
     print("-" * 50)
 
-def get_key():
-    if SYSTEM == "Windows":
-        if msvcrt.kbhit():
-            return msvcrt.getch().decode('utf-8', errors='ignore')
-        return None
-    else:
-        fd = sys.stdin.fileno()
-        old_settings = termios.tcgetattr(fd)
+class KeyEvents:
+    """按键事件源（播放界面、评论界面）：进入界面时切换一次 cbreak，之后用一次 select 同时等待按键、唤醒管道和超时
+
+    后台线程（播放结束等）调用 wake() 让主循环立即醒来；需要 input() 时用 suspend() 临时恢复终端。
+    """
+    def __init__(self):
+        self.fd = None
+        self.old_settings = None
+        self.selector = None
+        self.wake_r = self.wake_w = None
+        self.woken = threading.Event()  # Windows 下没有可 select 的管道，用事件代替
+
+    def __enter__(self):
+        if SYSTEM != "Windows":
+            self.fd = sys.stdin.fileno()
+            self.old_settings = termios.tcgetattr(self.fd)
+            self.wake_r, self.wake_w = os.pipe()
+            os.set_blocking(self.wake_r, False)
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.fd, selectors.EVENT_READ)
+            self.selector.register(self.wake_r, selectors.EVENT_READ)
+            self.rearm()
+        return self
+
+    def __exit__(self, *exc):
+        if self.selector:
+            self.selector.close()
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
+            wake_r, wake_w = self.wake_r, self.wake_w
+            # 先清空再关闭：之后迟到的 wake() 不能写进系统复用了这个编号的其他文件
+            self.wake_r = self.wake_w = None
+            os.close(wake_r)
+            os.close(wake_w)
+            self.selector = None
+
+    def rearm(self):
+        """clear_screen() 会执行 stty sane，重绘后需要重新进入 cbreak"""
+        if self.fd is not None:
+            tty.setcbreak(self.fd)
+
+    @contextmanager
+    def suspend(self):
+        """临时恢复进入界面前的终端模式（用于 input() 或音效调节界面），结束后回到 cbreak"""
+        if self.fd is not None:
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
         try:
-            tty.setcbreak(sys.stdin.fileno())  # 关键修改
-            rlist, _, _ = select.select([sys.stdin], [], [], 0.05)
-            if rlist:
-                key = sys.stdin.read(1)
-                return key
-            return None
+            yield
         finally:
-            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-            
+            self.rearm()
+
+    def wake(self):
+        self.woken.set()
+        wake_w = self.wake_w
+        if wake_w is None:
+            return
+        try:
+            os.write(wake_w, b'.')
+        except OSError:
+            pass
+
+    def wait(self, timeout=None):
+        """等待下一个事件，返回按下的键；被唤醒或超时返回 None"""
+        if SYSTEM == "Windows":
+            deadline = None if timeout is None else time.time() + timeout
+            while not msvcrt.kbhit():
+                if self.woken.is_set() or (deadline is not None and time.time() >= deadline):
+                    self.woken.clear()
+                    return None
+                time.sleep(0.05)
+            return msvcrt.getch().decode('utf-8', errors='ignore')
+        key = None
+        for sel_key, _ in self.selector.select(timeout):
+            if sel_key.fd == self.wake_r:
+                try:
+                    while os.read(self.wake_r, 64):
+                        pass
+                except BlockingIOError:
+                    pass
+            else:
+                key = os.read(self.fd, 1).decode('utf-8', errors='ignore') or None
+        return key
+
 def format_time(seconds):
     mins = int(seconds // 60)
     secs = int(seconds % 60)
     return f"{mins:02d}:{secs:02d}"
 
-def render_cover(path):
-    """显示封面图"""
-    if not os.path.exists(path):
-        return
+class CoverRenderer:
+    """封面渲染：chafa 只检测一次，每首歌在每种终端宽度下只渲染一次，之后整段 ANSI 文本直接写出"""
+    MAX_WIDTH = 40
 
-    # 尝试使用 chafa
-    try:
-        # 检查 chafa
-        result = subprocess.run(
-            ['chafa', '--version'],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-        if result.returncode == 0:
-            subprocess.run(['chafa', '--size', '40x20', path])
+    def __init__(self, keep=4):
+        self.keep = keep
+        self.chafa = None        # None 表示尚未检测
+        self.images = {}         # song_id -> 封面原始数据，只保留最近 keep 首
+        self.rendered = {}       # (song_id, 宽度) -> ANSI 文本
+
+    def add(self, song_id, data):
+        if not data or song_id in self.images:
             return
-    except FileNotFoundError:
-        pass   # chafa 未安装，走 Pillow 回退
+        self.images[song_id] = data
+        while len(self.images) > self.keep:
+            old = next(iter(self.images))
+            del self.images[old]
+            for key in [k for k in self.rendered if k[0] == old]:
+                del self.rendered[key]
+
+    def has_chafa(self):
+        if self.chafa is None:
+            self.chafa = shutil.which('chafa') is not None
+        return self.chafa
+
+    def width(self):
+        try:
+            return max(1, min(self.MAX_WIDTH, os.get_terminal_size().columns))
+        except:
+            return self.MAX_WIDTH
+
+    def render(self, song_id, width=None):
+        """返回封面的 ANSI 文本（含换行），没有封面或无法渲染时为空字符串"""
+        width = width or self.width()
+        key = (song_id, width)
+        if key not in self.rendered:
+            data = self.images.get(song_id)
+            if not data:
+                return ""
+            text = (self._render_chafa(data, width) if self.has_chafa() else None)
+            if text is None:
+                text = self._render_pillow(data, width)
+            self.rendered[key] = text
+        return self.rendered[key]
+
+    def _render_chafa(self, data, width):
+        import tempfile
+        fd, path = tempfile.mkstemp(suffix='.jpg')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            result = subprocess.run(['chafa', '--size', f'{width}x{width // 2}', path],
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            if result.returncode == 0:
+                return result.stdout.decode('utf-8', errors='ignore')
+        except OSError:
+            self.chafa = False
+        finally:
+            os.remove(path)
+        return None
 
-    # 回退到 Pillow
-    try:
-        from PIL import Image
-    except ImportError:
-        return   # 也没有 Pillow，什么也不显示
+    def _render_pillow(self, data, width):
+        try:
+            import io
+            import numpy as np
+            from PIL import Image
+        except ImportError:
+            return ""   # 没有 Pillow，什么也不显示
 
-    try:
-        img = Image.open(path).convert('RGB')
-        term_width = 40
-        aspect = img.height / img.width
-        # 终端中每个“▄”字符占用 1 列宽 x 2 行高，因此需要将实际像素高度映射为
-        # new_height 个字符行，每行对应 2 个像素高度。
-        # 公式：new_height = term_width * aspect / 2
-        new_height = max(1, int(term_width * aspect * 0.5))
-        # 将图片缩放到 (term_width x new_height*2) 的实际像素
-        img = img.resize((term_width, new_height * 2), Image.LANCZOS)
-        pixels = img.load()
-
-        for y in range(new_height):
-            line_chars = []
-            for x in range(term_width):
-                r1, g1, b1 = pixels[x, y * 2]                     # 上半部
-                r2, g2, b2 = pixels[x, y * 2 + 1]                 # 下半部
-                # 前景色 = 上半部颜色，背景色 = 下半部颜色，使用半块字符“▄”
-                line_chars.append(
-                    f'\033[38;2;{r1};{g1};{b1}m'
-                    f'\033[48;2;{r2};{g2};{b2}m'
-                    '▄'
-                )
-            # 输出该行后重置颜色
-            print(''.join(line_chars) + '\033[0m')
-    except Exception:
-        pass
+        try:
+            img = Image.open(io.BytesIO(data))
+            # 先按 JPEG 的 DCT 缩放直接解码出接近目标尺寸的小图，再做一次缩放
+            img.draft('RGB', (width, width))
+            img = img.convert('RGB')
+            # 终端中每个“▄”字符占用 1 列宽 x 2 行高，因此 rows 个字符行对应 rows*2 个像素行
+            rows = max(1, int(width * img.height / img.width * 0.5))
+            img = img.resize((width, rows * 2), Image.LANCZOS)
+            pixels = np.asarray(img, dtype=np.uint8)
+            # 每个字符 6 个数：前景色 = 上半部颜色，背景色 = 下半部颜色
+            cells = np.concatenate([pixels[0::2], pixels[1::2]], axis=2)
+            row_fmt = '\033[38;2;%d;%d;%dm\033[48;2;%d;%d;%dm▄' * width + '\033[0m\n'
+            return (row_fmt * rows) % tuple(cells.ravel().tolist())
+        except Exception:
+            return ""
+
+    def draw(self, song_id):
+        text = self.render(song_id)
+        if text:
+            sys.stdout.write(text)
+            sys.stdout.flush()
 
-def parse_full_lyrics(main_lrc, sub_lrc):
-    def lrc_to_dict(lrc):
-        d = {}
-        if not lrc: return d
-        for line in lrc.split('\n'):
-            match = re.match(r'\[(\d+):(\d+\.\d+)\](.*)', line)
-            if match:
-                t = int(match.group(1)) * 60 + float(match.group(2))
-                txt = match.group(3).strip()
-                if txt: d[t] = txt
-        return d
-
-    m_dict = lrc_to_dict(main_lrc)
-    if not m_dict and main_lrc:
-        return [{'time': 0, 'text': line, 'trans': ''} for line in main_lrc.split('\n') if line.strip()]
-
-    s_dict = lrc_to_dict(sub_lrc)
-    combined = []
-    for t in sorted(m_dict.keys()):
-        combined.append({'time': t, 'text': m_dict[t], 'trans': s_dict.get(t, "")})
-    return combined
+COVERS = CoverRenderer()
+
+def render_cover(song_id):
+    """显示封面图"""
+    COVERS.draw(song_id)
 
 def extract_translator(sub_lrc):
     if not sub_lrc:
@@ -253,46 +506,141 @@ def extract_translator(sub_lrc):
         return match.group(1)
     return "未知翻译"
 
+MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+def parse_mp3_frame_header(data, pos):
+    """解析 pos 处的 MPEG 音频帧头，无效时返回 None"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = {0: 25, 2: 2, 3: 1}.get((b1 >> 3) & 3)
+    layer = {1: 3, 2: 2, 3: 1}.get((b1 >> 1) & 3)
+    br_idx, sr_idx = b2 >> 4, (b2 >> 2) & 3
+    if version is None or layer is None or br_idx in (0, 15) or sr_idx == 3:
+        return None
+    bitrate = MP3_BITRATES[(1 if version == 1 else 2, layer)][br_idx] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sr_idx]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        spf = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        spf = 576 if (layer == 3 and version != 1) else 1152
+        length = spf // 8 * bitrate // sample_rate + padding
+    return {'version': version, 'layer': layer, 'bitrate': bitrate, 'sample_rate': sample_rate,
+            'spf': spf, 'length': length, 'mono': (b3 >> 6) == 3}
+
+def find_first_mp3_frame(data):
+    """跳过 ID3v2 标签，返回 (第一个帧的位置, 帧头)；找不到时返回 (None, None)"""
+    pos = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    # 找到第一个后面紧跟合法帧头的帧，避免把数据里的 0xFF 误判为同步字
+    limit = min(len(data) - 4, pos + 64 * 1024)
+    while pos < limit:
+        header = parse_mp3_frame_header(data, pos)
+        if header:
+            nxt = pos + header['length']
+            if nxt + 4 > len(data) or parse_mp3_frame_header(data, nxt):
+                return pos, header
+        pos += 1
+    return None, None
+
+def xing_offset(header):
+    """Xing/Info 头位于帧头和侧信息之后"""
+    if header['version'] == 1:
+        side = 17 if header['mono'] else 32
+    else:
+        side = 9 if header['mono'] else 17
+    return 4 + side
+
+def estimate_mp3_duration(data, total_size=None):
+    """直接从内存中的 MP3 字节估算时长（秒）
+
+    依次使用 Xing/Info、VBRI 帧数，最后按首帧码率估算 CBR；只需要文件开头几 KB，
+    total_size 为完整文件大小（流式下载时可先从响应头得到）。无法识别时返回 None。
+    """
+    total_size = total_size or len(data)
+    pos, header = find_first_mp3_frame(data)
+    if header is None:
+        return None
+
+    spf, sr = header['spf'], header['sample_rate']
+    xing = pos + xing_offset(header)
+    if data[xing:xing + 4] in (b'Xing', b'Info') and len(data) >= xing + 12:
+        flags = int.from_bytes(data[xing + 4:xing + 8], 'big')
+        if flags & 1:
+            frames = int.from_bytes(data[xing + 8:xing + 12], 'big')
+            if frames:
+                return frames * spf / sr
+    vbri = pos + 4 + 32
+    if data[vbri:vbri + 4] == b'VBRI' and len(data) >= vbri + 18:
+        frames = int.from_bytes(data[vbri + 14:vbri + 18], 'big')
+        if frames:
+            return frames * spf / sr
+
+    audio_bytes = total_size - pos
+    if len(data) == total_size and data[-128:-125] == b'TAG':
+        audio_bytes -= 128
+    return audio_bytes * 8 / header['bitrate'] if audio_bytes > 0 else None
+
 def get_audio_duration(audio_data):
     try:
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp:
-            tmp.write(audio_data)
-            tmp_path = tmp.name
-        try:
-            result = subprocess.run(
-                ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-                 '-of', 'default=noprint_wrappers=1:nokey=1', tmp_path],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                duration = float(result.stdout.strip())
-                os.unlink(tmp_path)
-                return duration
-        except:
-            pass
-        os.unlink(tmp_path)
-        return 240
+        duration = estimate_mp3_duration(audio_data)
+        if duration:
+            return duration
+    except Exception as e:
+        if CONFIG.get("debug_mode"):
+            print(f"解析 MP3 帧头失败: {e}")
+    # 非 MP3 或解析失败时，通过 stdin 交给 ffprobe（不落盘）
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'default=noprint_wrappers=1:nokey=1', '-i', 'pipe:0'],
+            input=audio_data,
+            capture_output=True,
+            timeout=10
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            return float(result.stdout.strip())
     except Exception as e:
         if CONFIG.get("debug_mode"):
             print(f"获取音频时长失败: {e}")
-        return 240
-
-def show_comment_ui(song_id, metadata):
+    return 240
+
+def fetch_comments(song_id, page, limit=15):
+    """第 0 页返回热门评论，之后按页返回最新评论"""
+    url = f"https://zm.armoe.cn/comment/music?id={song_id}&limit={limit}&offset={page*limit}"
+    res = network.get(url, "comment", verify=False).json()
+    return res.get('hotComments', []) if page == 0 else res.get('comments', [])
+
+def show_comment_ui(song_id, metadata, first_page=None, keys=None):
+    """first_page 为预先加载好的第 0 页评论；keys 为播放界面正在使用的 KeyEvents，不传时自己创建一个"""
+    if keys is None:
+        with KeyEvents() as keys:
+            return show_comment_ui(song_id, metadata, first_page, keys)
     page = 0
-    limit = 15
     while True:
         clear_screen()
-        render_cover('cover.jpg')
+        render_cover(song_id)
         print(f"\n🎵 歌曲: {metadata['title']} | {metadata['artist']}")
         print(f"上一页[a]     下一页[l]       返回[B] (第 {page+1} 页)")
         print("="*50)
-        url = f"https://zm.armoe.cn/comment/music?id={song_id}&limit={limit}&offset={page*limit}"
         try:
-            res = requests.get(url, timeout=5, verify=False).json()
-            comments = res.get('hotComments', []) if page == 0 else res.get('comments', [])
+            if page == 0 and first_page is not None:
+                comments = first_page
+            else:
+                comments = fetch_comments(song_id, page)
             if not comments: print("\n> 暂无更多评论。")
             for c in comments:
                 user = c.get('user', {}).get('nickname', '未知')
@@ -302,194 +650,1038 @@ def show_comment_ui(song_id, metadata):
         except Exception as e:
             handle_error(e, "评论加载失败，请检查网络。")
             return
+        keys.rearm()  # clear_screen() 会恢复终端模式
         while True:
-            k = get_key()
+            k = keys.wait()
             if k:
                 if k.lower() == 'b': return
                 if k.lower() == 'a' and page > 0: page -= 1; break
                 if k.lower() == 'l': page += 1; break
 
 class RealtimeAudioProcessor:
-    def __init__(self, raw_audio_data, engine=None):
-        self.raw_audio = io.BytesIO(raw_audio_data)
+    """流式音效处理：ffmpeg 增量解码为 PCM → 音效引擎逐块处理 → 输出原始 PCM 给 mpv"""
+    SAMPLE_RATE = 44100
+    CHANNELS = 2
+    # mpv 以原始 PCM 方式读取 stdin 时需要的参数
+    MPV_ARGS = ['--demuxer=rawaudio', '--demuxer-rawaudio-format=s16le',
+                f'--demuxer-rawaudio-rate={SAMPLE_RATE}', f'--demuxer-rawaudio-channels={CHANNELS}']
+
+    def __init__(self, raw_audio_data, engine=None, start_sec=0, index=None, chunk_size=4096, decoder=None,
+                 recorder=None, engine_lock=None, active=None):
+        self.raw_audio = raw_audio_data
         self.engine = engine
-        self.chunk_size = 4096
-        self.is_running = False
-        self.queue = []
-        self.lock = threading.Lock()
+        self.start_sec = start_sec
+        self.index = index
+        self.chunk_size = chunk_size
+        self.start_byte = 0
+        self.decoder = decoder  # 可传入预先启动的解码进程（见 spawn_decoder），省去进程启动时间
+        self.recorder = recorder  # 从头开始处理时同时写入渲染缓存（render.RenderRecorder）
+        # 多个处理器共用一个引擎时（mpv 跳转会先发起新请求再断开旧请求），每块都在锁内处理，
+        # active() 返回 False 说明已被新的处理器取代，立即停止，不再碰引擎状态
+        self.engine_lock = engine_lock or threading.Lock()
+        self.active = active
+
+    @staticmethod
+    def available():
+        return shutil.which('ffmpeg') is not None
+
+    @classmethod
+    def spawn_decoder(cls, start_sec=0):
+        cmd = ['ffmpeg', '-v', 'error']
+        if start_sec > 0:
+            cmd += ['-ss', f'{start_sec:.3f}']
+        cmd += ['-i', 'pipe:0', '-f', 'f32le', '-ac', str(cls.CHANNELS),
+                '-ar', str(cls.SAMPLE_RATE), 'pipe:1']
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL)
+
+    def _feed_decoder(self):
+        # 单独线程向 ffmpeg 写入压缩数据，避免与读取 PCM 互相阻塞
+        try:
+            for data in self.raw_audio.iter_from(self.start_byte, 65536):
+                self.decoder.stdin.write(data)
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        finally:
+            try:
+                self.decoder.stdin.close()
+            except:
+                pass
 
-    def process_stream(self):
+    def iter_chunks(self):
+        """逐块产出处理后的 s16le PCM，内存占用只与 chunk_size 有关"""
         import numpy as np
-        from scipy.io import wavfile
-        self.raw_audio.seek(0)
+        discard, ss = 0, self.start_sec
+        location = self.index.locate(self.start_sec) if (self.index and self.start_sec > 0) else None
+        if location:
+            # 从目标帧前几帧直接送入解码器，再丢弃多出的采样，做到采样级定位
+            self.start_byte, skip = location
+            discard = int(round(skip * self.SAMPLE_RATE / self.index.sample_rate))
+            ss = 0
+        if self.decoder is None or ss > 0:
+            if self.decoder:
+                self.decoder.kill()
+            self.decoder = self.spawn_decoder(ss)
+        threading.Thread(target=self._feed_decoder, daemon=True).start()
+
+        frame_bytes = 4 * self.CHANNELS
+        revision = self.engine.revision if self.engine else None
+        positioned = False
+        trim = 0  # 跳转后引擎先输出的 latency 帧属于之前的位置，丢弃
         try:
-            self.raw_audio.seek(0)
-            sr, audio_data = wavfile.read(self.raw_audio)
-            if audio_data.ndim == 1:
-                audio_data = np.stack([audio_data, audio_data], axis=1)
-            audio_data = audio_data.astype(np.float32) / 32768.0
-        except:
-            self.raw_audio.seek(0)
-            return self.raw_audio.getvalue()
-
-        output_chunks = []
-        for i in range(0, len(audio_data), self.chunk_size):
-            chunk = audio_data[i:i+self.chunk_size]
-            if self.engine:
-                processed_chunk = self.engine.process_chunk(chunk)
-            else:
-                processed_chunk = chunk
-            output_chunks.append(processed_chunk)
-
-        processed_audio = np.concatenate(output_chunks, axis=0)
-        processed_audio = np.clip(processed_audio * 32768, -32768, 32767).astype(np.int16)
-        output_buffer = io.BytesIO()
-        wavfile.write(output_buffer, sr, processed_audio)
-        output_buffer.seek(0)
-        return output_buffer.getvalue()
-
-def play_song(song_id, preload_next_song_id=None):
-    global current_player, current_song_idx, should_play_next
-    should_play_next = True
-    clear_screen()
-    print("- 正在并行获取歌曲资源...")
-
-    # -------- 并行准备阶段 --------
-    def fetch_metadata():
-        res = requests.get(f"https://api.paugram.com/netease/?id={song_id}").json()
-        sub_lrc = res.get('sub_lyric', "")
-        metadata = {
-            'title': res.get('title', '未知歌曲'),
-            'artist': res.get('artist', '未知歌手'),
-            'translator': extract_translator(sub_lrc),
-            'cover': res.get('cover')
-        }
-        lyrics = parse_full_lyrics(res.get('lyric', ""), sub_lrc)
-        audio_link = res.get('link')
-        return metadata, lyrics, audio_link
-
-    def download_cover(cover_url):
-        if cover_url:
-            img_data = requests.get(cover_url).content
-            with open('cover.jpg', 'wb') as f:
-                f.write(img_data)
-            return True
-        return False
-
-    def download_audio(audio_link):
-        return requests.get(audio_link).content
-
-    def probe_duration(audio_data):
-        return get_audio_duration(audio_data)
-
-    # 第一步：获取元数据（必须，因为需要 audio_link）
-    metadata, lyrics, audio_link = fetch_metadata()
-
-    # 第二步：并行下载封面、音频，同时探测时长（必须先拿到音频数据）
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        cover_future = executor.submit(download_cover, metadata['cover']) if metadata['cover'] else None
-        audio_future = executor.submit(download_audio, audio_link)
-        # 音频下载完成后立即开始探测时长（仍在线程池内顺序依赖）
-        audio_raw = audio_future.result()
-        duration_future = executor.submit(probe_duration, audio_raw)
-
-    # 等待剩余任务
-    cover_downloaded = cover_future.result() if cover_future else False
-    duration = duration_future.result()
-    print(f"- 音频时长: {format_time(duration)}")
+            while True:
+                raw = self.decoder.stdout.read(self.chunk_size * frame_bytes)
+                usable = len(raw) - len(raw) % frame_bytes
+                if usable <= 0:
+                    break
+                chunk = np.frombuffer(raw[:usable], dtype=np.float32).reshape(-1, self.CHANNELS)
+                if discard:
+                    cut = min(discard, len(chunk))
+                    chunk, discard = chunk[cut:], discard - cut
+                    if not len(chunk):
+                        continue
+                if self.engine:
+                    with self.engine_lock:
+                        if self.active and not self.active():
+                            return
+                        if not positioned:
+                            self.engine.seek(round(self.start_sec * self.SAMPLE_RATE))
+                            positioned = True
+                            trim = self.engine.latency
+                        chunk = self.engine.process_chunk(chunk)
+                    if trim:
+                        cut = min(trim, len(chunk))
+                        chunk, trim = chunk[cut:], trim - cut
+                        if not len(chunk):
+                            continue
+                yield self._emit(chunk)
+            if self.engine and positioned:
+                # 解码结束：取出引擎延迟线里的最后几帧，整首输出与输入等长
+                with self.engine_lock:
+                    if self.active and not self.active():
+                        return
+                    tail = self.engine.flush()[trim:]
+                if len(tail):
+                    yield self._emit(tail)
+            self._finish_recording(revision)
+        finally:
+            if self.recorder:
+                self.recorder.abort()
+            self.close()
 
-    # -------- 预加载下一首（后台线程，不影响启动）--------
-    next_audio_cache = {'data': None, 'lock': threading.Lock()}
-    preload_stop = {'flag': False}
+    def _emit(self, chunk):
+        """转成 s16le，需要时同时写入渲染缓存"""
+        import numpy as np
+        data = np.clip(chunk * 32768, -32768, 32767).astype(np.int16).tobytes()
+        if self.recorder:
+            self.recorder.write(data)
+        return data
+
+    def _finish_recording(self, revision):
+        """整首解码完且期间音效设置没有变化时才写入缓存；下载失败、解码出错时丢弃"""
+        recorder, self.recorder = self.recorder, None
+        if not recorder:
+            return
+        audio = self.raw_audio
+        complete = audio.done and not audio.error and not audio.cancelled
+        if complete and self.decoder.wait() == 0 and self.engine.revision == revision:
+            recorder.commit()
+        else:
+            recorder.abort()
 
-    def preload_next_audio():
-        if preload_next_song_id and CONFIG["enable_preload"]:
+    def close(self):
+        if self.decoder and self.decoder.poll() is None:
             try:
-                next_res = requests.get(f"https://api.paugram.com/netease/?id={preload_next_song_id}").json()
-                next_link = next_res.get('link')
-                if next_link and not preload_stop['flag']:
-                    next_audio = requests.get(next_link).content
-                    with next_audio_cache['lock']:
-                        if not preload_stop['flag']:
-                            next_audio_cache['data'] = next_audio
+                self.decoder.kill()
             except:
                 pass
 
-    preload_thread = threading.Thread(target=preload_next_audio, daemon=True)
-    preload_thread.start()
+class SeekablePlayback:
+    """单曲播放会话：一个 mpv 进程从头用到尾，送流线程按播放时钟节流，只领先 LEAD 秒
 
-    # -------- 初始化音效引擎 --------
-    engine = None
-    if CONFIG["enable_effects"] and effects:
-        print("- 正在初始化V7音效引擎...")
-        engine = effects.UltimateAudioEngine(sr=44100)
-        print("- 音效引擎已就绪，准备实时处理。")
-
-    # -------- 播放器控制函数 --------
-    def start_player(start_sec):
-        global current_player
-        if current_player and current_player.poll() is None:
-            current_player.terminate()
-            time.sleep(0.2)
-        return subprocess.Popen(
-            ['mpv', '--no-video', '--really-quiet', f'--start={int(start_sec)}', '-'],
+    跳转时不重启 mpv，只从目标帧重新启动解码器，旧数据最多再播放 LEAD 秒加 mpv 的输出缓冲；
+    播放位置按实际送出的采样数计算。没有 ffmpeg 时由 mpv 直接解码 MP3，
+    跳转时按帧索引从目标帧重新送流（此时需要重启 mpv）。
+    """
+    LEAD = 0.05
+    CHUNK_FRAMES = 1024
+    FRAME_BYTES = 2 * RealtimeAudioProcessor.CHANNELS
+
+    def __init__(self, audio, engine=None, index=None, song_id=None, cached=None):
+        self.audio = audio
+        self.engine = engine
+        self.index = index
+        self.song_id = song_id
+        self.cached = cached     # 渲染缓存命中时的 CachedPcmSource，直接送出已处理的 PCM
+        self.pcm = cached is not None or RealtimeAudioProcessor.available()
+        self.cond = threading.Condition()
+        self.player = None
+        self.generation = 0
+        self.origin = 0.0        # 当前送流段对应的歌曲位置（秒）
+        self.fed = 0             # 当前段已写入 mpv 的采样帧数
+        self.clock_start = None  # 当前段开始计时的时刻
+        self.paused_at = None
+        self.direct_offset = 0
+        self.seek_at = None
+        self.last_seek_ms = None
+        self.standby = None      # 备用解码进程，跳转时直接接管
+        self.on_end = None       # mpv 进程退出时回调（用于唤醒播放界面）
+        self.stopped = False
+
+    def _spawn(self, start_sec=0):
+        args = ['mpv', '--no-video', '--really-quiet']
+        if self.pcm:
+            args += ['--audio-buffer=0.05'] + RealtimeAudioProcessor.MPV_ARGS
+        elif start_sec > 0:
+            args.append(f'--start={start_sec:.3f}')
+        proc = subprocess.Popen(
+            args + ['-'],
             stdin=subprocess.PIPE,
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
             start_new_session=True  # 脱离终端会话，防止熄屏暂停
         )
+        threading.Thread(target=self._watch, args=(proc,), daemon=True).start()
+        return proc
+
+    def _watch(self, proc):
+        proc.wait()
+        if self.on_end:
+            self.on_end()
+
+    def _locate_direct(self, sec):
+        """无 ffmpeg 时：返回 (送流起始字节, 交给 mpv --start 的秒数)"""
+        location = self.index.locate(sec) if (self.index and sec > 0) else None
+        if location:
+            return location[0], location[1] / self.index.sample_rate
+        return 0, sec
+
+    def start(self, start_sec=0):
+        with self.cond:
+            self.origin = start_sec
+            if self.pcm:
+                self.player = self._spawn()
+            else:
+                self.direct_offset, mpv_start = self._locate_direct(start_sec)
+                self.player = self._spawn(mpv_start)
+                self.clock_start = time.time()
+        threading.Thread(target=self._feed, daemon=True).start()
+
+    def seek(self, sec):
+        old = None
+        if not self.pcm:
+            offset, mpv_start = self._locate_direct(sec)
+        with self.cond:
+            self.generation += 1
+            self.origin, self.fed = sec, 0
+            self.seek_at = time.time()
+            if self.pcm:
+                self.clock_start = None
+            else:
+                old, self.direct_offset = self.player, offset
+                self.player = self._spawn(mpv_start)
+                self.clock_start = time.time()
+            if self.paused_at is not None:
+                self.paused_at = time.time()
+                if not self.pcm:
+                    # 新启动的 mpv 也要保持暂停，否则界面显示暂停时仍在出声
+                    self._signal(subprocess.signal.SIGSTOP if SYSTEM != "Windows" else 19)
+            self.cond.notify_all()
+        if old:
+            try:
+                old.kill()
+            except:
+                pass
+
+    def _ahead(self):
+        if self.clock_start is None:
+            return 0.0
+        now = self.paused_at or time.time()
+        return self.fed / RealtimeAudioProcessor.SAMPLE_RATE - (now - self.clock_start)
+
+    def position(self):
+        with self.cond:
+            if self.clock_start is None:
+                return self.origin
+            played = (self.paused_at or time.time()) - self.clock_start
+            if self.pcm:
+                played = min(played, self.fed / RealtimeAudioProcessor.SAMPLE_RATE)
+            return self.origin + max(0.0, played)
+
+    def pause(self):
+        with self.cond:
+            if self.paused_at is None:
+                self.paused_at = time.time()
+                self._signal(subprocess.signal.SIGSTOP if SYSTEM != "Windows" else 19)
+
+    def resume(self):
+        with self.cond:
+            if self.paused_at is not None:
+                if self.clock_start is not None:
+                    self.clock_start += time.time() - self.paused_at
+                self.paused_at = None
+                self._signal(subprocess.signal.SIGCONT if SYSTEM != "Windows" else 18)
+                self.cond.notify_all()
+
+    def _signal(self, sig):
+        try:
+            self.player.send_signal(sig)
+        except:
+            pass
 
-    def feed_audio_with_effects(player, audio_data, engine_ref):
+    def _open_segment(self, start_sec):
+        if self.cached:
+            return self.cached.iter_pcm(start_sec, self.CHUNK_FRAMES)
+        if self.pcm:
+            decoder, self.standby = self.standby, None
+            processor = RealtimeAudioProcessor(self.audio, self.engine, start_sec, self.index,
+                                               self.CHUNK_FRAMES, decoder,
+                                               start_render_recording(self.song_id, self.engine, start_sec))
+            return processor.iter_chunks()
+        return self.audio.iter_from(self.direct_offset, 8192)
+
+    def _prepare_standby(self):
+        if self.pcm and not self.cached and self.standby is None and not self.stopped:
+            self.standby = RealtimeAudioProcessor.spawn_decoder()
+
+    def _feed(self):
+        gen, chunks = None, None
         try:
-            audio_buffer = io.BytesIO(audio_data)
-            if engine_ref['engine']:
-                processor = RealtimeAudioProcessor(audio_data, engine_ref['engine'])
-                processed_data = processor.process_stream()
-                audio_buffer = io.BytesIO(processed_data)
-            audio_buffer.seek(0)
             while True:
-                chunk = audio_buffer.read(8192)
-                if not chunk:
-                    break
+                with self.cond:
+                    # 暂停时或已领先播放时钟 LEAD 秒时等待，跳转/停止会立即唤醒
+                    while not self.stopped and gen == self.generation and self.pcm:
+                        if self.paused_at is not None:
+                            self.cond.wait()
+                            continue
+                        wait = self._ahead() - self.LEAD
+                        if wait <= 0:
+                            break
+                        self.cond.wait(wait)
+                    if self.stopped:
+                        return
+                    new_segment = gen != self.generation
+                    gen, start_sec = self.generation, self.origin
+                if new_segment:
+                    if chunks:
+                        chunks.close()
+                    chunks = self._open_segment(start_sec)
+                chunk = next(chunks, None)
+                if new_segment:
+                    # 新段已出声后再准备下一次跳转用的解码进程
+                    self._prepare_standby()
+                with self.cond:
+                    if gen != self.generation:
+                        continue
+                    player = self.player
+                if chunk is None:
+                    # 本段送完，关闭 stdin 让 mpv 播完剩余数据后退出；之后仍可能跳转（无 ffmpeg 时会换新的 mpv）
+                    try:
+                        player.stdin.close()
+                    except:
+                        pass
+                    with self.cond:
+                        while not self.stopped and gen == self.generation:
+                            self.cond.wait()
+                    continue
                 try:
                     player.stdin.write(chunk)
                     player.stdin.flush()
                 except:
-                    break
+                    with self.cond:
+                        if gen != self.generation:
+                            continue
+                    return
+                with self.cond:
+                    if gen == self.generation:
+                        if self.clock_start is None:
+                            self.clock_start = time.time()
+                        if self.seek_at is not None:
+                            self.last_seek_ms = (time.time() - self.seek_at) * 1000
+                            self.seek_at = None
+                        self.fed += len(chunk) // self.FRAME_BYTES
+        except Exception as e:
+            if CONFIG.get("debug_mode"):
+                print(f"音频送流错误: {e}")
+        finally:
+            if chunks:
+                chunks.close()
+            if self.standby:
+                self.standby.kill()
+                self.standby = None
+
+    # 与 subprocess.Popen 相同的接口，供 cleanup() 和播放循环使用
+    def poll(self):
+        return self.player.poll() if self.player else None
+
+    def terminate(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+            player = self.player
+        if player and player.poll() is None:
             try:
-                player.stdin.close()
+                if self.paused_at is not None:
+                    player.send_signal(subprocess.signal.SIGCONT if SYSTEM != "Windows" else 18)
+                player.terminate()
             except:
                 pass
+
+
+class WavPcmSource:
+    """把音效处理后的 PCM 包装成 WAV，经本地 HTTP 桥交给常驻 mpv
+
+    mpv 跳转时会带 Range 重新请求，这里把字节偏移换算成采样位置，再按帧索引从目标处重新解码。
+    """
+    HEADER_SIZE = 44
+    FRAME_BYTES = 2 * RealtimeAudioProcessor.CHANNELS
+    content_type = "audio/wav"
+
+    def __init__(self, audio, engine=None, index=None, duration=0, song_id=None):
+        self.audio = audio
+        self.engine = engine
+        self.index = index
+        self.song_id = song_id
+        self.data_size = int(duration * RealtimeAudioProcessor.SAMPLE_RATE) * self.FRAME_BYTES
+        self.standby = None  # 备用解码进程，下一次请求直接接管
+        self.lock = threading.Lock()
+        self.engine_lock = threading.Lock()
+        self.generation = 0  # 每个请求加一，只有最新的请求继续使用引擎
+        self.closed = False
+
+    def length(self):
+        return self.HEADER_SIZE + self.data_size
+
+    def header(self):
+        return wav_header(self.data_size)
+
+    def _take_decoder(self):
+        with self.lock:
+            decoder, self.standby = self.standby, None
+            return decoder
+
+    def _prepare_standby(self):
+        with self.lock:
+            if self.standby is None and not self.closed:
+                self.standby = RealtimeAudioProcessor.spawn_decoder()
+
+    def open(self, start):
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        if start < self.HEADER_SIZE:
+            yield self.header()[start:]
+            start = self.HEADER_SIZE
+        frame, cut = divmod(start - self.HEADER_SIZE, self.FRAME_BYTES)
+        remaining = self.length() - start
+        start_sec = frame / RealtimeAudioProcessor.SAMPLE_RATE
+        processor = RealtimeAudioProcessor(self.audio, self.engine, start_sec, self.index,
+                                           decoder=self._take_decoder(),
+                                           recorder=start_render_recording(self.song_id, self.engine, start_sec),
+                                           engine_lock=self.engine_lock,
+                                           active=lambda: self.generation == generation)
+        chunks = processor.iter_chunks()
+        try:
+            for i, chunk in enumerate(chunks):
+                if i == 0:
+                    self._prepare_standby()
+                chunk = chunk[cut:remaining + cut]
+                cut = 0
+                remaining -= len(chunk)
+                yield chunk
+                if remaining <= 0:
+                    if processor.recorder:
+                        # 按估算时长截断的尾部仍要处理完，缓存里保存的是完整的一首
+                        for _ in chunks:
+                            pass
+                    break
+        finally:
+            chunks.close()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            if self.standby:
+                self.standby.kill()
+                self.standby = None
+
+def wav_header(data_size):
+    """44 字节的 16 位 PCM WAV 头"""
+    sr, ch = RealtimeAudioProcessor.SAMPLE_RATE, RealtimeAudioProcessor.CHANNELS
+    frame_bytes = 2 * ch
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1,
+                       ch, sr, sr * frame_bytes, frame_bytes, 16, b'data', data_size)
+
+def start_render_recording(song_id, engine, start_sec):
+    """从头开始的有音效播放同时录入渲染缓存，返回 recorder；其他情况返回 None"""
+    if RENDER_CACHE is None or song_id is None or engine is None or start_sec > 0:
+        return None
+    return RENDER_CACHE.recorder(song_id, engine.settings)
+
+class CachedPcmSource:
+    """渲染缓存命中时的音频源：读取已处理好的 s16le PCM，不再解码和运行音效引擎
+
+    经本地 HTTP 桥时包装成 WAV（支持 Range），给 SeekablePlayback 时按秒数直接取原始 PCM。
+    """
+    HEADER_SIZE = WavPcmSource.HEADER_SIZE
+    FRAME_BYTES = WavPcmSource.FRAME_BYTES
+    content_type = "audio/wav"
+
+    def __init__(self, path):
+        self.path = path
+        self.data_size = os.path.getsize(path)
+
+    @property
+    def duration(self):
+        return self.data_size / self.FRAME_BYTES / RealtimeAudioProcessor.SAMPLE_RATE
+
+    def length(self):
+        return self.HEADER_SIZE + self.data_size
+
+    def _read_from(self, offset, n):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                data = f.read(n)
+                if not data:
+                    return
+                yield data
+
+    def open(self, start):
+        if start < self.HEADER_SIZE:
+            yield wav_header(self.data_size)[start:]
+            start = self.HEADER_SIZE
+        yield from self._read_from(start - self.HEADER_SIZE, 65536)
+
+    def iter_pcm(self, start_sec, chunk_frames):
+        frame = int(start_sec * RealtimeAudioProcessor.SAMPLE_RATE)
+        return self._read_from(frame * self.FRAME_BYTES, chunk_frames * self.FRAME_BYTES)
+
+    def close(self):
+        pass
+
+class MpvSessionPlayback:
+    """在常驻 mpv 会话里播放单曲，接口与 SeekablePlayback 相同
+
+    音频经本地 HTTP 桥提供：无音效时直接给 MP3，有音效时给处理后的 WAV；
+    跳转和暂停走 IPC，进度取自 mpv 实际播放的 time-pos，不再用墙上时钟推算。
+    """
+    def __init__(self, session, audio, engine=None, index=None, duration=0, song_id=None, cached=None):
+        self.session = session
+        if cached:
+            self.source = cached
+            self.suffix = ".wav"
+        elif engine:
+            self.source = WavPcmSource(audio, engine, index, duration, song_id)
+            self.suffix = ".wav"
+        else:
+            self.source = audio
+            self.suffix = ".mp3"
+        self.url = None
+        self.on_end = None
+
+    def _notify_end(self):
+        if self.on_end:
+            self.on_end()
+
+    @property
+    def last_seek_ms(self):
+        return self.session.last_seek_ms
+
+    def start(self, start_sec=0):
+        self.url = network.LOCAL_SERVER.register(self.source, self.suffix)
+        self.session.on_track_end = self._notify_end
+        self.session.loadfile(self.url, start_sec)
+
+    def seek(self, sec):
+        self.session.seek(sec)
+
+    def pause(self):
+        self.session.set_pause(True)
+
+    def resume(self):
+        self.session.set_pause(False)
+
+    def position(self):
+        return self.session.position()
+
+    def poll(self):
+        return 0 if self.session.ended() else None
+
+    def terminate(self):
+        self.session.on_track_end = None
+        try:
+            if not self.session.ended():
+                self.session.stop()
+        except player.MpvError:
+            pass
+        if self.url:
+            network.LOCAL_SERVER.unregister(self.url)
+        if isinstance(self.source, (WavPcmSource, CachedPcmSource)):
+            self.source.close()
+
+def get_mpv_session():
+    """返回整个会话共用的 mpv IPC 播放器；平台或 mpv 不支持时返回 None（改用 SeekablePlayback）"""
+    global mpv_session
+    if SYSTEM == "Windows" or not shutil.which('mpv'):
+        return None
+    if mpv_session and mpv_session.alive():
+        return mpv_session
+    if mpv_session:
+        mpv_session.close()
+    try:
+        mpv_session = player.MpvIpcPlayer().start()
+    except player.MpvError as e:
+        mpv_session = None
+        if CONFIG.get("debug_mode"):
+            print(f"mpv IPC 启动失败: {e}")
+    return mpv_session
+
+def fetch_song_metadata(song_id):
+    """返回 (metadata, res)，res 为接口原始数据（含歌词文本和播放链接）"""
+    try:
+        res = network.get(f"https://api.paugram.com/netease/?id={song_id}", "metadata").json()
+    except Exception:
+        # 离线时使用音频缓存里保存的元数据
+        res = AUDIO_CACHE.get_meta(song_id)
+        if res is None:
+            raise
+    metadata = {
+        'title': res.get('title', '未知歌曲'),
+        'artist': res.get('artist', '未知歌手'),
+        'translator': extract_translator(res.get('sub_lyric', "")),
+        'cover': res.get('cover')
+    }
+    return metadata, res
+
+def read_stream_head(audio):
+    """返回流开头足以定位第一帧的字节（必要时等待超长 ID3 标签下载完）"""
+    head = audio.head(256 * 1024)
+    if head[:3] == b'ID3' and len(head) >= 10 and not audio.done:
+        # ID3 标签（常含封面图）可能比预缓冲更大，需要等到第一帧到达
+        tag = (head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | (head[9] & 0x7F)
+        audio.wait_for(tag + 16 * 1024)
+        head = audio.head(tag + 16 * 1024)
+    return head
+
+def probe_stream_duration(audio):
+    """用已到达的开头部分估算时长，估算不出时再等待完整数据"""
+    head = read_stream_head(audio)
+    if audio.total:
+        try:
+            duration = estimate_mp3_duration(head, audio.total)
+            if duration:
+                return duration
+        except Exception:
+            pass
+    return get_audio_duration(audio.getvalue())
+
+class Mp3FrameIndex:
+    """MP3 帧索引：按需扫描边下边播缓冲区，记录每个音频帧的字节偏移，把秒数换算为解码起点
+
+    从文件头解码时 ffmpeg 会丢弃 LAME 标签记录的编码延迟（+529 解码延迟），从中间某帧解码则不会，
+    所以统一换算到"原始帧时间轴"上：目标采样 = 秒数 × 采样率 + skip。
+    """
+    PREROLL_BYTES = 1536  # 比特池最多回溯 511 字节，再多解一帧让 IMDCT 重叠部分也正确
+
+    def __init__(self, audio, first, header, skip):
+        self.audio = audio
+        self.offsets = [first]
+        self.spf = header['spf']
+        self.sample_rate = header['sample_rate']
+        self.skip = skip
+        self.complete = False
+
+    @classmethod
+    def build(cls, audio):
+        """不是 MP3 时返回 None"""
+        head = read_stream_head(audio)
+        pos, header = find_first_mp3_frame(head)
+        if header is None:
+            return None
+        first, skip = pos, 0
+        xing = pos + xing_offset(header)
+        if head[xing:xing + 4] in (b'Xing', b'Info'):
+            # 信息帧本身不含音频；按标志位跳过各字段后是 LAME 标签，其中记录了编码延迟
+            flags = int.from_bytes(head[xing + 4:xing + 8], 'big')
+            lame = xing + 8 + 4 * bool(flags & 1) + 4 * bool(flags & 2) + 100 * bool(flags & 4) + 4 * bool(flags & 8)
+            if len(head) >= lame + 24:
+                skip = (int.from_bytes(head[lame + 21:lame + 24], 'big') >> 12) + 529
+            first = pos + header['length']
+        elif head[pos + 36:pos + 40] == b'VBRI':
+            first = pos + header['length']
+        if parse_mp3_frame_header(head, first) is None and first + 4 <= len(head):
+            return None
+        return cls(audio, first, header, skip)
+
+    def _scan_to(self, n):
+        """扫描直到已知第 n 帧的位置或文件结束"""
+        while len(self.offsets) <= n and not self.complete:
+            pos = self.offsets[-1]
+            self.audio.wait_for(pos + 8 * 1024)
+            data = self.audio.read(pos, 64 * 1024)
+            p, appended = 0, False
+            while True:
+                header = parse_mp3_frame_header(data, p)
+                if header is None:
+                    break
+                nxt = p + header['length']
+                if nxt + 4 > len(data) or parse_mp3_frame_header(data, nxt) is None:
+                    break
+                self.offsets.append(pos + nxt)
+                p, appended = nxt, True
+            if not appended:
+                # 文件结束或失去同步（如 ID3v1 尾标签）
+                self.complete = True
+
+    def locate(self, sec):
+        """返回 (解码起始字节, 解码后需丢弃的采样数)，位置超出文件时返回 None"""
+        target = int(round(sec * self.sample_rate)) + self.skip
+        k = target // self.spf
+        self._scan_to(k)
+        if k >= len(self.offsets):
+            return None
+        j = k
+        while j > 0 and (k - j < 2 or self.offsets[k] - self.offsets[j] < self.PREROLL_BYTES):
+            j -= 1
+        return self.offsets[j], target - j * self.spf
+
+class SongLoad:
+    """一首歌的资源加载图，在后台线程的 asyncio 事件循环里按依赖并发执行：
+
+        metadata ─┬─ lyrics
+                  ├─ cover
+                  └─ audio ── duration
+        comments（只依赖歌曲 ID，不阻塞播放）
+
+    网络请求仍是阻塞的 requests，交给 asyncio.to_thread；cancel() 会取消所有未完成的阶段并停止音频下载。
+    每个阶段的耗时记录在 timings（毫秒），供 Debug 模式显示。
+    """
+    STAGE_NAMES = {'metadata': '元数据', 'lyrics': '歌词', 'cover': '封面', 'audio': '音频',
+                   'duration': '时长', 'comments': '评论'}
+
+    def __init__(self, song_id):
+        self.song_id = song_id
+        self.timings = {}
+        self.resources = None
+        self.comments = None
+        self.error = None
+        self.audio = None
+        self.cancelled = False
+        self.ready = threading.Event()  # 可以开始播放（或失败/取消）
+        self.callbacks = []
+        self.lock = threading.Lock()
+        self.loop = None
+        self.task = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            with self.lock:
+                self.loop = loop
+                self.task = loop.create_task(self._load())
+                if self.cancelled:
+                    self.task.cancel()
+            loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
         except Exception as e:
-            if CONFIG.get("debug_mode"):
-                print(f"音频送流错误: {e}")
+            self.error = e
+        finally:
+            self._set_ready()
+            loop.close()
+
+    def _set_ready(self):
+        with self.lock:
+            if self.ready.is_set():
+                return
+            self.ready.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_done_callback(self, callback):
+        """资源就绪（或失败/取消）时调用 callback；已就绪时立即调用"""
+        with self.lock:
+            if not self.ready.is_set():
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def remove_done_callback(self, callback):
+        with self.lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+    async def _stage(self, name, func, *args):
+        start = time.perf_counter()
+        try:
+            return await asyncio.to_thread(func, *args)
+        finally:
+            self.timings[name] = (time.perf_counter() - start) * 1000
+
+    def _open_audio(self, audio_link, raw):
+        data, _ = AUDIO_CACHE.get(self.song_id, audio_link)
+        if data is not None:
+            audio = network.StreamBuffer.from_bytes(data)
+        else:
+            # 下载完成后写入音频缓存
+            song_id = self.song_id
+            audio = network.StreamBuffer(audio_link, "audio",
+                                         on_complete=lambda full: AUDIO_CACHE.put(song_id, audio_link, full, raw))
+        self.audio = audio
+        if self.cancelled:
+            audio.cancel()
+        # 音频达到预缓冲量即可开始播放
+        audio.wait_for(CONFIG["prebuffer_kb"] * 1024)
+        if audio.error and not audio.size:
+            raise audio.error
+        return audio
+
+    @staticmethod
+    def _download_cover(cover_url):
+        return network.get(cover_url, "cover").content if cover_url else None
+
+    async def _load(self):
+        comments = asyncio.create_task(self._stage('comments', fetch_comments, self.song_id, 0))
+        children = [comments]
+        try:
+            metadata, res = await self._stage('metadata', fetch_song_metadata, self.song_id)
+            raw = {k: v for k, v in res.items() if k != 'link'}
+            lyrics = asyncio.create_task(self._stage('lyrics', lrc.parse_lyrics,
+                                                     res.get('lyric', ""), res.get('sub_lyric', "")))
+            cover = asyncio.create_task(self._stage('cover', self._download_cover, metadata['cover']))
+            children += [lyrics, cover]
+            audio = await self._stage('audio', self._open_audio, res.get('link'), raw)
+            duration = await self._stage('duration', probe_stream_duration, audio)
+            self.resources = {'song_id': self.song_id, 'metadata': metadata, 'lyrics': await lyrics,
+                              'audio': audio, 'cover': await cover, 'duration': duration, 'load': self}
+        except BaseException:
+            # 失败或被取消时一并取消其余分支，等它们结束后再关闭事件循环
+            for task in children:
+                task.cancel()
+            await asyncio.gather(*children, return_exceptions=True)
+            raise
+        self._set_ready()
+        # 评论不影响开始播放，继续在后台加载
+        try:
+            self.comments = await comments
+        except Exception:
+            pass
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    def result(self):
+        """等待加载完成并返回资源字典；失败时抛出原异常"""
+        self.ready.wait()
+        if self.resources is None:
+            raise self.error or RuntimeError("资源加载已取消")
+        return self.resources
+
+    def cancel(self):
+        """取消未完成的阶段；已开始的音频下载会被停止"""
+        with self.lock:
+            self.cancelled = True
+            if self.loop and self.task and not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self.task.cancel)
+        if self.audio:
+            self.audio.cancel()
+
+    def timing_summary(self):
+        return " | ".join(f"{self.STAGE_NAMES[name]} {ms:.0f}ms" for name, ms in self.timings.items())
+
+class Prefetcher:
+    """后台预加载接下来要播放的歌曲，play_song 直接取用已开始的加载"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loads = {}
+
+    def schedule(self, song_ids):
+        """预加载 song_ids 中的歌曲，取消不再需要的旧加载"""
+        wanted = [sid for sid in song_ids if sid is not None]
+        with self.lock:
+            for sid in list(self.loads):
+                if sid not in wanted:
+                    self.loads.pop(sid).cancel()
+            for sid in wanted:
+                if sid not in self.loads:
+                    self.loads[sid] = SongLoad(sid)
+
+    def take(self, song_id):
+        """取出预加载（可能仍在进行中），没有时返回 None"""
+        with self.lock:
+            return self.loads.pop(song_id, None)
+
+    def clear(self):
+        with self.lock:
+            for load in self.loads.values():
+                # 不再需要的预加载停止下载，避免连接和线程一直挂着
+                load.cancel()
+            self.loads.clear()
+
+PREFETCHER = Prefetcher()
+
+class PlaybackScheduler:
+    """播放队列：持有当前歌单、播放序号、随机队列与播放历史，逐首循环播放（不递归）"""
+    HISTORY_LIMIT = 200
+
+    def __init__(self):
+        self.playlist = []
+        self.index = 0
+        self.random_queue = []  # 随机播放时预先决定好的后续歌曲序号
+        self.history = deque(maxlen=self.HISTORY_LIMIT)
+        self.last_transition_ms = None
+
+    def upcoming_indices(self):
+        """按当前播放模式推算接下来要播放的歌曲序号（预加载深度由 preload_depth 决定）"""
+        total = len(self.playlist)
+        if total <= 1:
+            return []
+        depth = max(1, CONFIG["preload_depth"])
+        if CONFIG['play_mode'] == '单曲循环':
+            # 下一首还是正在播放的这首，重播时音频由 AUDIO_CACHE 提供，不再预加载第二份
+            return []
+        if CONFIG['play_mode'] == '随机播放':
+            while len(self.random_queue) < depth:
+                self.random_queue.append(random.randint(0, total - 1))
+            return self.random_queue[:depth]
+        return [(self.index + i) % total for i in range(1, min(depth, total - 1) + 1)]
+
+    def upcoming_ids(self):
+        return [self.playlist[i]['id'] for i in self.upcoming_indices()]
+
+    def prefetch(self):
+        """按当前播放模式预加载后续歌曲（关闭预加载时取消已有的），不再需要的旧预加载随之取消"""
+        if CONFIG["enable_preload"]:
+            PREFETCHER.schedule(self.upcoming_ids())
+        else:
+            PREFETCHER.clear()
+
+    def set_mode(self, mode):
+        """切换播放模式：离开随机播放时丢掉预先抽好的随机序号，再按新模式重新预加载"""
+        if CONFIG["play_mode"] == '随机播放' and mode != '随机播放':
+            self.random_queue.clear()
+        CONFIG["play_mode"] = mode
+        self.prefetch()
+
+    def next_index(self):
+        """歌曲正常结束后下一首的序号，随机播放时取预先决定的那一首"""
+        if CONFIG['play_mode'] == '单曲循环':
+            return self.index
+        if CONFIG['play_mode'] == '随机播放':
+            if self.random_queue:
+                return self.random_queue.pop(0)
+            return random.randint(0, len(self.playlist) - 1)
+        return (self.index + 1) % len(self.playlist)
+
+    def play(self, playlist, index):
+        """从 playlist[index] 开始播放，直到用户返回或单曲列表播放结束"""
+        self.playlist = playlist
+        self.index = index
+        self.random_queue.clear()
+        track_end_at = None
+        while True:
+            song_id = self.playlist[self.index]['id']
+            self.history.append(song_id)
+            # play_song 返回后，上一首的音频、封面等资源随其栈帧一起释放
+            outcome = play_song(song_id, track_end_at)
+            track_end_at = time.time()
+            total = len(self.playlist)
+            if outcome == 'back' or total <= 1:
+                break
+            if outcome == 'prev':
+                self.index = (self.index - 1) % total
+            elif outcome == 'next':
+                self.index = (self.index + 1) % total
+            else:
+                self.index = self.next_index()
+
+SCHEDULER = PlaybackScheduler()
+
+def play_song(song_id, track_end_at=None):
+    """播放单首歌曲，返回结束方式：'ended' 播放完毕，'prev'/'next' 手动切歌，'back' 返回"""
+    global current_player
+    clear_screen()
+    print("- 正在并行获取歌曲资源... (上一首[A]  下一首[L]  返回[B])")
+
+    # -------- 并行准备阶段（优先使用预加载）；加载中也可以切歌或返回 --------
+    load = PREFETCHER.take(song_id) or SongLoad(song_id)
+    with KeyEvents() as keys:
+        load.add_done_callback(keys.wake)
+        try:
+            while not load.wait(0):
+                k = (keys.wait() or '').lower()
+                skip = {'a': 'prev', 'l': 'next', 'b': 'back'}.get(k)
+                if skip and (k == 'b' or len(SCHEDULER.playlist) > 1):
+                    load.cancel()
+                    if skip == 'back':
+                        PREFETCHER.clear()
+                    return skip
+        finally:
+            load.remove_done_callback(keys.wake)
+    resources = load.result()
+    metadata, lyrics = resources['metadata'], resources['lyrics']
+    _playlist_store_call(PLAYLISTS.record_play, song_id, metadata['title'], metadata['artist'])
+    audio_raw, duration = resources['audio'], resources['duration']
+    COVERS.add(song_id, resources['cover'])
+    print(f"- 音频时长: {format_time(duration)}")
+
+    # -------- 预加载后续歌曲（后台线程，不影响启动）--------
+    SCHEDULER.prefetch()
+
+    # -------- 初始化音效引擎（同一首歌、同样设置处理过的结果直接取渲染缓存）--------
+    engine = None
+    cached = None
+    if CONFIG["enable_effects"] and effects:
+        settings = effects.saved_settings()
+        path = RENDER_CACHE.get(song_id, settings)
+        if path:
+            cached = CachedPcmSource(path)
+        if cached or RealtimeAudioProcessor.available():
+            print("- 正在初始化V7音效引擎...")
+            engine = effects.UltimateAudioEngine(sr=RealtimeAudioProcessor.SAMPLE_RATE)
+            engine.update_settings(settings)
+            if cached:
+                print("- 命中渲染缓存，直接播放已处理的音频。")
+            else:
+                print("- 音效引擎已就绪，准备实时处理。")
+        else:
+            print("- 未找到 ffmpeg，本次播放跳过音效处理。")
+    cached_revision = engine.revision if engine else None
 
     # -------- 启动播放 --------
     elapsed = 0
-    current_player = start_player(elapsed)
-    engine_ref = {'engine': engine}
+    index = Mp3FrameIndex.build(audio_raw)
+    session = get_mpv_session()
 
-    audio_thread = threading.Thread(
-        target=feed_audio_with_effects,
-        args=(current_player, audio_raw, engine_ref),
-        daemon=True
-    )
-    audio_thread.start()
+    def open_player(cached):
+        if session:
+            return MpvSessionPlayback(session, audio_raw, engine, index, duration, song_id, cached)
+        return SeekablePlayback(audio_raw, engine, index, song_id, cached)
 
-    start_time = time.time()
-    l_idx, is_paused, pause_at = 0, False, 0
-    lyric_history = []
-    need_refresh = True
+    current_player = open_player(cached)
+    current_player.start(elapsed)
+    if track_end_at is not None:
+        # 上一首结束到本首开始送流的间隔
+        SCHEDULER.last_transition_ms = (time.time() - track_end_at) * 1000
+
+    is_paused = False
+    outcome = 'ended'
+    renderer = lrc.LyricRenderer(lyrics)
 
     # ---------- 工具函数 ----------
-    def get_term_width():
+    def get_term_size():
         try:
-            return os.get_terminal_size().columns
+            return os.get_terminal_size()
         except:
-            return 80
+            return os.terminal_size((80, 24))
+
+    term_width, term_lines = get_term_size()
 
     def build_bar(sec, dur):
-        w = get_term_width()
+        w = term_width
         bar_len = max(5, w - 35)
         bar_len = min(30, bar_len)
         percent = min(sec / dur, 1.0) if dur > 0 else 0
@@ -497,260 +1689,297 @@ def play_song(song_id, preload_next_song_id=None):
         bar = "█" * filled + "░" * (bar_len - filled)
         return f"进度: [{bar}] {format_time(sec)} / {format_time(dur)}"
 
-    def build_lyric_line(lyric_item):
-        line = f"    {lyric_item['text']}"
-        if lyric_item['trans']:
-            line += f"\n    {lyric_item['trans']}"
-        return line
-
-    def store_lyric(lyric_item):
-        lyric_history.append(build_lyric_line(lyric_item))
-
-    def rebuild_history_until(target_time):
-        nonlocal l_idx
-        lyric_history.clear()
-        l_idx = 0
-        while l_idx < len(lyrics) and lyrics[l_idx]['time'] < target_time:
-            store_lyric(lyrics[l_idx])
-            l_idx += 1
-
-    def write_lyric(lyric_str):
-        sys.stdout.write(lyric_str.replace('\n', '\r\n') + "\r\n\r\n")
+    def draw_screen():
+        """整屏重绘：封面取缓存，歌词只补屏幕放得下的最后几行，整屏内容拼好后一次写出"""
+        nonlocal last_bar
+        clear_screen()
+        lines = [COVERS.render(song_id, min(COVERS.MAX_WIDTH, term_width)),
+                 f"\n🎵 歌曲: {metadata['title']}\n",
+                 f"👤 歌手: {metadata['artist']}\n",
+                 f"✍️ 歌词翻译: {metadata['translator']}\n",
+                 f"⚙️  当前歌曲模式：{CONFIG['play_mode']}\n"]
+        if CONFIG.get("debug_mode") and SCHEDULER.last_transition_ms is not None:
+            lines.append(f"⏱️  切歌耗时: {SCHEDULER.last_transition_ms:.0f} ms\n")
+        if CONFIG.get("debug_mode") and current_player.last_seek_ms is not None:
+            lines.append(f"⏱️  跳转耗时: {current_player.last_seek_ms:.0f} ms\n")
+        if CONFIG.get("debug_mode"):
+            lines.append(f"⏱️  加载耗时: {load.timing_summary()}\n")
+        if CONFIG.get("debug_mode") and engine and not cached:
+            limiter = engine.limiter
+            lines.append(f"🎚️  限幅器: 当前衰减 {limiter.reduction_db:.1f} dB, 最大 {limiter.peak_reduction_db:.1f} dB "
+                         f"(上限 {limiter.ceiling_db:.1f} dBFS)\n")
+        lines.append("\n暂停[K]  模式[G]  评论[C]  音效[E]  跳转[J]  上一首[A]  下一首[L]  返回[B]\n")
+        lines.append("=" * 50 + "\n")
+        last_bar = build_bar(elapsed, duration)
+        lines.append(renderer.history(max_rows=term_lines) + last_bar)
+        sys.stdout.write("".join(lines))
+        sys.stdout.flush()
 
     # 初始绘制
-    clear_screen()
-    if cover_downloaded:
-        render_cover('cover.jpg')
-    print(f"\n🎵 歌曲: {metadata['title']}")
-    print(f"👤 歌手: {metadata['artist']}")
-    print(f"✍️ 歌词翻译: {metadata['translator']}")
-    print(f"⚙️  当前歌曲模式：{CONFIG['play_mode']}")
-    print("\n暂停[K]  模式[G]  评论[C]  音效[E]  跳转[J]  上一首[A]  下一首[L]  返回[B]")
-    print("=" * 50)
-
-    for stored in lyric_history:
-        write_lyric(stored)
-    bar = build_bar(elapsed, duration)
-    sys.stdout.write(bar)
-    sys.stdout.flush()
+    last_bar = None
+    draw_screen()
     need_refresh = False
 
-    # 主循环
-    while current_player.poll() is None:
-        if need_refresh:
-            clear_screen()
-            if cover_downloaded:
-                render_cover('cover.jpg')
-            print(f"\n🎵 歌曲: {metadata['title']}")
-            print(f"👤 歌手: {metadata['artist']}")
-            print(f"✍️ 歌词翻译: {metadata['translator']}")
-            print(f"⚙️  当前歌曲模式：{CONFIG['play_mode']}")
-            print("\n暂停[K]  模式[G]  评论[C]  音效[E]  跳转[J]  上一首[A]  下一首[L]  返回[B]")
-            print("=" * 50)
-            for stored in lyric_history:
-                write_lyric(stored)
-            bar = build_bar(elapsed, duration)
-            sys.stdout.write(bar)
-            sys.stdout.flush()
-            need_refresh = False
-
-        if not is_paused:
-            elapsed = time.time() - start_time
-
-            sys.stdout.write("\r" + build_bar(elapsed, duration))
-            sys.stdout.flush()
+    tick = 1.0 / max(1, CONFIG["progress_hz"])
+    keys = KeyEvents()
+    current_player.on_end = keys.wake
+
+    def on_resize(*_):
+        nonlocal term_width, term_lines
+        term_width, term_lines = get_term_size()
+        keys.wake()
+
+    old_winch = signal.signal(signal.SIGWINCH, on_resize) if hasattr(signal, 'SIGWINCH') else None
+    with keys:
+        # 主循环：只在按键、下一句歌词、进度刷新节拍或播放结束时醒来
+        while current_player.poll() is None:
+            if need_refresh:
+                draw_screen()
+                keys.rearm()
+                need_refresh = False
+
+            if not is_paused:
+                elapsed = current_player.position()
+
+                # 新出现的歌词连同清除进度条一次写出
+                new_lines = renderer.advance(elapsed)
+                if new_lines:
+                    sys.stdout.write("\r" + " " * (term_width - 1) + "\r" + new_lines)
+                    last_bar = None
+
+                # 进度条文字变化时才重写
+                bar = build_bar(elapsed, duration)
+                if bar != last_bar:
+                    sys.stdout.write("\r" + bar)
+                    sys.stdout.flush()
+                    last_bar = bar
+
+            if is_paused:
+                timeout = None
+            else:
+                timeout = tick
+                next_lyric = renderer.next_time()
+                if next_lyric is not None:
+                    timeout = min(timeout, max(0.005, next_lyric - elapsed))
+            key = keys.wait(timeout)
+            if key:
+                k = key.lower()
+                if k == 'k':
+                    is_paused = not is_paused
+                    if is_paused:
+                        current_player.pause()
+                        print("\n" + "=" * 30)
+                        print("- 已暂停。请选择您的操作：(任意键继续, B退出)")
+                    else:
+                        current_player.resume()
+                        need_refresh = True
 
-            while l_idx < len(lyrics) and elapsed >= lyrics[l_idx]['time']:
-                sys.stdout.write("\r" + " " * (get_term_width() - 1) + "\r")
-                lyric_str = build_lyric_line(lyrics[l_idx])
-                write_lyric(lyric_str)
-                store_lyric(lyrics[l_idx])
-                l_idx += 1
-                sys.stdout.write(build_bar(elapsed, duration))
-                sys.stdout.flush()
-
-        key = get_key()
-        if key:
-            k = key.lower()
-            if k == 'k':
-                is_paused = not is_paused
-                if is_paused:
-                    sig = subprocess.signal.SIGSTOP if SYSTEM != "Windows" else 19
-                    current_player.send_signal(sig)
-                    pause_at = time.time()
-                    print("\n" + "=" * 30)
-                    print("- 已暂停。请选择您的操作：(任意键继续, B退出)")
-                else:
-                    sig = subprocess.signal.SIGCONT if SYSTEM != "Windows" else 18
-                    current_player.send_signal(sig)
-                    start_time += (time.time() - pause_at)
+                elif k == 'c':
+                    show_comment_ui(song_id, metadata, load.comments, keys)
                     need_refresh = True
 
-            elif k == 'c':
-                show_comment_ui(song_id, metadata)
-                need_refresh = True
-
-            elif k == 'g':
-                idx = (CONFIG["modes"].index(CONFIG["play_mode"]) + 1) % 3
-                CONFIG["play_mode"] = CONFIG["modes"][idx]
-                save_config()
-                need_refresh = True
-
-            elif k == 'e':
-                if CONFIG["enable_effects"] and engine and effects:
-                    if SYSTEM != "Windows":
-                        os.system('stty sane 2>/dev/null')
-                    print("\n- 进入音效实时调整模式...")
-                    time.sleep(0.5)
-                    try:
-                        tui = effects.UltimateTUI(engine)
-                        tui.run()
-                        print("\n- 音效参数已更新，继续播放...")
-                        time.sleep(1)
-                        need_refresh = True
-                    except Exception as e:
-                        if CONFIG.get("debug_mode"):
-                            print(f"音效调整错误: {e}")
-                        time.sleep(1)
-                        need_refresh = True
-                else:
-                    print("\n- 未开启全局音效或缺失 effects 模块。")
-                    time.sleep(1.5)
+                elif k == 'g':
+                    idx = (CONFIG["modes"].index(CONFIG["play_mode"]) + 1) % 3
+                    SCHEDULER.set_mode(CONFIG["modes"][idx])
+                    save_config()
                     need_refresh = True
 
-            elif k == 'j':
-                if SYSTEM != "Windows":
-                    os.system('stty sane 2>/dev/null')
-                target = input(f"\n- 当前进度 {format_time(elapsed)}，请输入跳转时间 (分*秒，如 2*20): ")
-                try:
-                    if '*' in target:
-                        m, s = target.split('*')
-                        new_elapsed = int(m) * 60 + float(s)
+                elif k == 'e':
+                    if CONFIG["enable_effects"] and engine and effects:
+                        print("\n- 进入音效实时调整模式...")
+                        time.sleep(0.5)
+                        try:
+                            with keys.suspend():
+                                tui = effects.UltimateTUI(engine)
+                                tui.run()
+                            if cached and engine.revision != cached_revision:
+                                # 缓存的是旧设置的结果，从当前位置改回实时处理
+                                elapsed = current_player.position()
+                                current_player.on_end = None
+                                current_player.terminate()
+                                cached = None
+                                current_player = open_player(None)
+                                current_player.on_end = keys.wake
+                                current_player.start(elapsed)
+                                if is_paused:
+                                    current_player.pause()
+                            print("\n- 音效参数已更新，继续播放...")
+                            time.sleep(1)
+                            need_refresh = True
+                        except Exception as e:
+                            if CONFIG.get("debug_mode"):
+                                print(f"音效调整错误: {e}")
+                            time.sleep(1)
+                            need_refresh = True
                     else:
-                        new_elapsed = float(target)
-                    new_elapsed = min(new_elapsed, duration)
-                    new_elapsed = max(new_elapsed, 0)
+                        print("\n- 未开启全局音效或缺失 effects 模块。")
+                        time.sleep(1.5)
+                        need_refresh = True
 
-                    if current_player and current_player.poll() is None:
-                        try:
-                            current_player.terminate()
-                            current_player.wait(timeout=2)
-                        except:
-                            pass
+                elif k == 'j':
+                    with keys.suspend():
+                        target = input(f"\n- 当前进度 {format_time(elapsed)}，请输入跳转时间 (分*秒，如 2*20): ")
+                    try:
+                        if '*' in target:
+                            m, s = target.split('*')
+                            new_elapsed = int(m) * 60 + float(s)
+                        else:
+                            new_elapsed = float(target)
+                        new_elapsed = min(new_elapsed, duration)
+                        new_elapsed = max(new_elapsed, 0)
+
+                        # 常驻播放器内部跳转，只重启解码器
+                        current_player.seek(new_elapsed)
+                        elapsed = new_elapsed
+                        renderer.seek(new_elapsed)
+                        need_refresh = True
 
-                    time.sleep(0.5)
-                    current_player = start_player(new_elapsed)
-                    audio_thread_new = threading.Thread(
-                        target=feed_audio_with_effects,
-                        args=(current_player, audio_raw, engine_ref),
-                        daemon=True
-                    )
-                    audio_thread_new.start()
-
-                    elapsed = new_elapsed
-                    start_time = time.time() - new_elapsed
-                    rebuild_history_until(new_elapsed)
-                    need_refresh = True
-                    time.sleep(0.5)
+                    except ValueError:
+                        print("- 格式错误，请输入 数字*数字 或纯秒数。")
+                        time.sleep(1)
+                        need_refresh = True
 
-                except ValueError:
-                    print("- 格式错误，请输入 数字*数字 或纯秒数。")
-                    time.sleep(1)
-                    need_refresh = True
+                elif k == 'a':
+                    if len(SCHEDULER.playlist) > 1:
+                        outcome = 'prev'
+                        break
+                elif k == 'l':
+                    if len(SCHEDULER.playlist) > 1:
+                        outcome = 'next'
+                        break
 
-            elif k == 'a':
-                if len(current_playlist) > 1:
-                    current_song_idx = (current_song_idx - 1) % len(current_playlist)
-                    manual_next_song_id = current_playlist[current_song_idx]['id']
-                    manual_skip = True
-                    break
-            elif k == 'l':
-                if len(current_playlist) > 1:
-                    current_song_idx = (current_song_idx + 1) % len(current_playlist)
-                    manual_next_song_id = current_playlist[current_song_idx]['id']
-                    manual_skip = True
+                elif k == 'b':
+                    outcome = 'back'
+                    PREFETCHER.clear()
                     break
 
-            elif k == 'b':
-                should_play_next = False
-                preload_stop['flag'] = True
-                current_player.terminate()
-                break
-
-    if os.path.exists('cover.jpg'):
-        os.remove('cover.jpg')
-
-    preload_stop['flag'] = True
-    time.sleep(0.5)
-
-    if not should_play_next or len(current_playlist) <= 1:
-        return
-
-    if CONFIG['play_mode'] == '单曲循环':
-        play_song(song_id, preload_next_song_id)
-    elif CONFIG['play_mode'] == '列表顺序播放':
-        next_idx = (current_song_idx + 1) % len(current_playlist)
-        current_song_idx = next_idx
-        next_song_id = current_playlist[next_idx]['id']
-        next_next_idx = (next_idx + 1) % len(current_playlist)
-        next_next_song_id = current_playlist[next_next_idx]['id'] if CONFIG["enable_preload"] and len(current_playlist) > 1 else None
-        play_song(next_song_id, next_next_song_id)
-    elif CONFIG['play_mode'] == '随机播放':
-        random_idx = random.randint(0, len(current_playlist) - 1)
-        current_song_idx = random_idx
-        random_song_id = current_playlist[random_idx]['id']
-        next_random_idx = random.randint(0, len(current_playlist) - 1)
-        next_random_song_id = current_playlist[next_random_idx]['id'] if CONFIG["enable_preload"] and len(current_playlist) > 1 else None
-        play_song(random_song_id, next_random_song_id)
+    if old_winch is not None:
+        signal.signal(signal.SIGWINCH, old_winch)
+    current_player.on_end = None
+    current_player.terminate()
+    if outcome != 'ended':
+        audio_raw.cancel()
+    return outcome
+
+def request_playlist_songs(playlist_id):
+    """请求歌单歌曲列表（不输出任何界面），返回统一格式列表；接口报错或歌单为空时抛出 ValueError"""
+    api_url = f"https://oiapi.net/api/NeteasePlaylistDetail&id={playlist_id}"
+    data = network.get(api_url, "playlist").json()
+    if data.get('code') != 1:
+        raise ValueError(f"获取失败: {data.get('message', '未知错误')}")
+    songs = data.get('data', [])
+    if not songs:
+        raise ValueError("歌单为空或获取失败")
+
+    result = []
+    for s in songs:
+        artists = s.get('artists', [])
+        artist_names = ', '.join([a.get('name', '未知') for a in artists]) if artists else '未知歌手'
+        result.append({
+            'id': s.get('id'),
+            'name': s.get('name', '未知歌曲'),
+            'artist': artist_names
+        })
+    return result
 
 def fetch_playlist_songs(playlist_id):
     """通过 API 获取歌单歌曲列表，返回统一格式列表，失败返回 None"""
     try:
         clear_screen()
         print(f"- 正在获取歌单内歌曲... (ID: {playlist_id})")
-        api_url = f"https://oiapi.net/api/NeteasePlaylistDetail&id={playlist_id}"
-        response = requests.get(api_url, timeout=10)
-        data = response.json()
-
-        if data.get('code') != 1:
-            print(f"获取失败: {data.get('message', '未知错误')}")
-            time.sleep(2)
-            return None
-
-        songs = data.get('data', [])
-        if not songs:
-            print("歌单为空或获取失败")
-            time.sleep(2)
-            return None
-
-        result = []
-        for s in songs:
-            artists = s.get('artists', [])
-            artist_names = ', '.join([a.get('name', '未知') for a in artists]) if artists else '未知歌手'
-            result.append({
-                'id': s.get('id'),
-                'name': s.get('name', '未知歌曲'),
-                'artist': artist_names
-            })
-        return result
+        return request_playlist_songs(playlist_id)
+    except ValueError as e:
+        print(e)
+        time.sleep(2)
+        return None
     except Exception as e:
         handle_error(e, "获取歌单失败")
         return None
 
-def show_songs_and_play(playlist_id, songs):
-    global current_playlist, current_song_idx
+class PlaylistSyncer:
+    """后台同步已缓存的歌单：先用缓存立即显示，拉取到最新列表后只改写变化的行，结果留给界面下次刷新时取用"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = set()
+        self.results = {}
+
+    def start(self, playlist_id):
+        with self.lock:
+            if playlist_id in self.running:
+                return
+            self.running.add(playlist_id)
+            self.results.pop(playlist_id, None)
+        threading.Thread(target=self._run, args=(playlist_id,), daemon=True).start()
+
+    def _run(self, playlist_id):
+        try:
+            songs = request_playlist_songs(playlist_id)
+            result = (songs, PLAYLISTS.sync(playlist_id, songs), None)
+        except Exception as e:
+            result = (None, None, e)
+        with self.lock:
+            self.running.discard(playlist_id)
+            self.results[playlist_id] = result
+
+    def busy(self, playlist_id):
+        with self.lock:
+            return playlist_id in self.running
+
+    def take(self, playlist_id):
+        """取出已完成的同步结果 (songs, diff, error)，尚未完成时返回 None"""
+        with self.lock:
+            return self.results.pop(playlist_id, None)
 
+SYNCER = PlaylistSyncer()
+
+class LocalLibrary:
+    """缓存歌单和播放历史上的本地搜索，离线可用；歌单或历史变化后在下一次搜索时重建索引"""
+    def __init__(self):
+        self.index = None
+        self.revision = None
+
+    def search(self, keyword, limit=30):
+        try:
+            if self.index is None or self.revision != PLAYLISTS.revision:
+                self.revision = PLAYLISTS.revision
+                self.index = search.SearchIndex(PLAYLISTS.all_songs())
+            return self.index.search(keyword, limit)
+        except Exception as e:
+            if CONFIG.get("debug_mode"):
+                print(f"本地搜索失败: {e}")
+            return []
+
+LIBRARY = LocalLibrary()
+
+def show_songs_and_play(playlist_id, songs):
     page = 0
     page_size = 15
     total = len(songs)
+    sync_note = ""
+    index, index_songs = None, None  # 歌单内搜索的索引，列表被同步替换后重建
 
     while True:
+        # 后台同步完成后换成最新列表
+        synced = SYNCER.take(playlist_id)
+        if synced:
+            new_songs, diff, error = synced
+            if error is not None:
+                sync_note = f"- 歌单同步失败，显示的是缓存内容 ({error})"
+            else:
+                sync_note = f"- 歌单已同步：{diff.summary()}"
+                songs, total = new_songs, len(new_songs)
+        elif SYNCER.busy(playlist_id):
+            sync_note = "- 正在后台同步歌单..."
+
         clear_screen()
-        total_pages = (total + page_size - 1) // page_size
+        total_pages = max(1, (total + page_size - 1) // page_size)
+        page = min(page, total_pages - 1)
         start = page * page_size
         end = min(start + page_size, total)
 
         print(f"\n- 歌单 ID: {playlist_id}，共 {total} 首歌曲 (第 {page+1} 页，共 {total_pages} 页)")
+        if sync_note:
+            print(sync_note)
         print("=" * 60)
 
         for i in range(start, end):
@@ -759,11 +1988,30 @@ def show_songs_and_play(playlist_id, songs):
             print(f"      歌手: {song['artist']}")
             print("-" * 60)
 
-        print(f"\n上一页[a]  下一页[l]  选择歌曲[序号]  返回[B]")
+        print(f"\n上一页[a]  下一页[l]  搜索[s]  选择歌曲[序号]  返回[B]")
         choice = input("\n请选择: ").strip()
 
         if choice.lower() == 'b':
             return
+        elif choice.lower() == 's':
+            keyword = input("- 在本歌单中搜索: ").strip()
+            if not keyword:
+                continue
+            if index is None or index_songs is not songs:
+                index_songs = songs
+                index = search.SearchIndex({**song, 'pos': pos} for pos, song in enumerate(songs))
+            results = index.search(keyword, page_size)
+            if not results:
+                print("本歌单中没有匹配的歌曲。")
+                time.sleep(1.5)
+                continue
+            print("=" * 60)
+            for song in results:
+                print(f"[{song['pos']+1:<3}] {song['name']}")
+                print(f"      歌手: {song['artist']}")
+            choice = input("\n输入序号播放 (回车返回列表): ").strip()
+            if not choice:
+                continue
         elif choice.lower() == 'a' and page > 0:
             page -= 1
             continue
@@ -774,17 +2022,7 @@ def show_songs_and_play(playlist_id, songs):
         try:
             target_idx = int(choice) - 1
             if 0 <= target_idx < total:
-                current_playlist = [{'id': s['id'], 'name': s['name']} for s in songs]
-                current_song_idx = target_idx
-
-                song_id = songs[target_idx]['id']
-                if CONFIG["enable_preload"] and len(current_playlist) > 1:
-                    next_idx = (target_idx + 1) % len(current_playlist)
-                    next_song_id = current_playlist[next_idx]['id']
-                else:
-                    next_song_id = None
-
-                play_song(song_id, next_song_id)
+                SCHEDULER.play([{'id': s['id'], 'name': s['name']} for s in songs], target_idx)
                 return
             else:
                 print("序号无效")
@@ -797,16 +2035,15 @@ def manage_playlist_cache():
     while True:
         clear_screen()
         print("--- 歌单缓存管理 ---")
-        cached_ids = get_cached_playlist_ids()
-        if cached_ids:
+        cached = list_cached_playlists()
+        cached_ids = [pid for pid, _, _ in cached]
+        if cached:
             print("已缓存的歌单ID:")
-            for pid in cached_ids:
-                cache = load_playlist_cache().get(pid, {})
-                name = cache.get('name', '')
+            for pid, name, count in cached:
                 display = pid
                 if name:
                     display += f" ({name})"
-                print(f"  {display}")
+                print(f"  {display}  {count} 首")
         else:
             print("暂无缓存歌单")
         print("\n[1] 添加/更新歌单")
@@ -822,8 +2059,9 @@ def manage_playlist_cache():
                 continue
             songs = fetch_playlist_songs(pid)
             if songs:
-                update_playlist_in_cache(pid, songs, name="")
-                print(f"歌单 {pid} 已缓存。")
+                diff = _playlist_store_call(PLAYLISTS.sync, pid, songs)
+                if diff is not None:
+                    print(f"歌单 {pid} 已缓存：{diff.summary()}。")
                 time.sleep(1)
         elif choice == '2':
             if not cached_ids:
@@ -853,17 +2091,15 @@ def manage_playlist_cache():
                 time.sleep(1)
 
 def playlist_flow():
-    global current_playlist, current_song_idx
     clear_screen()
 
     use_cache = CONFIG.get("remember_playlists", False)
-    cached_ids = get_cached_playlist_ids() if use_cache else []
+    cached = list_cached_playlists() if use_cache else []
+    cached_ids = [pid for pid, _, _ in cached]
 
     if use_cache and cached_ids:
         print("已存储的歌单：")
-        for idx, pid in enumerate(cached_ids, 1):
-            cache_data = load_playlist_cache().get(pid, {})
-            name = cache_data.get('name', '')
+        for idx, (pid, name, _) in enumerate(cached, 1):
             display = pid
             if name:
                 display += f" ({name})"
@@ -897,12 +2133,12 @@ def playlist_flow():
                 idx = int(choice) - 1
                 if 0 <= idx < len(cached_ids):
                     playlist_id = cached_ids[idx]
-                    cache_entry = load_playlist_cache().get(playlist_id, {})
-                    songs = cache_entry.get('songs', [])
+                    songs = get_cached_playlist(playlist_id)
                     if not songs:
                         print("缓存中没有歌曲数据，请重新获取。")
                         time.sleep(2)
                         return
+                    SYNCER.start(playlist_id)
                     show_songs_and_play(playlist_id, songs)
                     return
                 else:
@@ -948,46 +2184,47 @@ def search_flow():
         time.sleep(2)
         return
 
+    # 本地索引（缓存歌单 + 播放历史）离线即可查到，排在前面；再与在线结果合并去重
+    results = [dict(song, source="本地") for song in LIBRARY.search(keyword)]
     print("- 正在搜索...")
+    remote_error = None
     try:
         api_url = f"https://api.no0a.cn/api/cloudmusic/search/{keyword}"
-        resp = requests.get(api_url, timeout=10)
+        resp = network.get(api_url, "search")
         data = resp.json()
+        if data.get("status") != 1:
+            remote_error = f"搜索失败: {data.get('message', '未知错误')}"
+        else:
+            seen = {song['id'] for song in results}
+            for item in data.get("results", []):
+                if item.get("id") in seen:
+                    continue
+                artists = [a.get("name", "未知") for a in item.get("artist", [])]
+                results.append({"id": item.get("id"), "name": item.get("name", "未知歌曲"),
+                                "artist": ", ".join(artists) if artists else "未知歌手", "source": "在线"})
     except Exception as e:
-        handle_error(e, "搜索请求失败，请检查网络。")
-        return
-
-    if data.get("status") != 1:
-        print(f"搜索失败: {data.get('message', '未知错误')}")
-        time.sleep(2)
-        return
+        if not results:
+            handle_error(e, "搜索请求失败，请检查网络。")
+            return
+        remote_error = "网络不可用，仅显示本地结果"
 
-    results = data.get("results", [])
     if not results:
-        print("未找到相关歌曲。")
+        print(remote_error or "未找到相关歌曲。")
         time.sleep(2)
         return
 
     # 构建当前播放列表（将搜索结果作为歌单，支持上下曲切换）
-    global current_playlist, current_song_idx
-    current_playlist = []
-    for item in results:
-        song_id = item.get("id")
-        song_name = item.get("name", "未知歌曲")
-        artists = [a.get("name", "未知") for a in item.get("artist", [])]
-        artist_str = ", ".join(artists) if artists else "未知歌手"
-        current_playlist.append({"id": song_id, "name": song_name})
+    playlist = [{"id": item["id"], "name": item["name"]} for item in results]
 
     # 显示搜索结果
     clear_screen()
     print(f"\n- 搜索结果（{len(results)} 首歌曲）:")
+    if remote_error:
+        print(f"- {remote_error}")
     print("=" * 60)
     for idx, item in enumerate(results):
-        song_name = item.get("name", "未知歌曲")
-        artists = [a.get("name", "未知") for a in item.get("artist", [])]
-        artist_str = ", ".join(artists) if artists else "未知歌手"
-        print(f"[{idx+1:<3}] {song_name}")
-        print(f"      歌手: {artist_str}")
+        print(f"[{idx+1:<3}] {item['name']}  [{item['source']}]")
+        print(f"      歌手: {item['artist']}")
         print("-" * 60)
 
     choice = input("\n- 输入序号播放 (B 返回): ").strip()
@@ -997,17 +2234,7 @@ def search_flow():
     try:
         target_idx = int(choice) - 1
         if 0 <= target_idx < len(results):
-            current_song_idx = target_idx
-            song_id = current_playlist[target_idx]['id']
-
-            # 预加载下一首（如果开启且有多首）
-            if CONFIG["enable_preload"] and len(current_playlist) > 1:
-                next_idx = (target_idx + 1) % len(current_playlist)
-                next_song_id = current_playlist[next_idx]['id']
-            else:
-                next_song_id = None
-
-            play_song(song_id, next_song_id)
+            SCHEDULER.play(playlist, target_idx)
         else:
             print("序号无效")
             time.sleep(2)
@@ -1031,8 +2258,20 @@ def main():
                     print("--- 通用设置 ---")
                     print(f"[1] Debug模式: {'ON' if CONFIG['debug_mode'] else 'OFF'}")
                     print(f"[2] 预加载下一首: {'ON' if CONFIG['enable_preload'] else 'OFF'}")
-                    print(f"[3] 歌单记忆: {'ON' if CONFIG['remember_playlists'] else 'OFF'} (缓存{len(get_cached_playlist_ids())}个)")
+                    print(f"[3] 歌单记忆: {'ON' if CONFIG['remember_playlists'] else 'OFF'} (缓存{_playlist_store_call(PLAYLISTS.count, default=0)}个)")
                     print("[4] 清空歌单缓存")
+                    a_stats = AUDIO_CACHE.stats()
+                    print(f"[5] 音频缓存上限: {CONFIG['audio_cache_mb']}MB "
+                          f"(已用 {a_stats['size'] / 1024 / 1024:.1f}MB/{a_stats['count']}首, "
+                          f"命中 {a_stats['hits']} / 未命中 {a_stats['misses']})")
+                    print("[6] 清空音频缓存")
+                    print(f"[7] 预加载深度: {CONFIG['preload_depth']} 首")
+                    print(f"[8] 起播缓冲: {CONFIG['prebuffer_kb']} KB")
+                    print(f"[9] 进度条刷新: {CONFIG['progress_hz']} 次/秒")
+                    if CONFIG["debug_mode"]:
+                        for name, st in network.CLIENT.timings().items():
+                            print(f"    [网络] {name}: {st['count']} 次, 平均 {st['avg_ms']:.0f} ms, "
+                                  f"最近 {st['last_ms']:.0f} ms, 失败 {st['errors']} 次")
                     print("[B] 返回")
                     c = input("\n- 请选择: ")
                     if c == '1':
@@ -1047,9 +2286,43 @@ def main():
                     elif c == '4':
                         confirm = input("确定清空所有缓存歌单？(y/n): ").strip().lower()
                         if confirm == 'y':
-                            save_playlist_cache({})
+                            clear_playlist_cache()
                             print("缓存已清空。")
                             time.sleep(1)
+                    elif c == '5':
+                        try:
+                            CONFIG["audio_cache_mb"] = max(0, int(input("请输入缓存上限 MB (0 为关闭): ").strip()))
+                            save_config()
+                        except ValueError:
+                            print("请输入有效的数字")
+                            time.sleep(1)
+                    elif c == '6':
+                        confirm = input("确定清空音频缓存？(y/n): ").strip().lower()
+                        if confirm == 'y':
+                            AUDIO_CACHE.clear()
+                            print("音频缓存已清空。")
+                            time.sleep(1)
+                    elif c == '7':
+                        try:
+                            CONFIG["preload_depth"] = max(1, int(input("请输入预加载歌曲数量: ").strip()))
+                            save_config()
+                        except ValueError:
+                            print("请输入有效的数字")
+                            time.sleep(1)
+                    elif c == '8':
+                        try:
+                            CONFIG["prebuffer_kb"] = max(16, int(input("请输入起播前缓冲大小 KB: ").strip()))
+                            save_config()
+                        except ValueError:
+                            print("请输入有效的数字")
+                            time.sleep(1)
+                    elif c == '9':
+                        try:
+                            CONFIG["progress_hz"] = min(20, max(1, int(input("请输入每秒刷新次数 (1-20): ").strip())))
+                            save_config()
+                        except ValueError:
+                            print("请输入有效的数字")
+                            time.sleep(1)
                     elif c.lower() == 'b':
                         break
             elif choice == '4':
@@ -1057,6 +2330,12 @@ def main():
                 print(f"音效处理引擎: {'已就绪' if effects else '未找到(effects.py)'}")
                 print(f"[1] 全局音效开关: {'ON' if CONFIG['enable_effects'] else 'OFF'}")
                 print("[2] 进入音效参数设置 (effects.py 界面)")
+                if RENDER_CACHE:
+                    r_stats = RENDER_CACHE.stats()
+                    print(f"[3] 渲染缓存上限: {CONFIG['render_cache_mb']}MB "
+                          f"(已用 {r_stats['size'] / 1024 / 1024:.1f}MB/{r_stats['count']}首, "
+                          f"命中 {r_stats['hits']} / 未命中 {r_stats['misses']})")
+                    print("[4] 清空渲染缓存")
                 print("[B] 返回")
                 c = input("\n- 音效设置: ")
                 if c == '1':
@@ -1070,6 +2349,19 @@ def main():
                     else:
                         print("错误：缺少 effects.py 模块，请检查文件名！")
                         time.sleep(2)
+                elif c == '3' and RENDER_CACHE:
+                    try:
+                        CONFIG["render_cache_mb"] = max(0, int(input("请输入渲染缓存上限 MB (0 为关闭): ").strip()))
+                        save_config()
+                    except ValueError:
+                        print("请输入有效的数字")
+                        time.sleep(1)
+                elif c == '4' and RENDER_CACHE:
+                    confirm = input("确定清空渲染缓存？(y/n): ").strip().lower()
+                    if confirm == 'y':
+                        RENDER_CACHE.clear()
+                        print("渲染缓存已清空。")
+                        time.sleep(1)
             else:
                 print("无效指令"); time.sleep(1)
         except KeyboardInterrupt: